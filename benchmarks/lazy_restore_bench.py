@@ -0,0 +1,98 @@
+'''
+Compares restoring a sharded checkpoint with every message loaded against
+leaving the messages on disk until they are used, for stores holding 10k,
+100k and 1M messages. Each restore runs in its own process so the resident
+memory it reports is its own.
+
+Usage (from the repository root):
+    python -m benchmarks.lazy_restore_bench [--messages 10000 100000 1000000]
+'''
+
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+
+from src.persistence import (
+    SnapshotWriter,
+    get_shard_names,
+    freeze_shard,
+    assemble_store,
+    read_shards,
+    resident_memory
+)
+from benchmarks.snapshot_codec_bench import build_store
+
+
+def write_checkpoint(num_messages: int, directory: str) -> None:
+    '''
+    Writes every shard of a store holding num_messages messages
+    '''
+
+    store = build_store(num_messages)
+    shards = {shard: freeze_shard(store, shard)
+              for shard in get_shard_names(store)}
+    SnapshotWriter(directory, {}, 0).write(shards, 0, 1, True)
+
+
+def restore(directory: str, lazy: bool) -> dict:
+    '''
+    Times restoring the checkpoint in a directory and reading the messages
+    of one channel, as the first request after a restart might
+    '''
+
+    start = time.perf_counter()
+    shards, _, _ = read_shards(directory, 8, lazy)
+    store = assemble_store(shards)
+    restore_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for message_id in store['channel_data'][1]['message_ids']:
+        store['message_data'][message_id]
+    first_read_time = time.perf_counter() - start
+
+    return {
+        'restore': restore_time,
+        'first_read': first_read_time,
+        'resident_memory': resident_memory()
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--messages', type=int, nargs='+',
+                        default=[10000, 100000, 1000000])
+    parser.add_argument('--restore', help=argparse.SUPPRESS)
+    parser.add_argument('--lazy', action='store_true', help=argparse.SUPPRESS)
+    arguments = parser.parse_args()
+
+    if arguments.restore:
+        print(json.dumps(restore(arguments.restore, arguments.lazy)))
+        return
+
+    print(f'{"messages":>10} {"mode":>6} {"restore (s)":>12} '
+          f'{"first read (s)":>15} {"resident (MB)":>14}')
+
+    for num_messages in arguments.messages:
+        with tempfile.TemporaryDirectory() as directory:
+            write_checkpoint(num_messages, directory)
+
+            for mode in ('eager', 'lazy'):
+                command = [sys.executable, '-m', 'benchmarks.lazy_restore_bench',
+                           '--restore', directory]
+                if mode == 'lazy':
+                    command.append('--lazy')
+
+                output = subprocess.run(command, capture_output=True,
+                                        text=True, check=True).stdout
+                result = json.loads(output.strip().splitlines()[-1])
+
+                print(f'{num_messages:>10} {mode:>6} {result["restore"]:>12.3f} '
+                      f'{result["first_read"]:>15.3f} '
+                      f'{result["resident_memory"] / 1e6:>14.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,341 @@
+'''
+Measures what persisting the data_store costs. Builds a synthetic store
+through data_operations (users, sessions, channels, dms, messages, reacts,
+pins and the stats histories they grow), then measures:
+    - a full checkpoint: time, time mutations were held back, bytes written
+      and peak resident memory while it ran
+    - restoring the checkpoint and mutation log
+    - a steady message-send workload with checkpoints running alongside it:
+      bytes written per second and per byte of message content sent
+
+The results are printed as json, and written to --output if given, so runs
+on different commits can be compared.
+
+Usage (from the repository root):
+    python -m benchmarks.persistence_bench [--users 100] [--channels 10]
+        [--dms 10] [--messages 2000] [--workload-seconds 5]
+        [--send-rate 200] [--checkpoint-interval 1] [--output results.json]
+'''
+
+import os
+import json
+import time
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+import contextlib
+
+from src import config
+from src import dict_store
+from src.data_operations import (
+    reset_data_store_to_default,
+    initialise_workspace_stats,
+    initialise_user_stats,
+    add_user,
+    add_session_token,
+    add_channel,
+    add_member_to_channel,
+    add_dm,
+    add_user_to_dm,
+    add_message,
+    react_message,
+    pin_message,
+    data_checkpoint,
+    get_persistence_stats,
+    data_restore
+)
+from src.persistence import resident_memory
+
+
+def build_store(users: int, channels: int, dms: int, messages: int) -> None:
+    '''
+    Fills the data_store through data_operations, the same way requests do.
+    Every user is in one channel and one dm, messages are spread over all of
+    them, every 5th message is reacted to and every 50th is pinned.
+    '''
+
+    now = int(time.time())
+
+    initialise_workspace_stats()
+
+    for user_id in range(1, users + 1):
+        add_user(user_id, ('First', f'Last{user_id}', f'user{user_id}@gmail.com'),
+                 'a' * 64, f'firstlast{user_id}', user_id == 1)
+        initialise_user_stats(user_id)
+        add_session_token(f'token{user_id}', user_id)
+
+    conversations = []
+
+    for channel_id in range(1, channels + 1):
+        members = list(range(channel_id, users + 1, channels))
+        add_channel(channel_id, f'channel{channel_id}', members[0], True, now)
+        for user_id in members[1:]:
+            add_member_to_channel(channel_id, user_id, now)
+        conversations.append((True, channel_id, members))
+
+    for dm_id in range(1, dms + 1):
+        members = list(range(dm_id, users + 1, dms))
+        add_dm(dm_id, f'dm{dm_id}', members[0], now)
+        for user_id in members[1:]:
+            add_user_to_dm(dm_id, user_id, now)
+        conversations.append((False, dm_id, members))
+
+    for message_id in range(1, messages + 1):
+        send_message(conversations, message_id, now)
+
+
+def send_message(conversations: list, message_id: int, now: int) -> int:
+    '''
+    Sends a message to one of the conversations, picked by the message_id
+
+    Return Value:
+        content_size (int): bytes of message content sent
+    '''
+
+    is_channel, conversation_id, members = conversations[message_id % len(conversations)]
+    author = members[message_id % len(members)]
+    content = f'message number {message_id} in conversation {conversation_id}'
+
+    add_message(is_channel, author, conversation_id, message_id, content, now)
+    if message_id % 5 == 0:
+        react_message(members[0], message_id, 1)
+    if message_id % 50 == 0:
+        pin_message(message_id)
+
+    return len(content)
+
+
+def written_bytes() -> int:
+    '''
+    Gets the bytes the process has passed to write calls, where the
+    platform reports it
+    '''
+
+    try:
+        with open('/proc/self/io') as io_stats:
+            for line in io_stats:
+                if line.startswith('wchar:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+class MemorySampler(threading.Thread):
+    '''
+    Samples resident memory until stopped, keeping the largest sample
+    '''
+
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.peak = resident_memory()
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(0.005):
+            self.peak = max(self.peak, resident_memory())
+
+    def stop(self) -> int:
+        self._stopped.set()
+        self.join()
+        return max(self.peak, resident_memory())
+
+
+def restart() -> None:
+    '''
+    Throws away the data_store held in memory and restores it from disk
+    '''
+
+    dict_store._mutation_log.close()
+    dict_store._mutation_log = None
+    reset_data_store_to_default()
+    data_restore()
+
+
+def bench_checkpoint() -> dict:
+    '''
+    Times a checkpoint of everything changed since the last one
+    '''
+
+    rss_before = resident_memory()
+    sampler = MemorySampler()
+    sampler.start()
+
+    start = time.perf_counter()
+    data_checkpoint()
+    seconds = time.perf_counter() - start
+
+    peak_rss = sampler.stop()
+    stats = get_persistence_stats()
+
+    return {
+        'seconds': seconds,
+        'pause_seconds': stats['checkpoint_pause'],
+        'shards_written': stats['shards_written'],
+        'bytes_written': stats['bytes_written'],
+        'rss_before': rss_before,
+        'peak_rss': peak_rss
+    }
+
+
+def bench_restore() -> dict:
+    '''
+    Times restoring the data_store from the checkpoint and mutation log
+    '''
+
+    start = time.perf_counter()
+    restart()
+    seconds = time.perf_counter() - start
+
+    stats = get_persistence_stats()
+
+    return {
+        'seconds': seconds,
+        'cold_messages': stats['cold_messages'],
+        'rss': stats['resident_memory']
+    }
+
+
+def bench_steady_state(arguments: argparse.Namespace) -> dict:
+    '''
+    Sends messages at arguments.send_rate per second for
+    arguments.workload_seconds, checkpointing every
+    arguments.checkpoint_interval seconds in another thread the way
+    data_dump does
+    '''
+
+    conversations = []
+    for channel_id in range(1, arguments.channels + 1):
+        members = list(range(channel_id, arguments.users + 1, arguments.channels))
+        conversations.append((True, channel_id, members))
+    for dm_id in range(1, arguments.dms + 1):
+        members = list(range(dm_id, arguments.users + 1, arguments.dms))
+        conversations.append((False, dm_id, members))
+
+    stopped = threading.Event()
+    checkpoints = []
+
+    def checkpointer():
+        while not stopped.wait(arguments.checkpoint_interval):
+            dict_store._mutation_log.sync()
+            data_checkpoint()
+            checkpoints.append(get_persistence_stats())
+
+    written_before = written_bytes()
+    thread = threading.Thread(target=checkpointer, daemon=True)
+    thread.start()
+
+    now = int(time.time())
+    message_id = arguments.messages
+    content_bytes = 0
+    send_times = []
+
+    start = time.perf_counter()
+    while time.perf_counter() - start < arguments.workload_seconds:
+        message_id += 1
+        sent = time.perf_counter()
+        content_bytes += send_message(conversations, message_id, now)
+        send_times.append(time.perf_counter() - sent)
+
+        if arguments.send_rate:
+            next_send = start + (message_id - arguments.messages) / arguments.send_rate
+            time.sleep(max(0, next_send - time.perf_counter()))
+    seconds = time.perf_counter() - start
+
+    stopped.set()
+    thread.join()
+
+    written = None
+    if written_before is not None:
+        written = written_bytes() - written_before
+
+    snapshot_bytes = sum(stats['bytes_written'] for stats in checkpoints)
+    send_times.sort()
+
+    return {
+        'seconds': seconds,
+        'messages_sent': len(send_times),
+        'content_bytes_sent': content_bytes,
+        'checkpoints': len(checkpoints),
+        'bytes_written': written,
+        'bytes_written_per_second': written / seconds if written is not None else None,
+        'snapshot_bytes_written': snapshot_bytes,
+        'write_amplification': written / content_bytes if written and content_bytes else None,
+        'send_latency_p50': send_times[len(send_times) // 2] if send_times else None,
+        'send_latency_max': send_times[-1] if send_times else None,
+        'max_checkpoint_pause': max((stats['checkpoint_pause'] for stats in checkpoints),
+                                    default=None)
+    }
+
+
+def get_commit() -> str:
+    '''
+    Gets the commit the benchmark is run on, None outside a git checkout
+    '''
+
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--channels', type=int, default=10)
+    parser.add_argument('--dms', type=int, default=10)
+    parser.add_argument('--messages', type=int, default=2000)
+    parser.add_argument('--workload-seconds', type=float, default=5)
+    parser.add_argument('--send-rate', type=float, default=200,
+                        help='messages sent per second, 0 to send as fast as possible')
+    parser.add_argument('--checkpoint-interval', type=float, default=1)
+    parser.add_argument('--output', help='file to write the json results to')
+    arguments = parser.parse_args()
+
+    results = {
+        'commit': get_commit(),
+        'python': platform.python_version(),
+        'parameters': vars(arguments),
+        'snapshot_codec': config.snapshot_codec,
+        'lazy_message_restore': config.lazy_message_restore
+    }
+
+    with tempfile.TemporaryDirectory() as directory:
+        # keep the files out of the working directory
+        config.snapshot_dir = os.path.join(directory, 'snapshots')
+        config.legacy_snapshot_paths = []
+        config.mutation_log_path = os.path.join(directory, 'data_store.log')
+
+        # data_operations prints as it goes, keep the json readable
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            reset_data_store_to_default()
+            data_restore()
+
+            start = time.perf_counter()
+            build_store(arguments.users, arguments.channels,
+                        arguments.dms, arguments.messages)
+            results['build'] = {
+                'seconds': time.perf_counter() - start,
+                'mutations': get_persistence_stats()['generation'],
+                'log_bytes': get_persistence_stats()['log_size']
+            }
+
+            results['checkpoint'] = bench_checkpoint()
+            results['restore'] = bench_restore()
+            results['steady_state'] = bench_steady_state(arguments)
+
+            dict_store._mutation_log.close()
+
+    output = json.dumps(results, indent=4)
+    print(output)
+
+    if arguments.output:
+        with open(arguments.output, 'w') as output_file:
+            output_file.write(output + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+'''
+Measures the memory each message takes in the data_store, held as the dict
+add_message used to build, as the Message record it builds now and in the
+columns of a ColumnarMessageData (config.message_store = 'columnar'), for
+10k, 100k and 1M messages. The content of every message is the same length
+in each, and is counted in each.
+
+Usage (from the repository root):
+    python -m benchmarks.record_memory_bench [--messages 10000 100000 1000000]
+'''
+
+import gc
+import argparse
+import tracemalloc
+
+from src.records import Message
+from src.message_store import ColumnarMessageData
+
+CHANNELS = 100
+
+
+def message_dict(message_id: int) -> dict:
+    '''
+    Builds a message the way add_message did before records
+    '''
+
+    channel_id = message_id % CHANNELS + 1
+    return {
+        'author': channel_id,
+        'content': f'message number {message_id} in channel {channel_id}',
+        'time_created': 1600000000 + message_id,
+        'message_id': message_id,
+        'channel_created': channel_id,
+        'is_channel': True,
+        'reacts': [{'react_id': 1, 'u_ids': [], 'is_this_user_reacted': False}],
+        'is_pinned': False
+    }
+
+
+def message_record(message_id: int) -> Message:
+    '''
+    Builds a message the way add_message does now
+    '''
+
+    channel_id = message_id % CHANNELS + 1
+    return Message(channel_id, f'message number {message_id} in channel {channel_id}',
+                   1600000000 + message_id, message_id, channel_id, True, None,
+                   False, False)
+
+
+def measure(build, num_messages: int, message_data=None) -> float:
+    '''
+    Gets the bytes allocated per message to hold num_messages messages in
+    message_data
+
+    Arguments:
+        build         (function): builds the message with a given id
+        num_messages       (int): number of messages
+        message_data          : empty message_data to add them to, a dict if
+                                not given
+
+    Return Value:
+        bytes_per_message (float): bytes allocated, divided by num_messages
+    '''
+
+    gc.collect()
+    tracemalloc.start()
+    if message_data is None:
+        message_data = {}
+    for message_id in range(1, num_messages + 1):
+        message_data[message_id] = build(message_id)
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    del message_data
+    return allocated / num_messages
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--messages', type=int, nargs='+',
+                        default=[10000, 100000, 1000000])
+    arguments = parser.parse_args()
+
+    print(f'{"messages":>10} {"dict (B/msg)":>13} {"record (B/msg)":>15} '
+          f'{"columnar (B/msg)":>17}')
+
+    for num_messages in arguments.messages:
+        before = measure(message_dict, num_messages)
+        after = measure(message_record, num_messages)
+        columnar = measure(message_record, num_messages, ColumnarMessageData())
+        print(f'{num_messages:>10} {before:>13.0f} {after:>15.0f} {columnar:>17.0f}')
+
+
+if __name__ == '__main__':
+    main()
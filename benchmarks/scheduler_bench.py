@@ -0,0 +1,124 @@
+'''
+Compares waiting jobs (messages sent later, standup ends) kept by
+src/scheduler.py with one threading.Timer each, as they were before. For
+each way and each count of jobs waiting it measures:
+    - threads and resident memory while the jobs wait
+    - microseconds to schedule a job and to cancel one
+    - how late jobs ran when --due jobs all fell due within a second
+
+The results are printed as json, and written to --output if given.
+
+Usage (from the repository root):
+    python -m benchmarks.scheduler_bench [--jobs 1000 10000] [--due 1000]
+        [--output results.json]
+'''
+
+import gc
+import json
+import time
+import argparse
+import threading
+
+from src import scheduler
+from src.persistence import resident_memory
+
+
+def timer_schedule(delay: float, function, *args) -> threading.Timer:
+    timer = threading.Timer(delay, function, args)
+    timer.daemon = True
+    timer.start()
+    return timer
+
+
+def bench_waiting(way: str, num_jobs: int) -> dict:
+    '''
+    Schedules num_jobs jobs due in an hour, measures what they take while
+    waiting, then cancels them
+    '''
+
+    gc.collect()
+    threads, memory = threading.active_count(), resident_memory()
+
+    start = time.perf_counter()
+    if way == 'scheduler':
+        jobs = [scheduler.schedule(3600, lambda: None) for _ in range(num_jobs)]
+    else:
+        jobs = [timer_schedule(3600, lambda: None) for _ in range(num_jobs)]
+    schedule_us = (time.perf_counter() - start) / num_jobs * 1e6
+
+    result = {
+        'threads': threading.active_count() - threads,
+        'memory_bytes': resident_memory() - memory,
+        'schedule_us': schedule_us
+    }
+
+    start = time.perf_counter()
+    for job in jobs:
+        if way == 'scheduler':
+            scheduler.cancel(job)
+        else:
+            job.cancel()
+    result['cancel_us'] = (time.perf_counter() - start) / num_jobs * 1e6
+
+    # cancelled timers end once they notice
+    if way == 'timer':
+        for job in jobs:
+            job.join()
+    return result
+
+
+def bench_lag(way: str, num_due: int) -> dict:
+    '''
+    Schedules num_due jobs falling due across one second and measures how
+    late each ran
+    '''
+
+    lags = []
+    lock = threading.Lock()
+    done = threading.Event()
+
+    def job(due):
+        with lock:
+            lags.append(time.monotonic() - due)
+            if len(lags) == num_due:
+                done.set()
+
+    for number in range(num_due):
+        delay = 0.5 + number / num_due
+        due = time.monotonic() + delay
+        if way == 'scheduler':
+            scheduler.schedule(delay, job, due)
+        else:
+            timer_schedule(delay, job, due)
+
+    done.wait(60)
+    lags.sort()
+    return {
+        'mean_lag_ms': sum(lags) / len(lags) * 1000,
+        'p99_lag_ms': lags[min(len(lags) - 1, len(lags) * 99 // 100)] * 1000,
+        'max_lag_ms': lags[-1] * 1000
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--jobs', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--due', type=int, default=1000)
+    parser.add_argument('--output', help='file to write the json results to')
+    arguments = parser.parse_args()
+
+    results = {'parameters': vars(arguments)}
+    for way in ('scheduler', 'timer'):
+        results[way] = {
+            'waiting': {num_jobs: bench_waiting(way, num_jobs) for num_jobs in arguments.jobs},
+            'lag': bench_lag(way, arguments.due)
+        }
+
+    print(json.dumps(results, indent=4))
+    if arguments.output:
+        with open(arguments.output, 'w') as output_file:
+            output_file.write(json.dumps(results, indent=4) + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+'''
+Times a burst of messages sent later falling due at once, sent one at a time
+in a batch of their own as each used to be, and as one batch with
+send_later_batch as the scheduler now sends the messages due in the same
+tick. Each burst goes to a channel of a workspace already holding
+--messages messages.
+
+The results are printed as json, and written to --output if given.
+
+Usage (from the repository root):
+    python -m benchmarks.sendlater_burst_bench [--bursts 100 1000]
+        [--messages 10000] [--output results.json]
+'''
+
+import os
+import json
+import time
+import argparse
+import tempfile
+
+from src import config
+from src import dict_store
+from src.auth import auth_register_v1
+from src.channels import channels_create_v1
+from src.message import send_later_batch
+from src.data_operations import (
+    reset_data_store_to_default,
+    data_restore,
+    add_message,
+    add_sendlater_id,
+    allocate_id,
+    get_workspace_stats
+)
+
+
+def build_workspace(num_messages: int) -> tuple:
+    '''
+    Registers a user, creates a channel and sends num_messages to it
+
+    Return Value:
+        (token, channel_id)
+    '''
+
+    reset_data_store_to_default()
+    token = auth_register_v1('user@gmail.com', 'password', 'First', 'Last')['token']
+    channel_id = channels_create_v1(token, 'channel', True)['channel_id']
+    for _ in range(num_messages):
+        add_message(True, 1, channel_id, allocate_id('message'), 'message', 0)
+    return token, channel_id
+
+
+def reserve(token: str, channel_id: int, burst: int) -> list:
+    '''
+    Reserves the ids of a burst of messages sent later, as
+    message_sendlater_v1 does
+    '''
+
+    jobs = []
+    for number in range(burst):
+        message_id = allocate_id('message')
+        add_sendlater_id(message_id)
+        jobs.append([token, channel_id, f'later {number}', message_id])
+    return jobs
+
+
+def bench_burst(way: str, burst: int, num_messages: int) -> dict:
+    '''
+    Sends a burst of messages sent later one way and times it
+    '''
+
+    token, channel_id = build_workspace(num_messages)
+    jobs = reserve(token, channel_id, burst)
+    entries = len(get_workspace_stats()['messages_exist'])
+
+    start = time.perf_counter()
+    if way == 'batch':
+        send_later_batch(True, channel_id, jobs)
+    else:
+        for job in jobs:
+            send_later_batch(True, channel_id, [job])
+    seconds = time.perf_counter() - start
+
+    return {
+        'seconds': seconds,
+        'us_per_message': seconds / burst * 1e6,
+        'stats_updates': len(get_workspace_stats()['messages_exist']) - entries
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--bursts', type=int, nargs='+', default=[100, 1000])
+    parser.add_argument('--messages', type=int, default=10000)
+    parser.add_argument('--output', help='file to write the json results to')
+    arguments = parser.parse_args()
+
+    results = {'parameters': vars(arguments)}
+    with tempfile.TemporaryDirectory() as directory:
+        config.snapshot_dir = os.path.join(directory, 'snapshots')
+        config.legacy_snapshot_paths = []
+        config.mutation_log_path = os.path.join(directory, 'data_store.log')
+        data_restore()
+
+        for way in ('one_at_a_time', 'batch'):
+            results[way] = {burst: bench_burst(way, burst, arguments.messages)
+                            for burst in arguments.bursts}
+
+        dict_store._mutation_log.close()
+
+    print(json.dumps(results, indent=4))
+    if arguments.output:
+        with open(arguments.output, 'w') as output_file:
+            output_file.write(json.dumps(results, indent=4) + '\n')
+
+
+if __name__ == '__main__':
+    main()
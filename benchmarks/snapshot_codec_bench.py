@@ -0,0 +1,157 @@
+'''
+Compares the binary snapshot codec, uncompressed and with each compression
+codec, against the json.dump snapshots it replaced, for stores holding 10k,
+100k and 1M messages.
+
+Usage (from the repository root):
+    python -m benchmarks.snapshot_codec_bench [--messages 10000 100000 1000000]
+        [--codecs none zlib gzip lzma] [--level LEVEL]
+'''
+
+import os
+import copy
+import json
+import time
+import argparse
+import tempfile
+
+from src.data_store import initial_object
+from src.persistence import SNAPSHOT_CODECS, write_snapshot, read_snapshot
+from src.records import User, Channel, Message, record_to_dict
+
+USERS = 1000
+CHANNELS = 100
+
+
+def build_store(num_messages: int) -> dict:
+    '''
+    Builds a data_store with the same shape data_operations gives it, spread
+    over USERS users and CHANNELS channels
+
+    Arguments:
+        num_messages (int): number of messages in the store
+
+    Return Value:
+        store (dict): the data_store contents
+    '''
+
+    # every entry the data_store has, so new entries are in the snapshots
+    store = copy.deepcopy(initial_object)
+    store['global_owners'][1] = None
+    store['id_blocks'] = {'user': USERS, 'channel': CHANNELS, 'dm': 0,
+                          'message': num_messages}
+
+    for user_id in range(1, USERS + 1):
+        store['user_data'][user_id] = User(
+            'First', f'Last{user_id}', f'user{user_id}@gmail.com', 'a' * 64,
+            f'firstlast{user_id}', user_id == 1, '', [], 0, [], [])
+        store['user_handles'][f'firstlast{user_id}'] = user_id
+        store['user_emails'][f'user{user_id}@gmail.com'] = user_id
+        store['user_ids'][user_id] = None
+        store['token'][f'token{user_id}'] = user_id
+        store['user_stats'][user_id] = {
+            'channels_joined': [{'num_channels_joined': 0, 'time_stamp': 0}],
+            'dms_joined': [{'num_dms_joined': 0, 'time_stamp': 0}],
+            'messages_sent': [{'num_messages_sent': 0, 'time_stamp': 0}],
+            'involvement_rate': 0.0
+        }
+
+    for channel_id in range(1, CHANNELS + 1):
+        members = list(range(channel_id, USERS + 1, CHANNELS))
+        store['channel_data'][channel_id] = Channel(
+            f'channel{channel_id}', {members[0]: None}, True,
+            dict.fromkeys(members),
+            {'is_active': False, 'time_finish': None, 'message_package': []},
+            [], 0)
+        store['channel_ids'][channel_id] = None
+
+    for message_id in range(1, num_messages + 1):
+        channel_id = message_id % CHANNELS + 1
+        author = channel_id
+        store['message_data'][message_id] = Message(
+            author, f'message number {message_id} in channel {channel_id}',
+            1600000000 + message_id, message_id, channel_id, True, None,
+            False, False)
+        store['channel_data'][channel_id]['message_ids'].append(message_id)
+        store['message_ids'][message_id] = None
+        store['user_data'][author]['messages_sent'] += 1
+        store['message_counts'][author] = store['message_counts'].get(author, 0) + 1
+
+    return store
+
+
+def bench_json(store: dict, path: str) -> dict:
+    '''
+    Times the json.dump snapshots used before the binary codec, including the
+    pass turning the int keys json stringifies back into ints on restore
+    '''
+
+    start = time.perf_counter()
+    with open(path, 'w') as data_file:
+        json.dump(store, data_file, default=record_to_dict)
+    dump_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    read_snapshot(path)
+    restore_time = time.perf_counter() - start
+
+    return {
+        'dump': dump_time,
+        'restore': restore_time,
+        'size': os.path.getsize(path)
+    }
+
+
+def bench_binary(store: dict, path: str, codec: str, level: int) -> dict:
+    '''
+    Times the binary snapshots written by write_snapshot, compressed with a
+    codec from SNAPSHOT_CODECS
+    '''
+
+    start = time.perf_counter()
+    write_snapshot(path, store, 0, codec, level)
+    dump_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    restored, _ = read_snapshot(path)
+    restore_time = time.perf_counter() - start
+
+    assert restored == store
+
+    return {
+        'dump': dump_time,
+        'restore': restore_time,
+        'size': os.path.getsize(path)
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--messages', type=int, nargs='+',
+                        default=[10000, 100000, 1000000])
+    parser.add_argument('--codecs', nargs='+', choices=list(SNAPSHOT_CODECS),
+                        default=list(SNAPSHOT_CODECS))
+    parser.add_argument('--level', type=int, default=None,
+                        help='compression level, the default of each codec if not given')
+    arguments = parser.parse_args()
+
+    print(f'{"messages":>10} {"codec":>7} {"dump (s)":>10} {"restore (s)":>12} {"size (MB)":>10}')
+
+    with tempfile.TemporaryDirectory() as directory:
+        for num_messages in arguments.messages:
+            store = build_store(num_messages)
+
+            results = {
+                'json': bench_json(store, os.path.join(directory, 'data_store.json'))
+            }
+            for codec in arguments.codecs:
+                results[codec] = bench_binary(store, os.path.join(
+                    directory, 'data_store.snapshot'), codec, arguments.level)
+
+            for codec, result in results.items():
+                print(f'{num_messages:>10} {codec:>7} {result["dump"]:>10.3f} '
+                      f'{result["restore"]:>12.3f} {result["size"] / 1e6:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+'''
+Times sending a message as the workspace grows, in each storage engine (see
+src/storage_engine.py). Sending a message updates its author's stats, whose
+involvement_rate used to count the author's messages by looking through
+every message, and the workspace's stats, whose utilization_rate looked
+through every user, so the time to send one grew with the workspace. The
+workspace is filled up to each of --messages in turn, with a user in the
+channel for every MESSAGES_PER_USER messages, and --sends messages are sent
+and timed at each size.
+
+The results are printed as json, and written to --output if given.
+
+Usage (from the repository root):
+    python -m benchmarks.stats_latency_bench [--engines dict sqlite]
+        [--messages 1000 10000 100000] [--sends 1000] [--output results.json]
+'''
+
+import os
+import json
+import time
+import argparse
+import importlib
+import tempfile
+
+from src import config
+from src import dict_store
+from src.storage_engine import ENGINES, check_engine
+
+# the workspace has a user in the channel for every this many messages
+MESSAGES_PER_USER = 10
+
+
+def add_users(engine, first_id: int, last_id: int) -> None:
+    '''
+    Adds the users with ids first_id to last_id to an engine's data_store,
+    in its one channel, which the first user creates
+    '''
+
+    for user_id in range(first_id, last_id + 1):
+        engine.add_user(user_id, ('First', 'Last', f'user{user_id}@gmail.com'),
+                        'password', f'user{user_id}', user_id == 1)
+        engine.start_user_stats(user_id, 0)
+        if user_id == 1:
+            engine.add_channel(1, 'channel', 1, True, 0)
+        else:
+            engine.add_member_to_channel(1, user_id, 0)
+
+
+def send(engine, message_id: int, num_users: int) -> None:
+    engine.add_message(True, message_id % num_users + 1, 1, message_id, 'message', message_id)
+
+
+def bench_engine(name: str, arguments, directory: str) -> dict:
+    '''
+    Grows the workspace of an engine and times sending messages at each size
+
+    Return Value:
+        results (dict): number of users and timings of a send by number of
+                        messages
+    '''
+
+    config.snapshot_dir = os.path.join(directory, name, 'snapshots')
+    config.legacy_snapshot_paths = []
+    config.mutation_log_path = os.path.join(directory, name, 'data_store.log')
+    config.sqlite_path = os.path.join(directory, name, 'data_store.sqlite3')
+    os.makedirs(os.path.join(directory, name))
+
+    engine = importlib.import_module(ENGINES[name])
+    check_engine(engine)
+    engine.data_restore()
+    engine.reset_data_store_to_default()
+    engine.start_workspace_stats(0)
+
+    results = {}
+    num_users = 0
+    message_id = 0
+    for num_messages in sorted(arguments.messages):
+        users = max(1, num_messages // MESSAGES_PER_USER)
+        add_users(engine, num_users + 1, users)
+        num_users = max(num_users, users)
+
+        while message_id < num_messages:
+            message_id += 1
+            send(engine, message_id, num_users)
+
+        durations = []
+        for _ in range(arguments.sends):
+            message_id += 1
+            start = time.perf_counter_ns()
+            send(engine, message_id, num_users)
+            durations.append(time.perf_counter_ns() - start)
+
+        durations.sort()
+        results[num_messages] = {
+            'users': num_users,
+            'mean_us': sum(durations) / len(durations) / 1000,
+            'p50_us': durations[len(durations) // 2] / 1000,
+            'p99_us': durations[min(len(durations) - 1, len(durations) * 99 // 100)] / 1000
+        }
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--engines', nargs='+', choices=list(ENGINES), default=list(ENGINES))
+    parser.add_argument('--messages', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--sends', type=int, default=1000)
+    parser.add_argument('--output', help='file to write the json results to')
+    arguments = parser.parse_args()
+
+    results = {'parameters': vars(arguments), 'engines': {}}
+    with tempfile.TemporaryDirectory() as directory:
+        for name in arguments.engines:
+            results['engines'][name] = bench_engine(name, arguments, directory)
+
+        if dict_store._mutation_log is not None:
+            dict_store._mutation_log.close()
+
+    print(json.dumps(results, indent=4))
+    if arguments.output:
+        with open(arguments.output, 'w') as output_file:
+            output_file.write(json.dumps(results, indent=4) + '\n')
+
+
+if __name__ == '__main__':
+    main()
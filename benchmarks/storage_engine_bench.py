@@ -0,0 +1,221 @@
+'''
+Times each operation of each storage engine (see src/storage_engine.py) on
+the same workspace: users, channels with every user in them and messages
+spread across the channels. Each operation is called --calls times and the
+mean, median and 99th percentile time of a call is printed for each engine,
+so an engine can be compared with the others operation by operation.
+
+The results are printed as a table, and written as json to --output if given.
+
+Usage (from the repository root):
+    python -m benchmarks.storage_engine_bench [--engines dict sqlite]
+        [--users 100] [--channels 10] [--messages 10000] [--calls 1000]
+        [--output results.json]
+'''
+
+import os
+import json
+import time
+import argparse
+import importlib
+import itertools
+import tempfile
+import contextlib
+
+from src import config
+from src import dict_store
+from src.storage_engine import ENGINES, check_engine
+
+
+def build_workspace(engine, num_users: int, num_channels: int, num_messages: int) -> None:
+    '''
+    Fills an engine's data_store with users, channels with every user in them
+    and messages sent by each user in turn, across the channels in turn
+    '''
+
+    engine.start_workspace_stats(0)
+    for user_id in range(1, num_users + 1):
+        engine.add_user(user_id, ('First', 'Last', f'user{user_id}@gmail.com'),
+                        'password', f'user{user_id}', user_id == 1)
+        engine.start_user_stats(user_id, 0)
+        engine.add_session_token(f'token{user_id}', user_id)
+
+    for channel_id in range(1, num_channels + 1):
+        engine.add_channel(channel_id, f'channel{channel_id}', 1, True, 0)
+        for user_id in range(2, num_users + 1):
+            engine.add_member_to_channel(channel_id, user_id, 0)
+
+    engine.add_dm(1, 'user1, user2', 1, 0)
+    engine.add_user_to_dm(1, 2, 0)
+
+    for message_id in range(1, num_messages + 1):
+        engine.add_message(True, message_id % num_users + 1, message_id % num_channels + 1,
+                           message_id, f'message number {message_id}', message_id)
+    engine.reserve_ids('message', num_messages)
+    engine.add_passwordreset_key(1, 'reset')
+
+
+def get_operation_calls(engine, num_users: int, num_channels: int, num_messages: int) -> list:
+    '''
+    Gets a call of each operation to time, in the order they are timed
+
+    Return Value:
+        calls (list): (name, limit, call) tuples, call(i) makes the i'th call
+                      of the operation, limit caps how many calls are made
+                      (None for no cap)
+    '''
+
+    def user(i):
+        return i % num_users + 1
+
+    def channel(i):
+        return i % num_channels + 1
+
+    def message(i):
+        return i % num_messages + 1
+
+    def newest(channel_id, count=50):
+        return list(itertools.islice(reversed(engine.get_messages_by_channel(channel_id)), count))
+
+    # ids of the messages sent by add_message, removed by remove_message
+    sent = []
+
+    def send(i):
+        message_id = engine.allocate_id('message')
+        engine.add_message(True, user(i), channel(i), message_id, 'benchmark message', i)
+        sent.append((channel(i), message_id))
+
+    # every user but the first is a member of every channel, so each is
+    # added to a new channel once and removed from it once
+    engine.add_channel(num_channels + 1, 'benchmark', 1, True, 0)
+
+    return [
+        ('get_user', None, lambda i: engine.get_user(user(i))),
+        ('get_user_ids', None, lambda i: user(i) in engine.get_user_ids()),
+        ('get_user_emails', None, lambda i: f'user{user(i)}@gmail.com' in engine.get_user_emails()),
+        ('get_user_id_by_email', None, lambda i: engine.get_user_id_by_email(f'user{user(i)}@gmail.com')),
+        ('get_user_id_by_handle', None, lambda i: engine.get_user_id_by_handle(f'user{user(i)}')),
+        ('get_user_channels', None, lambda i: list(engine.get_user_channels(user(i)))),
+        ('get_global_owners', None, lambda i: user(i) in engine.get_global_owners()),
+        ('get_all_valid_tokens', None, lambda i: f'token{user(i)}' in engine.get_all_valid_tokens()),
+        ('get_passwordreset_key', None, lambda i: engine.get_passwordreset_key('reset')),
+        ('get_channel', None, lambda i: engine.get_channel(channel(i))),
+        ('get_channel_ids', None, lambda i: channel(i) in engine.get_channel_ids()),
+        ('get_dm', None, lambda i: engine.get_dm(1)),
+        ('get_messages_by_channel', None, lambda i: newest(channel(i))),
+        ('get_message_by_id', None, lambda i: engine.get_message_by_id(message(i))),
+        ('get_message_conversation', None, lambda i: engine.get_message_conversation(message(i))),
+        ('get_messages_containing', None,
+         lambda i: engine.get_messages_containing(newest(channel(i)), 'number 1')),
+        ('get_user_stats', None, lambda i: engine.get_user_stats(user(i))),
+        ('get_workspace_stats', None, lambda i: engine.get_workspace_stats()),
+        ('get_user_notifications', None, lambda i: list(engine.get_user_notifications(user(i)))),
+        ('allocate_id', None, lambda i: engine.allocate_id('message')),
+        ('add_session_token', None, lambda i: engine.add_session_token(f'benchmark{i}', user(i))),
+        ('remove_session_token', None, lambda i: engine.remove_session_token(f'benchmark{i}')),
+        ('add_notification', None,
+         lambda i: engine.add_notification(True, channel(i), user(i), 'user1 tagged you')),
+        ('edit_user', None, lambda i: engine.edit_user(user(i), 'first_name', f'First{i}')),
+        ('add_member_to_channel', num_users - 1,
+         lambda i: engine.add_member_to_channel(num_channels + 1, i + 2, i)),
+        ('remove_member_from_channel', num_users - 1,
+         lambda i: engine.remove_member_from_channel(num_channels + 1, i + 2, i)),
+        ('add_message', None, send),
+        ('set_message_content', None, lambda i: engine.set_message_content(message(i), 'edited')),
+        ('react_message', None, lambda i: engine.react_message(user(i), message(i), 1)),
+        ('pin_message', None, lambda i: engine.pin_message(message(i))),
+        ('remove_message', None, lambda i: engine.remove_message(True, *sent[i], i))
+    ]
+
+
+def time_calls(call, num_calls: int) -> dict:
+    '''
+    Calls an operation num_calls times
+
+    Return Value:
+        { calls     (int): calls made
+          mean_us (float): mean microseconds a call took
+          p50_us  (float): median microseconds
+          p99_us  (float): 99th percentile microseconds }
+    '''
+
+    durations = []
+    for i in range(num_calls):
+        start = time.perf_counter_ns()
+        call(i)
+        durations.append(time.perf_counter_ns() - start)
+
+    durations.sort()
+    return {
+        'calls': num_calls,
+        'mean_us': sum(durations) / num_calls / 1000,
+        'p50_us': durations[num_calls // 2] / 1000,
+        'p99_us': durations[min(num_calls - 1, num_calls * 99 // 100)] / 1000
+    }
+
+
+def bench_engine(name: str, arguments, directory: str) -> dict:
+    '''
+    Builds the workspace in an engine and times each of its operations
+
+    Return Value:
+        results (dict): time_calls results by operation name
+    '''
+
+    config.snapshot_dir = os.path.join(directory, name, 'snapshots')
+    config.legacy_snapshot_paths = []
+    config.mutation_log_path = os.path.join(directory, name, 'data_store.log')
+    config.sqlite_path = os.path.join(directory, name, 'data_store.sqlite3')
+    os.makedirs(os.path.join(directory, name))
+
+    engine = importlib.import_module(ENGINES[name])
+    check_engine(engine)
+    engine.data_restore()
+    engine.reset_data_store_to_default()
+    build_workspace(engine, arguments.users, arguments.channels, arguments.messages)
+
+    results = {}
+    calls = get_operation_calls(engine, arguments.users, arguments.channels, arguments.messages)
+    for operation, limit, call in calls:
+        num_calls = arguments.calls if limit is None else min(arguments.calls, limit)
+        results[operation] = time_calls(call, num_calls)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--engines', nargs='+', choices=list(ENGINES), default=list(ENGINES))
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--channels', type=int, default=10)
+    parser.add_argument('--messages', type=int, default=10000)
+    parser.add_argument('--calls', type=int, default=1000)
+    parser.add_argument('--output', help='file to write the json results to')
+    arguments = parser.parse_args()
+
+    results = {'parameters': vars(arguments), 'engines': {}}
+    with tempfile.TemporaryDirectory() as directory:
+        for name in arguments.engines:
+            # the stats print as they are updated, keep the table readable
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                results['engines'][name] = bench_engine(name, arguments, directory)
+
+        if dict_store._mutation_log is not None:
+            dict_store._mutation_log.close()
+
+    header = f'{"operation":<28}' + ''.join(f'{name + " mean/p50/p99 (us)":>34}'
+                                            for name in arguments.engines)
+    print(header)
+    for operation in results['engines'][arguments.engines[0]]:
+        row = f'{operation:<28}'
+        for name in arguments.engines:
+            timing = results['engines'][name][operation]
+            row += f'{timing["mean_us"]:>14.1f}{timing["p50_us"]:>10.1f}{timing["p99_us"]:>10.1f}'
+        print(row)
+
+    if arguments.output:
+        with open(arguments.output, 'w') as output_file:
+            output_file.write(json.dumps(results, indent=4) + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -20,9 +20,11 @@ from src.data_operations import (
 )
 
 from src.other import decode_token
+from src.locks import locked, users_locked
 from datetime import timezone, datetime
 
 
+@users_locked()
 def admin_user_remove_v1(token: str, u_id: int) -> dict:
     '''
     Removes a user from Streams, including all channels and dms. Their messages
@@ -60,34 +62,41 @@ def admin_user_remove_v1(token: str, u_id: int) -> dict:
     edit_user(u_id, 'last_name', 'user')
 
     # get a list of all the channels the user is in and change the messages
-    channels_list = get_user_channels(u_id)
-    dm_list = get_user_dms(u_id)
-
-    # edit channel messages
-    for channel_id in channels_list:
-        for message_id in get_channel_messages(channel_id):
-            message_author = get_message_by_id(message_id)['author']
-            if message_author == u_id:
-                edit_message(True, channel_id, message_id, 'Removed user')
-
-    # edit dm messages
-    for dm_id in dm_list:
-        for message_id in get_messages_by_dm(dm_id):
-            message_author = get_message_by_id(message_id)['author']
-            if message_author == u_id:
-                edit_message(False, dm_id, message_id, 'Removed user')
-
-    # time created
-    dt = datetime.now()
-    time_created = int(dt.timestamp())
-
-    # remove user from every channel and dm
-    for channel_id in reversed(channels_list):
-        remove_member_from_channel(channel_id, u_id, time_created)
-
-    for dm_id in reversed(dm_list):
-        if u_id in get_dm(dm_id)['members']:
-            remove_member_from_dm(dm_id, u_id, time_created)
+    channels_list = list(get_user_channels(u_id))
+    dm_list = list(get_user_dms(u_id))
+
+    # no request reaches the user's channels and dms while their messages are
+    # replaced and they are removed from them
+    conversations = dict.fromkeys(((True, channel_id) for channel_id in channels_list), True)
+    conversations.update(dict.fromkeys(((False, dm_id) for dm_id in dm_list), True))
+
+    with locked(conversations):
+        # edit channel messages
+        for channel_id in channels_list:
+            for message_id in get_channel_messages(channel_id):
+                message_author = get_message_by_id(message_id)['author']
+                if message_author == u_id:
+                    edit_message(True, channel_id, message_id, 'Removed user')
+
+        # edit dm messages
+        for dm_id in dm_list:
+            for message_id in get_messages_by_dm(dm_id):
+                message_author = get_message_by_id(message_id)['author']
+                if message_author == u_id:
+                    edit_message(False, dm_id, message_id, 'Removed user')
+
+        # time created
+        dt = datetime.now()
+        time_created = int(dt.timestamp())
+
+        # remove user from every channel and dm
+        for channel_id in reversed(channels_list):
+            remove_member_from_channel(channel_id, u_id, time_created)
+
+        for dm_id in reversed(dm_list):
+            if u_id in get_dm(dm_id)['members']:
+                remove_member_from_dm(dm_id, u_id, time_created)
+
     # Remove user so data is reuseable
     remove_user_details(u_id)
 
@@ -99,6 +108,7 @@ def admin_user_remove_v1(token: str, u_id: int) -> dict:
     return {}
 
 
+@users_locked()
 def admin_userpermission_change_v1(token: str, u_id: int, permission_id: int) -> dict:
     '''
     Removes a user from Streams, including all channels and dms. Their messages
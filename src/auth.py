@@ -21,7 +21,7 @@ from src.data_operations import (
     get_user_emails,
     get_user_ids,
     get_all_valid_tokens,
-    get_complete_user_ids,
+    allocate_id,
     get_user_handles,
     get_user,
     add_session_token,
@@ -32,6 +32,7 @@ from src.data_operations import (
     initialise_user_stats
 )
 from src.other import encode_token, decode_token, get_uid_by_email
+from src.locks import users_locked
 from src.user import user_profile_uploadphoto_v1
 
 
@@ -115,6 +116,7 @@ def auth_login_v1(email: str, password: str) -> Dict[str, int]:
     }
 
 
+@users_locked()
 def auth_register_v1(email: Optional[str] = '', password: Optional[str] = '', name_first: Optional[str] = '', name_last: Optional[str] = '') -> Dict[str, int]:
     '''
     Registers user using an email, password, first name and last name.
@@ -162,8 +164,8 @@ def auth_register_v1(email: Optional[str] = '', password: Optional[str] = '', na
     # get a unique user_handle
     user_handle = generate_user_handle(name_first, name_last)
 
-    # get new auth_user_id (length prev + 1)
-    new_user_id = len(get_complete_user_ids()) + 1
+    # get new auth_user_id
+    new_user_id = allocate_id('user')
 
     # check whether user is global owner
     user_information = name_first, name_last, email
@@ -257,6 +259,7 @@ def auth_passwordreset_request(email: str) -> dict:
     return {}
 
 
+@users_locked()
 def auth_passwordreset_reset(reset_code: int, new_password: str) -> dict:
     '''
     Given an email address, if the user is a registered user, sends them an email containing \
@@ -287,6 +290,7 @@ def auth_passwordreset_reset(reset_code: int, new_password: str) -> dict:
     return {}
 
 
+@users_locked()
 def oauth_register_v1(email: str = '', name_first: str = '', name_last: str = '', image_url: str = '') -> Dict[str, int]:
     '''
     Registers user using an email, first name and last name via Oauth.
@@ -314,8 +318,8 @@ def oauth_register_v1(email: str = '', name_first: str = '', name_last: str = ''
         # get a unique user_handle
         user_handle = generate_user_handle(name_first, name_last)
 
-        # get new auth_user_id (length prev + 1)
-        user_id = len(get_complete_user_ids()) + 1
+        # get new auth_user_id
+        user_id = allocate_id('user')
 
         # check whether user is global owner
         user_information = name_first, name_last, email
@@ -11,7 +11,9 @@ Functions:
 from typing_extensions import TypedDict
 from src.error import InputError, AccessError
 from src.other import decode_token
+from src.locks import users_locked, conversation_locked
 from src.data_operations import (
+    get_read_view,
     get_message_ids,
     get_user_ids,
     get_channel_ids,
@@ -25,6 +27,7 @@ from src.data_operations import (
     remove_owner_from_channel,
     remove_member_from_channel,
 )
+import itertools
 from datetime import timezone, datetime
 
 # Type definitions
@@ -43,6 +46,8 @@ class channel_messages(TypedDict):
     end: int
 
 
+@users_locked(write=False)
+@conversation_locked(True, 'channel_id')
 def channel_invite_v1(token: str, channel_id: int, u_id: int) -> dict:
     '''
     A user invites another user and gives access to a channel and adds them to the channel
@@ -99,6 +104,7 @@ def channel_invite_v1(token: str, channel_id: int, u_id: int) -> dict:
     }
 
 
+@conversation_locked(True, 'channel_id', write=False)
 def channel_details_v1(token: str, channel_id: int) -> channel_details:
     '''
     Generates all details of a selected channel such as channel name, the owners of the channel,
@@ -174,6 +180,7 @@ def channel_details_v1(token: str, channel_id: int) -> channel_details:
     return return_dict
 
 
+@conversation_locked(True, 'channel_id', write=False, snapshot_reads=True)
 def channel_messages_v1(token: str, channel_id: int, start: int) -> channel_messages:
     '''
     Retrieves data of up to 50 sent messages for pagination
@@ -197,45 +204,44 @@ def channel_messages_v1(token: str, channel_id: int, start: int) -> channel_mess
           end       (int): index of final message retrieved (-1 if final message) }
     '''
     auth_user_id = decode_token(token)
+    reads = get_read_view()
 
     # checks for invalid channel_id
-    if channel_id not in get_channel_ids():
+    if channel_id not in reads.get_channel_ids():
         raise InputError(description='Channel_id does not exist')
 
     # checks if auth_user_id is a channel member
-    if auth_user_id not in get_channel(channel_id)['members']:
+    if auth_user_id not in reads.get_channel(channel_id)['members']:
         raise AccessError(description='User is not channel member')
 
     result_arr = []
-    # Gets all the messages in the channel sorted from recent to old
-    message_id_list = list(reversed(get_messages_by_channel(channel_id)))
+    message_ids = reads.get_messages_by_channel(channel_id)
+    num_messages = len(message_ids)
     end = start + 50
 
     # checks that start does not exceed total messages
-    if start > len(message_id_list):
+    if start > num_messages:
         raise InputError(description='Start number exceeds total messages')
 
-    for message_pos, message_id in enumerate(message_id_list):
-        # if message in given range
-        if start <= message_pos < end:
-            message_info = get_message_by_id(message_id)
-
-            # add message to message_list
-            result_arr.append({
-                'message_id': message_id,
-                'u_id': message_info['author'],
-                'message': message_info['content'],
-                'time_created': message_info['time_created'],
-                'reacts': message_info['reacts'],
-                'is_pinned': message_info['is_pinned']
-            })
-
-        # if past 50 messages, then exit
-        if message_pos == end - 1:
-            break
+    # Gets the 50 messages from start, walking from recent to old without
+    # copying the rest of the channel's messages
+    page = list(itertools.islice(reversed(message_ids), start, end))
+
+    for message_id in page:
+        message_info = reads.get_message_by_id(message_id)
+
+        # add message to message_list
+        result_arr.append({
+            'message_id': message_id,
+            'u_id': message_info['author'],
+            'message': message_info['content'],
+            'time_created': message_info['time_created'],
+            'reacts': message_info['reacts'],
+            'is_pinned': message_info['is_pinned']
+        })
 
     # checks if 50 messages are displayed
-    if end > len(message_id_list) - 1:
+    if end > num_messages - 1:
         end = -1
 
     return {
@@ -245,6 +251,8 @@ def channel_messages_v1(token: str, channel_id: int, start: int) -> channel_mess
     }
 
 
+@users_locked(write=False)
+@conversation_locked(True, 'channel_id')
 def channel_join_v1(token: str, channel_id: int) -> dict:
     '''
     Adds user to a channel
@@ -291,6 +299,8 @@ def channel_join_v1(token: str, channel_id: int) -> dict:
     }
 
 
+@users_locked(write=False)
+@conversation_locked(True, 'channel_id')
 def channel_leave_v1(token: str, channel_id: int) -> dict:
     '''
     Removes a member from the channel
@@ -325,7 +335,7 @@ def channel_leave_v1(token: str, channel_id: int) -> dict:
 
     # check if user is the owner of the channel
     if auth_user_id in channel_owner:
-        channel_owner.remove(auth_user_id)
+        remove_owner_from_channel(auth_user_id, channel_id)
 
     dt = datetime.now()
     time_created = int(dt.timestamp())
@@ -336,6 +346,7 @@ def channel_leave_v1(token: str, channel_id: int) -> dict:
     return {}
 
 
+@conversation_locked(True, 'channel_id')
 def channel_addowner_v1(token: str, channel_id: int, u_id: int) -> dict:
     '''
     Promotes a channel member to owner
@@ -389,6 +400,7 @@ def channel_addowner_v1(token: str, channel_id: int, u_id: int) -> dict:
     return {}
 
 
+@conversation_locked(True, 'channel_id')
 def channel_removeowner_v1(token: str, channel_id: int, u_id: int) -> dict:
     '''
     Removes user as channel owner
@@ -7,7 +7,7 @@ Functions:
     channels_create_v1(auth_user_id: int, name: str, is_public: bool) -> dict
 '''
 
-from src.data_operations import get_channel_ids, get_channel, add_channel
+from src.data_operations import add_channel, allocate_id, get_read_view
 from src.other import decode_token
 from src.error import InputError
 from datetime import timezone, datetime
@@ -31,14 +31,15 @@ def channels_list_v1(token: str) -> Dict[str, list]:
     '''
 
     auth_user_id = decode_token(token)
+    reads = get_read_view()
 
     channel_list = []
     # get channel id
-    for channel in get_channel_ids():
-        if auth_user_id in get_channel(channel)['members']:
+    for channel in list(reads.get_channel_ids()):
+        if auth_user_id in reads.get_channel(channel)['members']:
             channel_list.append({
                 'channel_id': channel,
-                'name': get_channel(channel)['name']
+                'name': reads.get_channel(channel)['name']
             })
 
     return {
@@ -62,13 +63,14 @@ def channels_listall_v1(token: str) -> Dict[str, list]:
     '''
 
     decode_token(token)
+    reads = get_read_view()
 
     all_channels = []
     # get all channel ids
-    for channel in get_channel_ids():
+    for channel in list(reads.get_channel_ids()):
         all_channels.append({
             'channel_id': channel,
-            'name': get_channel(channel)['name']
+            'name': reads.get_channel(channel)['name']
         })
 
     return {
@@ -103,7 +105,7 @@ def channels_create_v1(token: str, name: str, is_public: bool) -> Dict[str, int]
         raise InputError(description='Invalid channel name size')
 
     # get a new id for the channel and add channel to system
-    new_channel_id = len(get_channel_ids()) + 1
+    new_channel_id = allocate_id('channel')
     dt = datetime.now()
     time_created = int(dt.timestamp())
     add_channel(new_channel_id, name, auth_user_id, is_public, time_created)
@@ -1,3 +1,46 @@
 port = 8080
 
 url = f"http://localhost:{port}/"
+
+# the storage engine keeping the data_store (see src/storage_engine.py):
+# 'dict' holds it in memory and persists it as snapshots and a mutation log,
+# 'sqlite' keeps it in the SQLite database at sqlite_path, which several
+# server processes can share
+storage_backend = 'dict'
+sqlite_path = 'data_store.sqlite3'
+
+# 'direct' makes each change to the data_store in the thread of the request
+# making it. 'pipeline' hands every change to one writer thread
+# (src/pipeline.py), which makes them in batches of up to pipeline_batch_size,
+# syncs them to disk once a batch if pipeline_group_commit, and publishes a
+# snapshot the busiest read requests read without taking locks
+write_mode = 'direct'
+pipeline_batch_size = 64
+pipeline_group_commit = True
+
+# persistence of the data_store
+snapshot_dir = 'data_store_snapshots'
+legacy_snapshot_paths = ['data_store.snapshot', 'data_store.json']
+restore_workers = 8
+lazy_message_restore = True
+# 'dict' holds each message as a record, 'columnar' holds them all in the
+# columns of a src.message_store.ColumnarMessageData, which takes far less
+# memory per message but loads every message on restore
+message_store = 'dict'
+# one of src.persistence.SNAPSHOT_CODECS: none, zlib, gzip or lzma, and its
+# level (None for the codec's default)
+snapshot_codec = 'zlib'
+snapshot_codec_level = None
+mutation_log_path = 'data_store.log'
+dump_interval = 1
+checkpoint_log_size = 4 * 1024 * 1024
+checkpoint_interval = 60
+
+# jobs waiting in src/scheduler.py due within this many seconds of each
+# other run in the same tick, and scheduled messages among them are sent in
+# one batch for each channel or dm
+scheduler_tick = 0.01
+
+# ids are reserved for each kind of record this many at a time, so the
+# reservation is logged once per block instead of once per id
+id_block_size = 100
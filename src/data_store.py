@@ -29,7 +29,7 @@ Example usage:
 DATA INSIDE:
     - user_data
         key = auth_user_id
-        -> dictionary with keys
+        -> User record (see src/records.py) with keys
             - 'first_name'
             - 'last_name'
             - 'email_address'
@@ -38,23 +38,27 @@ DATA INSIDE:
             - 'global_owner'
     - user_handles
         quick access to all handles
+        (the ids and uniqueness lists are dicts from each value to None, for
+        O(1) lookups that still iterate in the order values were added)
     - user_emails
         quick access to all emails
     - user_ids
         quick access to all user ids
     - channel_data
         key = channel_id
-        -> dictionary with keys
+        -> Channel record with keys
             - 'name'
             - 'owner'
             - 'is_public'
             - 'members'
             - 'message_ids'
+        (owner and members are dicts from each user_id to None, for O(1)
+        membership checks that still iterate in the order users joined)
     - channel_ids
         quick access to all channel ids
     - dm_data
         key = dm_id
-        -> dictionary with keys
+        -> Dm record with keys
             - 'name'
             - 'owner'
             - 'members'
@@ -65,7 +69,7 @@ DATA INSIDE:
         quick access to all global_owner ids
     - message_data
         key = message_id
-        -> dictionary with keys
+        -> Message record with keys
             - 'author'
             - 'content'
             - 'time_created'
@@ -78,24 +82,47 @@ DATA INSIDE:
     - password_reset_key
         key = reset_key
         -> user_id associated with reset_key
+    - message_counts
+        key = user_id
+        -> number of the messages in message_data the user wrote, users
+           with none are left out
+    - involved_users
+        number of the users in user_ids who are in at least one channel or
+        dm, kept for the utilization_rate
+    - id_blocks
+        key = 'user', 'channel', 'dm' or 'message'
+        -> highest id reserved for that kind of record, ids up to it may
+           already have been handed out and are never given out again
+    - scheduled_jobs
+        key = message_id of the message the job sends
+        -> dictionary with keys
+            - 'time_due'
+            - 'kind'
+            - 'is_channel'
+            - 'conversation_id'
+            - 'arguments'
 '''
 
 initial_object = {
     'user_data'         : {},
-    'user_handles'      : [],
-    'user_emails'       : [],
-    'user_ids'          : [],
+    'user_handles'      : {},
+    'user_emails'       : {},
+    'user_ids'          : {},
     'channel_data'      : {},
-    'channel_ids'       : [],
+    'channel_ids'       : {},
     'dm_data'           : {},
-    'dm_ids'            : [],
-    'global_owners'     : [],
+    'dm_ids'            : {},
+    'global_owners'     : {},
     'message_data'      : {},
-    'message_ids'       : [],
+    'message_ids'       : {},
     'token'             : {},
     'password_reset_key': {},
     'user_stats'        : {},
-    'workspace_stats'   : {}
+    'workspace_stats'   : {},
+    'message_counts'    : {},
+    'involved_users'    : 0,
+    'id_blocks'         : {'user': 0, 'channel': 0, 'dm': 0, 'message': 0},
+    'scheduled_jobs'    : {}
 }
 ## YOU SHOULD MODIFY THIS OBJECT ABOVE
 
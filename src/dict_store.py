@@ -0,0 +1,2276 @@
+'''
+The data_store held in memory as dicts and records, the 'dict' storage engine
+(see src/storage_engine.py). Only data_operations should use this module.
+
+Every mutation is recorded in a mutation log as it is made and the data_store
+is checkpointed to snapshots (see src/persistence.py), data_restore loads the
+last checkpoint and replays the log.
+
+Functions:
+    add_user(user_id: int, user_details: tuple,
+             password: str, user_handle: str, is_owner: bool)
+    remove_user_details(user_id: int)
+    get_user(user_id: int) -> dict
+    edit_user(user_id: int, key: str, new_value: str)
+    edit_user_permissions(user_id: int, permission_id: int)
+    get_user_handles() -> KeysView
+    get_user_emails() -> KeysView
+    get_user_id_by_email(email: str) -> int
+    get_user_id_by_handle(user_handle: str) -> int
+    get_user_ids() -> KeysView
+    add_member_to_channel(channel_id: int, user_id: int, time_updated: int)
+    remove_member_from_channel(channel_id: int, user_id: int)
+    add_channel(channel_id: int, channel_name: str, user_id: int,
+                is_public: bool)
+    get_channel(channel_id: int) -> dict
+    get_channel_messages() -> KeysView
+    get_channel_ids() -> KeysView
+    remove_member_from_dm(dm_id: int, user_id: int)
+    get_dm_messages(dm_id: int) -> KeysView
+    get_dm(dm_id: int) -> dict
+    get_dm_ids() -> KeysView
+    remove_dm(dm_id: int)
+    get_global_owners() -> KeysView
+    add_message(user_id: int, channel_id: int, message_id: int,
+                content: str, time_created: int)
+    add_messages(is_channel: bool, conversation_id: int, messages: list,
+                 notifications: list)
+    add_standup_message(channel_id: int, content: str)
+    clear_message_pack(channel_id: int)
+    remove_message(is_channel: bool, channel_id: int, message_id: int, message: str):
+    get_message_by_id(message_id: int) -> dict
+    get_message_conversation(message_id: int) -> tuple
+    get_messages_containing(message_ids: list, query_str: str) -> list
+    get_messages_by_channel(channel_id: int) -> KeysView
+    react_message(user_id: int, message_id: int, react_id: int)
+    get_user_notifications(user_id: int) -> list
+    set_active_standup(channel_id: int)
+    add_session_token(token: str, user_id: int)
+    remove_session_token(token: str)
+    set_message_content(message_id: int, message: str)
+    start_workspace_stats(time_intialised: int)
+    start_user_stats(user_id: int, time_intialised: int)
+    set_user_profileimage_url(user_id: int, image_url: str)
+    remove_owner_from_dm(user_id: int, dm_id: int)
+    add_scheduled_job(message_id: int, time_due: float, kind: str,
+                      is_channel: bool, conversation_id: int, arguments: list)
+    remove_scheduled_jobs(message_ids: list)
+    get_scheduled_jobs() -> dict
+    data_dump()
+    data_sync()
+    data_checkpoint()
+    get_persistence_stats() -> dict
+    export_data_store() -> dict
+    data_restore()
+    allocate_id(kind: str) -> int
+    reserve_ids(kind: str, last_id: int)
+'''
+
+from src.data_store import data_store
+from src import config
+from src.error import InputError, AccessError
+from src.records import User, Channel, Dm, Message, placeholder_message
+from src.message_store import ColumnarMessageData
+from src.storage_engine import (
+    ID_KINDS,
+    calculate_involvement_rate,
+    calculate_utilization_rate
+)
+from src.persistence import (
+    MutationLog,
+    SnapshotWriter,
+    channel_shard,
+    dm_shard,
+    get_shard_names,
+    freeze_shard,
+    assemble_store,
+    read_shards,
+    read_log,
+    read_snapshot,
+    resident_memory
+)
+import sys
+import time
+import functools
+import traceback
+import itertools
+import threading
+from typing_extensions import TypedDict
+from typing import Dict, Tuple, KeysView, Optional
+
+class get_user_type(TypedDict):
+    first_name: str
+    last_name: str
+    email_address: str
+    password: str
+    user_handle: str
+    global_owner: bool
+
+class get_channel_type(TypedDict):
+    name: str
+    owner: int
+    is_public: bool
+    members: list
+    message_ids: dict
+    
+class get_dm_type(TypedDict):
+    name: str
+    owner: int
+    members: list
+    message_ids: dict
+
+class get_message_by_id_type(TypedDict):
+    author: int
+    content: str
+    time_created: int
+    
+class get_user_stats_type(TypedDict):
+    channels_joined: int
+    dms_joined: int
+    messages_sent: int
+    involvement_rate: float
+    
+class get_workspace_stats_type(TypedDict):
+    channels_exist: int
+    dms_exist: int
+    messages_exist: int
+    utilization_rate: float
+
+
+# mutations are applied one at a time so the mutation log records them in the
+# order they were applied
+_mutation_lock = threading.RLock()
+_mutation_depth = 0
+_mutation_log = None
+_mutations = {}
+
+# counts the mutations applied to the data_store, a checkpoint is only written
+# when it has moved since the last one
+_generation = 0
+_snapshot_writer = None
+
+# maps each shard changed since the last checkpoint to the generation it was
+# last changed in (see src/persistence.py for the shards)
+_dirty_shards = {}
+_all_shards_dirty = False
+
+# a checkpoint copies the changed shards while holding the mutation lock and
+# writes them after releasing it, only one checkpoint is written at a time
+_checkpoint_lock = threading.Lock()
+_checkpoint_pause = 0.0
+
+# entries of the data_store holding ids or values that must be unique. They are
+# dicts from each value to None, so checking for a value is O(1) and iterating
+# gives the values in the order they were added. user_emails and user_handles
+# map each email and handle to the id of its user instead. Snapshots from older
+# versions hold them as lists.
+ID_INDEXES = (
+    'user_handles',
+    'user_emails',
+    'user_ids',
+    'channel_ids',
+    'dm_ids',
+    'global_owners',
+    'message_ids'
+)
+
+# seconds the last data_restore took
+_restore_duration = 0.0
+
+# each kind of record given ids by allocate_id (ID_KINDS) has a counter handing
+# out its ids, next() on an itertools.count is atomic so request and timer
+# threads allocate ids without taking a lock. The data_store keeps the highest id
+# reserved for each kind in id_blocks, moved on a block at a time, so ids
+# handed out before a restart are never handed out again.
+_id_counters = {kind: itertools.count(1) for kind in ID_KINDS}
+
+
+def mutation(function):
+    '''
+    Marks a function as one that changes the data_store. Each outermost
+    call, whether made through the data_operations facade or by the
+    pipeline's writer, is recorded in the mutation log, so it can be replayed
+    by data_restore. Calls a mutation makes to other mutations are not
+    recorded, replaying the outer call repeats them.
+
+    Arguments:
+        function (function): function that changes the data_store
+
+    Return Value:
+        wrapper (function): function that records the call and then makes it
+    '''
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        global _mutation_depth, _generation
+
+        with _mutation_lock:
+            if _mutation_depth == 0:
+                _generation += 1
+                if _mutation_log is not None:
+                    _mutation_log.append(function.__name__, args, kwargs)
+
+            _mutation_depth += 1
+            try:
+                return function(*args, **kwargs)
+            finally:
+                _mutation_depth -= 1
+
+    _mutations[function.__name__] = wrapper
+    return wrapper
+
+
+def _mark_dirty(*shards: str) -> None:
+    '''
+    Records that shards of the data_store have changed, so the next
+    checkpoint rewrites them
+
+    Arguments:
+        shards (str): names of the shards
+
+    Return Value:
+        None
+    '''
+
+    for shard in shards:
+        _dirty_shards[shard] = _generation
+
+
+def _mark_all_dirty() -> None:
+    '''
+    Records that the whole data_store has been replaced, so the next
+    checkpoint rewrites every shard and drops the old ones
+
+    Return Value:
+        None
+    '''
+
+    global _all_shards_dirty
+
+    _all_shards_dirty = True
+    _dirty_shards.clear()
+
+
+def _conversation_shard(is_channel: bool, conversation_id: int) -> str:
+    '''
+    Gets the shard holding a channel or dm
+    '''
+
+    if is_channel:
+        return channel_shard(conversation_id)
+    return dm_shard(conversation_id)
+
+
+def _message_shard(message_id: int) -> str:
+    '''
+    Gets the shard holding a message
+    '''
+
+    message = data_store.get()['message_data'][message_id]
+
+    # messages reserved by message_sendlater_v1 are not in a channel or dm yet
+    if message['is_channel'] == '':
+        return 'workspace'
+    return _conversation_shard(message['is_channel'], message['channel_created'])
+
+
+def _count_message(user_id: int, change: int) -> None:
+    '''
+    Changes the count of the messages a user has in the data_store, kept for
+    their involvement_rate. Users with none are left out.
+    '''
+
+    message_counts = data_store.get()['message_counts']
+    count = message_counts.get(user_id, 0) + change
+    if count:
+        message_counts[user_id] = count
+    else:
+        message_counts.pop(user_id, None)
+
+
+def _count_involvement(user_id: int, change: int) -> None:
+    '''
+    Counts a user joining (change 1) or leaving (change -1) a channel or dm
+    in the users kept for the utilization_rate, when it is the first they
+    are in or the last they leave. Removed users are left out.
+    '''
+
+    data_source = data_store.get()
+    user = data_source['user_data'][user_id]
+    num_conversations = len(user['in_channels']) + len(user['in_dms'])
+    if user_id in data_source['user_ids'] and num_conversations == (1 if change > 0 else 0):
+        data_source['involved_users'] += change
+
+
+@mutation
+def reset_data_store_to_default() -> None:
+    '''
+    Clears the contents of data_store
+
+    Return Value:
+        None
+    '''
+
+    # reset values in data_store
+    store = data_store.get()
+
+    store = {
+        'user_data': {},
+        'user_handles': {},
+        'user_emails': {},
+        'user_ids': {},
+        'channel_data': {},
+        'channel_ids': {},
+        'dm_data': {},
+        'dm_ids': {},
+        'global_owners': {},
+        'message_data': _new_message_data(),
+        'message_ids': {},
+        'token': {},
+        'password_reset_key': {},
+        'workspace_stats': {},
+        'user_stats': {},
+        'message_counts': {},
+        'involved_users': 0,
+        'id_blocks': dict.fromkeys(ID_KINDS, 0),
+        'scheduled_jobs': {}
+    }
+
+    # update data_store
+    data_store.set(store)
+    _mark_all_dirty()
+    _start_id_counters()
+
+
+@mutation
+def add_user(user_id: int, user_details: tuple, password: str, user_handle: str, is_owner: bool) -> None:
+    '''
+    Adds user to the database
+
+    Arguments:
+        user_id        (int): id of user being added
+        user_details   (tuple):
+        name_first     (str): first name of user
+        name_last      (str):last name of user
+        email          (str): email of user
+        password       (str): password of user
+        user_handle    (str): the generated handle of the user
+        is_owner       (bool): whether the user is an owner
+
+    Return Value:
+        None
+    '''
+
+    # get user's name and email
+    name_first, name_last, email = user_details
+
+    # get the data store
+    data_source = data_store.get()
+    _mark_dirty('users')
+
+    # add user_handle, email and user_id to their indexes
+    data_source['user_handles'][user_handle] = user_id
+    data_source['user_emails'][email] = user_id
+    data_source['user_ids'][user_id] = None
+
+    # add the user data to the database
+    data_source['user_data'][user_id] = User(
+        name_first,     # first_name
+        name_last,      # last_name
+        email,          # email_address
+        password,       # password
+        user_handle,    # user_handle
+        is_owner,       # global_owner
+        '',             # image_url
+        [],             # notifications
+        0,              # messages_sent
+        [],             # in_channels
+        []              # in_dms
+    )
+
+    if is_owner:
+        data_source['global_owners'][user_id] = None
+
+
+@mutation
+def remove_user_details(user_id: int) -> None:
+    '''
+    Removes the specified user
+
+    Arguments:
+        user_id (int): id of user
+
+    Return Value:
+        None
+    '''
+
+    data_source = data_store.get()
+    _mark_dirty('users', 'stats')
+
+    # get user_handle and email
+    user_handle = data_source['user_data'][user_id]['user_handle']
+    user_email = data_source['user_data'][user_id]['email_address']
+
+    # set user_handle and email to blank
+    data_source['user_data'][user_id]['user_handle'] = ''
+    data_source['user_data'][user_id]['email_address'] = ''
+
+    # remove them from the indexes of emails and user_handles
+    del data_source['user_handles'][user_handle]
+    del data_source['user_emails'][user_email]
+
+    # removed users are not counted in the utilization_rate
+    user = data_source['user_data'][user_id]
+    if user['in_channels'] or user['in_dms']:
+        data_source['involved_users'] -= 1
+    del data_source['user_ids'][user_id]
+
+
+def get_user_channels(user_id: int) -> list:
+    '''
+    Gets the list of channels the user is currently in
+
+    Arguments:
+        user_id (int): id of user
+
+    Return Value:
+        user_channels (list): list of all users' channels
+    '''
+
+    data_source = data_store.get()
+
+    return data_source['user_data'][user_id]['in_channels']
+
+
+def get_user_dms(user_id: int) -> list:
+    '''
+    Gets the list of channels the user is currently in
+
+    Arguments:
+        user_id (int): id of user
+
+    Return Value:
+        user_channels (list): list of all users' channels
+    '''
+
+    data_source = data_store.get()
+
+    return data_source['user_data'][user_id]['in_dms']
+
+
+def get_user(user_id: int) -> get_user_type:
+    '''
+    gets the user data from the database
+
+    Arguments:
+        user_id (int): id of user
+
+    Return Value:
+        { first_name    (str): user's first name
+          last_name     (str): user's last name
+          email_address (str): user's email address
+          password      (str): user's password
+          user_handle   (str): unique alphanumeric handle for user
+          global_owner (bool): True if user is global owner else False }
+    '''
+
+    data_source = data_store.get()
+    return data_source['user_data'][user_id]
+
+
+@mutation
+def edit_user(user_id: int, key: str, new_value: str) -> None:
+    '''
+    Edits the user's handle or email of the user
+
+    Arguments:
+        user_id          (int): id of user who's permissions will change
+        key              (str): the user's email or handle
+        new_value        (str): the user's new email or handle
+
+    Return Value:
+        None
+    '''
+    # get the data store
+    data_source = data_store.get()
+    _mark_dirty('users')
+
+    # get old value of property
+    old_value = data_source['user_data'][user_id][key]
+
+    if key == 'user_handle':
+        del data_source['user_handles'][old_value]
+        data_source['user_handles'][new_value] = user_id
+    elif key == 'email_address':
+        del data_source['user_emails'][old_value]
+        data_source['user_emails'][new_value] = user_id
+
+    # edit the property
+    data_source['user_data'][user_id][key] = new_value
+
+
+@mutation
+def edit_user_permissions(user_id: int, permission_id: int) -> None:
+    '''
+    Edits the user permissions of the user_id
+
+    Arguments:
+        user_id          (int): id of user who's permissions will change
+        permission_id    (int): permission to give to user
+
+    Return Value:
+        None
+    '''
+
+    data_source = data_store.get()
+    _mark_dirty('users')
+
+    if permission_id == 1:
+        data_source['user_data'][user_id]['global_owner'] = True
+        data_source['global_owners'][user_id] = None
+    if permission_id == 2:
+        data_source['user_data'][user_id]['global_owner'] = False
+        data_source['global_owners'].pop(user_id, None)
+
+
+def get_user_handles() -> KeysView:
+    '''
+    Gets the handles of all users from the database
+
+    Arguments:
+        None
+
+    Return Value:
+        user_handles (KeysView): all users' handles, in the order they were added
+    '''
+
+    data_source = data_store.get()
+    return data_source['user_handles'].keys()
+
+
+def get_user_emails() -> KeysView:
+    '''
+    gets the emails of all users from the database
+
+    Arguments:
+        None
+
+    Return Value:
+        user_emails (KeysView): all users' emails, in the order they were added
+    '''
+
+    data_source = data_store.get()
+    return data_source['user_emails'].keys()
+
+
+def get_user_id_by_email(email: str) -> Optional[int]:
+    '''
+    Gets the id of the user with an email
+
+    Arguments:
+        email (str): email of the user
+
+    Return Value:
+        user_id (int): id of the user, None if no user has the email
+    '''
+
+    data_source = data_store.get()
+    return data_source['user_emails'].get(email)
+
+
+def get_user_id_by_handle(user_handle: str) -> Optional[int]:
+    '''
+    Gets the id of the user with a handle
+
+    Arguments:
+        user_handle (str): handle of the user
+
+    Return Value:
+        user_id (int): id of the user, None if no user has the handle
+    '''
+
+    data_source = data_store.get()
+    return data_source['user_handles'].get(user_handle)
+
+
+def get_user_ids() -> KeysView:
+    '''
+    Gets the id's of all users from the database
+
+    Arguments:
+        None
+
+    Return Value:
+        user_ids (KeysView): all users' user_ids, in the order they were added
+    '''
+
+    data_source = data_store.get()
+    return data_source['user_ids'].keys()
+
+
+def get_complete_user_ids() -> KeysView:
+    '''
+    Gets the id's of all users from the database
+
+    Arguments:
+        None
+
+    Return Value:
+        user_ids (KeysView): all users' user_ids, in the order they were added
+    '''
+
+    data_source = data_store.get()
+    return data_source['user_data'].keys()
+
+
+@mutation
+def add_member_to_channel(channel_id: int, user_id: int, time_updated: int) -> None:
+    '''
+    Adds a user to a channel as a member
+
+    Arguments:
+        channel_id      (int): id of channel that user is being added to
+        user_id         (int): id of user being added to channel
+        time_updated    (int): time when user is added to channel
+
+    Return Value:
+        None
+    '''
+
+    data_source = data_store.get()
+    _mark_dirty(channel_shard(channel_id), 'users')
+
+    data_source['channel_data'][channel_id]['members'][user_id] = None
+    data_source['user_data'][user_id]['in_channels'].append(channel_id)
+    _count_involvement(user_id, 1)
+
+    num_of_channels = len(data_source['user_data'][user_id]['in_channels'])
+    channel_data = {
+        'num_channels_joined': num_of_channels,
+        'time_stamp': time_updated
+    }
+
+    update_user_stats(user_id, channel_data, False, False)
+
+
+@mutation
+def remove_member_from_channel(channel_id: int, user_id: int, time_updated: int) -> None:
+    '''
+    Removes a user from a channel
+
+    Arguments:
+        channel_id      (int): id of channel that user is being removed from
+        user_id         (int): id of user being removed from channel
+        time_updated    (int): time when member is removed from channel
+
+    Return Value:
+        None
+    '''
+    data_source = data_store.get()
+    _mark_dirty(channel_shard(channel_id), 'users')
+
+    data_source['channel_data'][channel_id]['owner'].pop(user_id, None)
+    del data_source['channel_data'][channel_id]['members'][user_id]
+    data_source['user_data'][user_id]['in_channels'].remove(channel_id)
+    _count_involvement(user_id, -1)
+
+    num_of_channels = len(data_source['user_data'][user_id]['in_channels'])
+    channel_data = {
+        'num_channels_joined': num_of_channels,
+        'time_stamp': time_updated
+    }
+
+    update_user_stats(user_id, channel_data, False, False)
+
+
+@mutation
+def add_channel(channel_id: int, channel_name: str, user_id: int, is_public: bool, time_created: int) -> None:
+    '''
+    adds channel data to the database
+
+    Arguments:
+        channel_id   (int): id of channel being added to database
+        channel_name (str): name of channel being added to database
+        user_id      (int): the user id of the owner of the channel
+        is_public    (bool): privacy status of the channel
+
+    Return Value:
+        None
+    '''
+
+    data_source = data_store.get()
+    _mark_dirty(channel_shard(channel_id), 'workspace', 'users')
+
+    # create channel and add channel data
+    data_source['channel_data'][channel_id] = Channel(
+        channel_name,       # name
+        {user_id: None},    # owner
+        is_public,          # is_public
+        {user_id: None},    # members
+        {                   # standup_data
+            'is_active': False,
+            'time_finish': None,
+            'message_package': []
+        },
+        {},                 # message_ids
+        time_created        # time_created
+    )
+
+    # add channel to channel_ids and channel to users' list of channels
+    data_source['channel_ids'][channel_id] = None
+    data_source['user_data'][user_id]['in_channels'].append(channel_id)
+    _count_involvement(user_id, 1)
+
+    num_user_channels = len(data_source['user_data'][user_id]['in_channels'])
+    channel_data = {
+        'num_channels_joined': num_user_channels,
+        'time_stamp': time_created
+    }
+
+    update_user_stats(user_id, channel_data, False, False)
+
+    num_of_channels = len(data_source['channel_ids'])
+    channel_data_2 = {
+        'num_channels_exist': num_of_channels,
+        'time_stamp': time_created
+    }
+
+    update_workspace_stats(channel_data_2, False, False)
+
+
+def get_channel(channel_id: int) -> get_channel_type:
+    '''
+    Gets the channel data from the database from a specific channel_id
+
+    Arguments:
+        channel_id (int): id of channel that the data is being retrieved for
+
+    Return Value:
+        { name         (str): name of the channel
+          owner        (int): int of the owner
+          is_public   (bool): True if channel public else False
+          members     (list): list of members' user_ids
+          message_ids (dict): message_ids of all messages sent, oldest first}
+    '''
+
+    data_source = data_store.get()
+    return data_source['channel_data'][channel_id]
+
+
+def get_channel_messages(channel_id: int) -> KeysView:
+    '''
+    Gets all the channel messages from the channel
+
+    Arguments:
+        channel_id        (int): id of channel
+
+    Return Value:
+        channel_messages (KeysView): ids of all channel messages, oldest first
+    '''
+
+    data_source = data_store.get()
+    return data_source['channel_data'][channel_id]['message_ids'].keys()
+
+
+def get_dm_messages(dm_id: int) -> KeysView:
+    '''
+    Gets all the dm messages from the dm
+
+    Arguments:
+        dm_id        (int): id of dm
+
+    Return Value:
+        dm_messages (KeysView): ids of all dm messages, oldest first
+    '''
+
+    data_source = data_store.get()
+    return data_source['dm_data'][dm_id]['message_ids'].keys()
+
+
+def get_channel_ids() -> KeysView:
+    '''
+    Gets a list of all the channel ids from the database
+
+    Arguments:
+        None
+
+    Return Value:
+        channel_ids (KeysView): all channel_ids, in the order they were added
+    '''
+
+    data_source = data_store.get()
+    return data_source['channel_ids'].keys()
+
+
+@mutation
+def remove_member_from_dm(dm_id: int, user_id: int, time_updated: int) -> None:
+    '''
+    Removes a user from a dm
+
+    Arguments:
+        dm_id   (int): id of dm that user is being removed from
+        user_id     (int): id of user being removed from dm
+        time_updated    (int): time when member is removed from dm
+
+    Return Value:
+        None
+    '''
+    data_source = data_store.get()
+    _mark_dirty(dm_shard(dm_id), 'users')
+
+    data_source['dm_data'][dm_id]['owner'].pop(user_id, None)
+    del data_source['dm_data'][dm_id]['members'][user_id]
+    data_source['user_data'][user_id]['in_dms'].remove(dm_id)
+    _count_involvement(user_id, -1)
+
+    num_of_dms = len(data_source['user_data'][user_id]['in_dms'])
+    dm_data = {
+        'num_channels_joined': num_of_dms,
+        'time_stamp': time_updated
+    }
+
+    update_user_stats(user_id, False, dm_data, False)
+
+
+@mutation
+def add_user_to_dm(dm_id: int, user_id: int, time_updated: int) -> None:
+    '''
+    adds user to a dm
+
+    Arguments:
+        dm_id           (int): id of dm being added to database
+        user_id         (int): the id of the user being added to the dm
+
+    Return Value:
+        None
+    '''
+
+    data_source = data_store.get()
+    _mark_dirty(dm_shard(dm_id), 'users')
+    data_source['dm_data'][dm_id]['members'][user_id] = None
+    data_source['user_data'][user_id]['in_dms'].append(dm_id)
+    _count_involvement(user_id, 1)
+
+    num_of_dms = len(data_source['user_data'][user_id]['in_dms'])
+
+    dm_data = {
+        'num_dms_joined': num_of_dms,
+        'time_stamp': time_updated
+    }
+
+    update_user_stats(user_id, False, dm_data, False)
+
+
+@mutation
+def add_dm(dm_id: int, dm_name: str, auth_user_id: int, time_created: int) -> None:
+    '''
+    adds dm data to the database
+
+    Arguments:
+        dm_id             (int): id of dm being added to database
+        dm_name           (str): name of dm being added to database
+        auth_user_id      (int): the user id of the owner of the dm
+
+    Return Value:
+        None
+    '''
+
+    data_source = data_store.get()
+    _mark_dirty(dm_shard(dm_id), 'workspace', 'users')
+
+    # create dm and add dm data
+    data_source['dm_data'][dm_id] = Dm(
+        dm_name,                # name
+        {auth_user_id: None},   # owner
+        {auth_user_id: None},   # members
+        {},                     # message_ids
+        time_created            # time_created
+    )
+
+    # add dm to dm_ids list
+    data_source['dm_ids'][dm_id] = None
+    data_source['user_data'][auth_user_id]['in_dms'].append(dm_id)
+    _count_involvement(auth_user_id, 1)
+
+    num_of_dms = len(data_source['dm_ids'])
+
+    dm_data = {
+        'num_dms_exist': num_of_dms,
+        'time_stamp': time_created
+    }
+
+    update_workspace_stats(False, dm_data, False)
+
+    num_of_dms = len(data_source['user_data'][auth_user_id]['in_dms'])
+
+    dm_data = {
+        'num_dms_joined': num_of_dms,
+        'time_stamp': time_created
+    }
+
+    update_user_stats(auth_user_id, False, dm_data, False)
+
+
+def get_dm(dm_id: int) -> get_dm_type:
+    '''
+    Gets the dm data from the database for a specific dm_id
+
+    Arguments:
+        dm_id (int): id of dm that the data is being retrieved for
+
+    Return Value:
+        { name         (str): name of the dm
+          owner        (int): owner
+          members     (list): list of members' user infos
+          message_ids (dict): message_ids of all messages sent, oldest first }
+    '''
+    data_source = data_store.get()
+    return data_source['dm_data'][dm_id]
+
+
+def get_dm_ids() -> KeysView:
+    '''
+    Gets a list of all the dm ids from the database
+
+    Arguments:
+        None
+
+    Return Value:
+        dm_ids (KeysView): all dm_ids, in the order they were added
+    '''
+
+    data_source = data_store.get()
+    return data_source['dm_ids'].keys()
+
+
+@mutation
+def remove_dm(dm_id: int, time_updated: int) -> None:
+    '''
+    Removes a dm, from the database list of DMs
+
+    Arguments:
+        dm_id (int): id of dm being removed
+
+    Return Value:
+        None
+    '''
+
+    data_source = data_store.get()
+    _mark_dirty('workspace')
+    del data_source['dm_ids'][dm_id]
+    num_of_dms = len(data_source['dm_ids'])
+
+    dm_data = {
+        'num_dms_exist': num_of_dms,
+        'time_stamp': time_updated
+    }
+
+    update_workspace_stats(False, dm_data, False)
+
+
+def get_global_owners() -> KeysView:
+    '''
+    Gets a list of all the global owners from the database
+
+    Arguments:
+        None
+
+    Return Value:
+        global_owners (KeysView): all global_owners, in the order they were added
+    '''
+
+    data_source = data_store.get()
+    return data_source['global_owners'].keys()
+
+
+@mutation
+def add_message(is_channel: bool, user_id: int, channel_id: int, message_id: int, content: str, time_created: int) -> None:
+    '''
+    Adds a message to the database from a user
+
+    Arguments:
+        is_channel  (bool): bool of whether the message is from a channel
+        user_id      (int): id of user that created the message
+        channel_id   (int): id of channel that message was created
+        message_id   (int): id of message being added to the database
+        content      (str): contents of the message
+        time_created (int): time message was created
+        reacts      (list): stores different reacts
+        is_pinned   (bool): bool of whethere the message is pinned
+
+    Return Value:
+        None
+    '''
+
+    data_source = data_store.get()
+    _mark_dirty(_conversation_shard(is_channel, channel_id), 'workspace', 'users', 'stats')
+
+    # create message and add message data
+    data_source['message_data'][message_id] = Message(
+        user_id,        # author
+        content,        # content
+        time_created,   # time_created
+        message_id,     # message_id
+        channel_id,     # channel_created
+        is_channel,     # is_channel
+        None,           # react_u_ids, until someone reacts
+        False,          # is_this_user_reacted
+        False           # is_pinned
+    )
+
+    # add message to the end of the channel's messages
+    if is_channel:
+        data_source['channel_data'][channel_id]['message_ids'][message_id] = None
+    else:
+        data_source['dm_data'][channel_id]['message_ids'][message_id] = None
+
+    # add unique message id to message_ids
+    data_source['message_ids'][message_id] = None
+    data_source['user_data'][user_id]['messages_sent'] += 1
+    _count_message(user_id, 1)
+
+    num_of_messages = len(data_source['message_ids'])
+
+    message_data = {
+        'num_messages_exist': num_of_messages,
+        'time_stamp': time_created
+    }
+
+    update_workspace_stats(False, False, message_data)
+
+    num_user_messages = data_source['user_data'][user_id]['messages_sent']
+    message_data = {
+        'num_messages_sent': num_user_messages,
+        'time_stamp': time_created
+    }
+
+    update_user_stats(user_id, False, False, message_data)
+
+
+@mutation
+def add_messages(is_channel: bool, conversation_id: int, messages: list, notifications: list) -> None:
+    '''
+    Adds a batch of messages to the end of a channel or dm, with the
+    notifications of the users they tag. The stats are updated once for the
+    batch, and once for each author, rather than once for each message.
+
+    Arguments:
+        is_channel       (bool): bool of whether the messages are to a channel
+        conversation_id   (int): id of the channel or dm
+        messages         (list): [user_id, message_id, content, time_created]
+                                 of each message, in the order sent
+        notifications    (list): [user_id, content] of each notification
+
+    Return Value:
+        None
+    '''
+
+    if not messages:
+        return
+
+    data_source = data_store.get()
+    _mark_dirty(_conversation_shard(is_channel, conversation_id), 'workspace', 'users', 'stats')
+
+    if is_channel:
+        conversation_messages = data_source['channel_data'][conversation_id]['message_ids']
+    else:
+        conversation_messages = data_source['dm_data'][conversation_id]['message_ids']
+
+    # the time of each author's last message
+    authors = {}
+    for user_id, message_id, content, time_created in messages:
+        data_source['message_data'][message_id] = Message(
+            user_id,            # author
+            content,            # content
+            time_created,       # time_created
+            message_id,         # message_id
+            conversation_id,    # channel_created
+            is_channel,         # is_channel
+            None,               # react_u_ids, until someone reacts
+            False,              # is_this_user_reacted
+            False               # is_pinned
+        )
+        conversation_messages[message_id] = None
+        data_source['message_ids'][message_id] = None
+        data_source['user_data'][user_id]['messages_sent'] += 1
+        _count_message(user_id, 1)
+        authors[user_id] = time_created
+
+    for user_id, content in notifications:
+        add_notification(is_channel, conversation_id, user_id, content)
+
+    update_workspace_stats(False, False, {
+        'num_messages_exist': len(data_source['message_ids']),
+        'time_stamp': messages[-1][3]
+    })
+
+    for user_id, time_stamp in authors.items():
+        update_user_stats(user_id, False, False, {
+            'num_messages_sent': data_source['user_data'][user_id]['messages_sent'],
+            'time_stamp': time_stamp
+        })
+
+
+@mutation
+def add_standup_message(channel_id: int, content: str) -> None:
+    '''
+    Adds a message to the database from a user
+
+    Arguments:
+        channel_id   (int): id of channel
+        content      (str): contents of the message
+
+    Return Value:
+        None
+    '''
+
+    data_source = data_store.get()
+    _mark_dirty(channel_shard(channel_id))
+    data_source['channel_data'][channel_id]['standup_data']['message_package'].append(
+        content)
+
+
+@mutation
+def clear_message_pack(channel_id: int) -> None:
+    '''
+    Clears the message pack in a standup in a channel
+
+    Arguments:
+        channel_id   (int): id of channel's messagepack being cleared
+
+    Return Value:
+        None
+    '''
+
+    data_source = data_store.get()
+    _mark_dirty(channel_shard(channel_id))
+
+    data_source['channel_data'][channel_id]['standup_data']['message_package'].clear()
+
+
+@mutation
+def set_message_content(message_id: int, message: str) -> None:
+    '''
+    Replaces the contents of a message in the datastore
+
+    Arguments:
+        message_id   (int): id of message being edited
+        message      (str): new contents of the message
+
+    Return Value:
+        None
+    '''
+
+    data_source = data_store.get()
+    _mark_dirty(_message_shard(message_id))
+    data_source['message_data'][message_id]['content'] = message
+
+
+@mutation
+def remove_message(is_channel: bool, channel_id: int, message_id: int, time_updated: int) -> None:
+    '''
+    Removes a message from the datastore and associated channels/dms
+
+    Arguments:
+        is_channel  (bool): bool of whether the message is from a channel
+        channel_id   (int): id of channel
+        message_id   (int): id of message being added to the database
+        time_updated (int): time when the message is removed
+
+    Return Value:
+        None
+    '''
+
+    data_source = data_store.get()
+    _mark_dirty(_conversation_shard(is_channel, channel_id), 'workspace', 'stats')
+
+    # the messages are keyed by id, so removing one does not search or shift
+    # the rest
+    if is_channel:
+        del data_source['channel_data'][channel_id]['message_ids'][message_id]
+    else:
+        del data_source['dm_data'][channel_id]['message_ids'][message_id]
+
+    del data_source['message_ids'][message_id]
+    author = data_source['message_data'][message_id]['author']
+    if author != '':
+        _count_message(author, -1)
+    del data_source['message_data'][message_id]
+
+    num_of_messages = len(data_source['message_ids'])
+
+    message_data = {
+        'num_messages_exist': num_of_messages,
+        'time_stamp': time_updated
+    }
+
+    update_workspace_stats(False, False, message_data)
+
+    message_data = {
+        'num_messages_exist': num_of_messages,
+        'time_stamp': time_updated
+    }
+
+
+def get_message_ids() -> KeysView:
+    '''
+    Gets a list of all the message ids from the database
+
+    Arguments:
+        None
+
+    Return Value:
+        message_ids (KeysView): all message_ids, in the order they were added
+    '''
+
+    data_source = data_store.get()
+    return data_source['message_ids'].keys()
+
+
+def get_message_content(message_id: int) -> Dict[str, str]:
+    '''
+    Gets a specific message from its id
+
+    Arguments:
+        message_id (int): id of message being added to the database
+
+    Return Value:
+        {content      (str): content of the message}
+    '''
+    data_source = data_store.get()
+    return data_source['message_data'][message_id]['content']
+
+
+def get_message_by_id(message_id: int) -> get_message_by_id_type:
+    '''
+    Gets a specific message from its id
+
+    Arguments:
+        message_id (int): id of message being added to the database
+
+    Return Value:
+        { author       (int): user_id of message author
+          content      (str): content of the message
+          time_created (int): time message was created }
+    '''
+
+    data_source = data_store.get()
+    return data_source['message_data'][message_id]
+
+
+def get_message_conversation(message_id: int) -> Optional[Tuple[bool, int]]:
+    '''
+    Gets the channel or dm a message was sent to, from the message itself
+    rather than by searching the message lists of every conversation
+
+    Arguments:
+        message_id (int): id of message
+
+    Return Value:
+        (is_channel      (bool): whether the message is in a channel,
+         conversation_id  (int): id of the channel or dm)
+        None if the message does not exist or has not been sent yet
+    '''
+
+    data_source = data_store.get()
+    if message_id not in data_source['message_ids']:
+        return None
+
+    message = data_source['message_data'][message_id]
+
+    # messages reserved by message_sendlater_v1 are not in a channel or dm yet
+    if message['is_channel'] == '':
+        return None
+    return message['is_channel'], message['channel_created']
+
+
+def get_messages_containing(message_ids: list, query_str: str) -> list:
+    '''
+    Gets the messages whose content contains a string
+
+    Arguments:
+        message_ids (list): ids of the messages to search
+        query_str    (str): string to search for
+
+    Return Value:
+        message_ids (list): ids of the messages containing query_str, in the
+                            order they were given
+    '''
+
+    message_data = data_store.get()['message_data']
+
+    # a channel's messages may be sent or removed while they are searched
+    message_ids = list(message_ids)
+
+    # the columnar store scans the content where it is kept
+    if isinstance(message_data, ColumnarMessageData):
+        return message_data.find(message_ids, query_str)
+    return [message_id for message_id in message_ids
+            if query_str in message_data[message_id]['content']]
+
+
+def get_messages_by_channel(channel_id: int) -> KeysView:
+    '''
+    gets all the message ids from a specified channel id
+
+    Arguments:
+        channel_id (int): id of channel that message was created
+
+    Return Value:
+        message_ids (KeysView): all message_ids for messages in specific channel, oldest first
+    '''
+
+    data_source = data_store.get()
+    return data_source['channel_data'][channel_id]['message_ids'].keys()
+
+
+def get_messages_by_dm(dm_id: int) -> KeysView:
+    '''
+    gets all the message ids from a specified dm id
+
+    Arguments:
+        dm_id       (int): id of channel that message was created
+
+    Return Value:
+        message_ids (KeysView): all message_ids for messages in specific channel, oldest first
+    '''
+
+    data_source = data_store.get()
+    return data_source['dm_data'][dm_id]['message_ids'].keys()
+
+
+@mutation
+def add_notification(is_channel: bool, channel_id: int, user_id: int, content: str) -> None:
+    '''
+    adds a notifcation to the database
+
+    Arguments:
+        is_channel       (bool): whether or not the channel is a channel or dm
+        channel_id        (int): id of channel parsed
+        user_id           (int): the id of the user retrieving notifications
+        content           (str): content of the notification
+
+    Return Value:
+        None
+    '''
+
+    data_source = data_store.get()
+    _mark_dirty('users')
+
+    if is_channel:
+        data_source['user_data'][user_id]['notifications'].append({
+            'channel_id': channel_id,
+            'dm_id': -1,
+            'content': content,
+        })
+    else:
+        data_source['user_data'][user_id]['notifications'].append({
+            'channel_id': -1,
+            'dm_id': channel_id,
+            'content': content,
+        })
+
+
+def get_user_notifications(user_id: int) -> list:
+    '''
+    Gets a list of a user's notifications
+
+    Arguments:
+        user_id      (int): id of user we are retrieving notifications for
+
+    Return Value:
+        notifications (list): list of all the user's notifications
+    '''
+
+    data_source = data_store.get()
+
+    return data_source['user_data'][user_id]['notifications']
+
+
+@mutation
+def set_active_standup(set_active: bool, channel_id: int, time_finished: int) -> None:
+    '''
+    Sets a channel's active_standup value to True
+
+    Arguments:
+        set_active      (bool): set the standup to be active or inactive
+        channel_id       (int): id of channel that message was created
+        time_finished    (int): time that the standup is set to finish
+
+    Return Value:
+        None
+    '''
+
+    data_source = data_store.get()
+    _mark_dirty(channel_shard(channel_id))
+
+    if set_active:
+        data_source['channel_data'][channel_id]['standup_data']['is_active'] = True
+        data_source['channel_data'][channel_id]['standup_data']['time_finish'] = time_finished
+    else:
+        data_source['channel_data'][channel_id]['standup_data']['is_active'] = False
+
+
+@mutation
+def set_user_profileimage_url(user_id: int, image_url: str) -> None:
+    '''
+    sets the url of a user's profile image
+
+    Arguments:
+        user_id   (int): user's user_id
+        image_url (str): url the profile image is served from
+
+    Return Value:
+        None
+    '''
+
+    data_source = data_store.get()
+    _mark_dirty('users')
+    data_source['user_data'][user_id]['image_url'] = image_url
+
+
+@mutation
+def add_session_token(token: str, user_id: int) -> None:
+    '''
+    adds a user token to the sessions storage
+
+    Arguments:
+        token   (str): the token for the session
+        user_id (int): user's user_id
+
+    Return Value:
+        None
+    '''
+
+    data_source = data_store.get()
+    _mark_dirty('sessions')
+    data_source['token'][token] = user_id
+
+
+@mutation
+def remove_session_token(token: str) -> None:
+    '''
+    removes a user token to the sessions storage
+
+    Arguments:
+        token   (str): the token for the session
+
+    Return Value:
+        None
+    '''
+
+    data_source = data_store.get()
+    _mark_dirty('sessions')
+    del data_source['token'][token]
+
+
+def get_all_valid_tokens() -> set:
+    '''
+    retrieves a set of all currently valid tokens
+
+    Return Value:
+        tokens (set): tokens for all currently valid sessions
+    '''
+
+    data_source = data_store.get()
+    return set(data_source['token'].keys())
+
+
+@mutation
+def add_passwordreset_key(user_id: int, reset_key: str) -> None:
+    '''
+    adds a unique password reset request key to
+    the data store
+
+    Arguments:
+        user_id   (int): user_id for account requesting reset
+        reset_key (str): unique password reset request key
+
+    Return Value:
+        None
+    '''
+
+    data_source = data_store.get()
+    _mark_dirty('users')
+    data_source['password_reset_key'][reset_key] = user_id
+
+
+def get_passwordreset_key(reset_key: str) -> Tuple[bool, str]:
+    '''
+    gets reset code associated with a user
+
+    Arguments:
+        reset_key (str): unique password reset request key
+
+    Return Value:
+        reset_tuple (tuple):
+            - reset_code_exists (bool): True if reset code exists else False
+            - reset_code_encoded (str): reset code
+    '''
+
+    data_source = data_store.get()
+    if reset_key in data_source['password_reset_key']:
+        return (True, data_source['password_reset_key'][reset_key])
+    else:
+        return (False, 0)
+
+
+@mutation
+def add_owner_to_channel(user_id: int, channel_id: int) -> None:
+    '''
+    adds given owner to channel
+
+    Arguments:
+        user_id     (int): user_id of new owner member
+        channel_id  (int): id of the channel being referred to
+
+    Return Value:
+        None
+    '''
+
+    data_source = data_store.get()
+    _mark_dirty(channel_shard(channel_id))
+    # adds a user to the owners of the channel
+    data_source['channel_data'][channel_id]['owner'][user_id] = None
+
+
+@mutation
+def remove_owner_from_channel(user_id: int, channel_id: int) -> None:
+    '''
+    removes given owner from channel
+
+    Arguments:
+        user_id     (int): user_id of new owner member
+        channel_id  (int): id of the channel being referred to
+
+    Return Value:
+        None
+    '''
+
+    data_source = data_store.get()
+    _mark_dirty(channel_shard(channel_id))
+    # removes a user from the owners of the channel
+    del data_source['channel_data'][channel_id]['owner'][user_id]
+
+
+@mutation
+def remove_owner_from_dm(user_id: int, dm_id: int) -> None:
+    '''
+    removes given owner from dm
+
+    Arguments:
+        user_id     (int): user_id of the owner
+        dm_id       (int): id of the dm being referred to
+
+    Return Value:
+        None
+    '''
+
+    data_source = data_store.get()
+    _mark_dirty(dm_shard(dm_id))
+    # removes a user from the owners of the dm, who may already have been
+    # removed along with the members
+    data_source['dm_data'][dm_id]['owner'].pop(user_id, None)
+
+
+# def add_react(user_id, message_id, react_id):
+#     '''
+#     adds new react to the reacts list
+
+#     Arguments:
+#         user_id     (int): user_id of new owner member
+#         message_id  (int): id of message being reacted
+#         react_id    (int): id of the react
+
+#     Return Value:
+#         None
+#     '''
+#     data_source = data_store.get()
+#     data_source['message_data'][message_id]['reacts']['is_this_user_reacted'] = True
+
+
+@mutation
+def react_message(user_id: int, message_id: int, react_id: int) -> None:
+    '''
+    reacts to a message
+
+    Arguments:
+        user_id     (int): user_id of new owner member
+        message_id  (int): id of message being reacted
+        react_id    (int): id of the react
+
+    Return Value:
+        None
+    '''
+    data_source = data_store.get()
+    _mark_dirty(_message_shard(message_id))
+    message = data_source['message_data'][message_id]
+
+    # 1 is the only react, the users who reacted are kept on the message
+    if message.react_u_ids is None:
+        message.react_u_ids = []
+
+    if user_id not in message.react_u_ids:
+        message.is_this_user_reacted = True
+        message.react_u_ids.append(user_id)
+    else:
+        message.is_this_user_reacted = False
+        message.react_u_ids.remove(user_id)
+
+
+@mutation
+def start_workspace_stats(time_intialised: int) -> None:
+    '''
+    adds workspace stats starting from the given time
+
+    Arguments:
+        time_intialised (int): time the stats start from
+
+    Return Value:
+        None
+    '''
+    data_source = data_store.get()
+    _mark_dirty('stats')
+    data_source['workspace_stats']['channels_exist'] = [{
+        'num_channels_exist': 0,
+        'time_stamp': time_intialised
+    }]
+    data_source['workspace_stats']['dms_exist'] = [{
+        'num_dms_exist': 0,
+        'time_stamp': time_intialised
+    }]
+    data_source['workspace_stats']['messages_exist'] = [{
+        'num_messages_exist': 0,
+        'time_stamp': time_intialised
+    }]
+    data_source['workspace_stats']['utilization_rate'] = 0.0
+
+
+@mutation
+def start_user_stats(user_id: int, time_intialised: int) -> None:
+    '''
+    initialises a user's stats starting from the given time
+
+    Arguments:
+        user_id          (int): id of the user
+        time_intialised  (int): time the stats start from
+
+    Return Value:
+        None
+    '''
+    data_source = data_store.get()
+    _mark_dirty('stats')
+    data_source['user_stats'][user_id] = {}
+    data_source['user_stats'][user_id]['channels_joined'] = [{
+        'num_channels_joined': 0,
+        'time_stamp': time_intialised
+    }]
+    data_source['user_stats'][user_id]['dms_joined'] = [{
+        'num_dms_joined': 0,
+        'time_stamp': time_intialised
+    }]
+    data_source['user_stats'][user_id]['messages_sent'] = [{
+        'num_messages_sent': 0,
+        'time_stamp': time_intialised
+    }]
+    data_source['user_stats'][user_id]['involvement_rate'] = 0.0
+
+
+@mutation
+def update_user_stats(user_id: int, channel_data: dict, dm_data: dict, message_data: dict) -> None:
+    '''
+    updates a user's stats
+
+    Arguments:
+        user_id         (int): id of the user
+        channel_data    (dict): dictionary that contains channel data
+        dm_data         (dict): dictionary that contains dm data
+        message_data    (dict): dictionary that contains message data
+
+    Return Value:
+        None
+    '''
+    data_source = data_store.get()
+    _mark_dirty('stats')
+
+    if channel_data:
+        data_source['user_stats'][user_id]['channels_joined'].append(
+            channel_data)
+    if dm_data:
+        data_source['user_stats'][user_id]['dms_joined'].append(dm_data)
+    if message_data:
+        data_source['user_stats'][user_id]['messages_sent'].append(
+            message_data)
+
+    # each is kept up to date as it changes, so the rate does not need to
+    # look through the messages
+    num_channels_joined = len(get_user_channels(user_id))
+    num_dms_joined = len(get_user_dms(user_id))
+    num_messages_sent = data_source['message_counts'].get(user_id, 0)
+
+    involvement = num_channels_joined + num_dms_joined + num_messages_sent
+    denom = len(get_channel_ids()) + len(get_dm_ids()) + len(get_message_ids())
+    rate = calculate_involvement_rate(involvement, denom)
+
+    data_source['user_stats'][user_id]['involvement_rate'] = rate
+
+
+@mutation
+def update_workspace_stats(channel_data: dict, dm_data: dict, message_data: dict) -> None:
+    '''
+    updates the workspace stats
+
+    Arguments:        
+        channel_data    (dict): dictionary that contains channel data
+        dm_data         (dict): dictionary that contains dm data
+        message_data    (dict): dictionary that contains message data
+
+    Return Value:
+        None
+    '''
+    data_source = data_store.get()
+    _mark_dirty('stats')
+
+    if channel_data:
+        data_source['workspace_stats']['channels_exist'].append(channel_data)
+    if dm_data:
+        data_source['workspace_stats']['dms_exist'].append(dm_data)
+    if message_data:
+        data_source['workspace_stats']['messages_exist'].append(message_data)
+
+    rate = calculate_utilization_rate(
+        data_source['involved_users'], len(get_user_ids()))
+
+    data_source['workspace_stats']['utilization_rate'] = rate
+
+
+def get_user_stats(user_id: int) -> get_user_stats_type:
+    '''
+    gets the stats of a user
+
+    Arguments:        
+        user_id         (int): id of the user
+
+    Return Value:
+        user_stats      (dict): contains the stats of a user
+    '''
+    data_source = data_store.get()
+
+    return data_source['user_stats'][user_id]
+
+
+def get_workspace_stats() -> get_workspace_stats_type:
+    '''
+    gets the stats of the workspace
+
+    Arguments:        
+        None
+
+    Return Value:
+        workspace_stats      (dict): contains the stats of the workspace
+    '''
+    data_source = data_store.get()
+
+    return data_source['workspace_stats']
+
+
+@mutation
+def pin_message(message_id: int) -> None:
+    '''
+    pins a message
+    Arguments:        
+        message_id  (int): id of the message
+
+    Return Value:
+        None
+    '''
+    data_source = data_store.get()
+    _mark_dirty(_message_shard(message_id))
+    pinned = data_source['message_data'][message_id]['is_pinned']
+    if pinned == False:
+        data_source['message_data'][message_id]['is_pinned'] = True
+    else:
+        data_source['message_data'][message_id]['is_pinned'] = False
+
+
+@mutation
+def add_sendlater_id(message_id: int) -> None:
+    '''
+    Adds a message to the database from a user
+
+    Arguments:
+        message_id   (int): id of message being added to the database
+
+    Return Value:
+        None
+    '''
+    data_source = data_store.get()
+    _mark_dirty('workspace')
+
+    data_source['message_ids'][message_id] = None
+    data_source['message_data'][message_id] = placeholder_message()
+
+
+@mutation
+def add_scheduled_job(message_id: int, time_due: float, kind: str, is_channel: bool,
+                      conversation_id: int, arguments: list) -> None:
+    '''
+    Records a job scheduled to send a message, so it is scheduled again after
+    a restart
+
+    Arguments:
+        message_id       (int): id of the message the job sends
+        time_due       (float): time the job is due
+        kind             (str): name the job's function is registered under
+        is_channel      (bool): whether the message is sent to a channel or a dm
+        conversation_id  (int): id of the channel or dm
+        arguments       (list): arguments the function is called with
+
+    Return Value:
+        None
+    '''
+
+    data_source = data_store.get()
+    _mark_dirty('workspace')
+
+    data_source['scheduled_jobs'][message_id] = {
+        'time_due': time_due,
+        'kind': kind,
+        'is_channel': is_channel,
+        'conversation_id': conversation_id,
+        'arguments': list(arguments)
+    }
+
+
+@mutation
+def add_sendlater_job(message_id: int, time_due: float, kind: str, is_channel: bool,
+                      conversation_id: int, arguments: list) -> None:
+    '''
+    Reserves the id of a message sent later and records the job sending it,
+    as one mutation so a restart never finds one without the other
+
+    Arguments:
+        message_id       (int): id reserved for the message
+        time_due       (float): time the job is due
+        kind             (str): name the job's function is registered under
+        is_channel      (bool): whether the message is sent to a channel or a dm
+        conversation_id  (int): id of the channel or dm
+        arguments       (list): arguments the function is called with
+
+    Return Value:
+        None
+    '''
+
+    add_sendlater_id(message_id)
+    add_scheduled_job(message_id, time_due, kind, is_channel, conversation_id, arguments)
+
+
+@mutation
+def start_standup_job(channel_id: int, time_finish: int, message_id: int, time_due: float,
+                      kind: str, arguments: list) -> None:
+    '''
+    Makes the standup of a channel active and records the job ending it, as
+    one mutation so a restart never finds one without the other
+
+    Arguments:
+        channel_id       (int): id of the channel
+        time_finish      (int): time the standup ends
+        message_id       (int): id of the message the job sends
+        time_due       (float): time the job is due
+        kind             (str): name the job's function is registered under
+        arguments       (list): arguments the function is called with
+
+    Return Value:
+        None
+    '''
+
+    set_active_standup(True, channel_id, time_finish)
+    add_scheduled_job(message_id, time_due, kind, True, channel_id, arguments)
+
+
+@mutation
+def remove_scheduled_jobs(message_ids: list) -> None:
+    '''
+    Drops the records of scheduled jobs once they have run or been
+    cancelled, skipping jobs there is no record of
+
+    Arguments:
+        message_ids (list): ids of the messages the jobs send
+
+    Return Value:
+        None
+    '''
+
+    data_source = data_store.get()
+    _mark_dirty('workspace')
+
+    for message_id in message_ids:
+        data_source['scheduled_jobs'].pop(message_id, None)
+
+
+def get_scheduled_jobs() -> dict:
+    '''
+    Gets the jobs scheduled and not run yet
+
+    Return Value:
+        scheduled_jobs (dict): maps the id of the message each job sends to
+                               { time_due (float), kind (str), is_channel (bool),
+                                 conversation_id (int), arguments (list) }
+    '''
+
+    return data_store.get()['scheduled_jobs']
+
+
+def data_dump() -> None:
+    '''
+    Persists the data_store, run in its own thread. Syncs the mutation log to
+    disk every config.dump_interval seconds, and checkpoints the data_store
+    once the log grows past config.checkpoint_log_size bytes or
+    config.checkpoint_interval seconds have passed. Nothing is written while
+    the data_store is not changing.
+
+    Return Value:
+        None
+    '''
+
+    last_checkpoint = time.monotonic()
+
+    while True:
+        time.sleep(config.dump_interval)
+
+        _mutation_log.sync()
+
+        checkpoint_due = time.monotonic() - last_checkpoint >= config.checkpoint_interval
+        if checkpoint_due or _mutation_log.size() >= config.checkpoint_log_size:
+            data_checkpoint()
+            last_checkpoint = time.monotonic()
+
+
+def data_sync() -> None:
+    '''
+    Forces the mutations logged so far to disk, so they survive a power
+    loss. The write pipeline calls it once for each batch of mutations.
+
+    Return Value:
+        None
+    '''
+
+    with _mutation_lock:
+        if _mutation_log is not None:
+            _mutation_log.sync()
+
+
+def data_checkpoint() -> None:
+    '''
+    Writes the shards of the data_store changed since the last checkpoint and
+    drops the mutations they include from the mutation log.
+
+    Mutations are only held back while the changed shards are copied, the
+    copies are written to disk while requests go on changing the store.
+
+    Return Value:
+        None
+    '''
+
+    global _all_shards_dirty, _checkpoint_pause
+
+    with _checkpoint_lock:
+        with _mutation_lock:
+            if _generation == _snapshot_writer.generation:
+                return
+
+            start = time.perf_counter()
+            store = data_store.get()
+            replace_all = _all_shards_dirty
+
+            if replace_all:
+                shard_names = get_shard_names(store)
+            else:
+                shard_names = list(_dirty_shards)
+
+            shards = {shard: freeze_shard(store, shard) for shard in shard_names}
+            frozen = dict(_dirty_shards)
+            lsn, generation, log_size = _mutation_log.lsn, _generation, _mutation_log.size()
+
+            _dirty_shards.clear()
+            _all_shards_dirty = False
+            _checkpoint_pause = time.perf_counter() - start
+
+        try:
+            _snapshot_writer.write(shards, lsn, generation, replace_all)
+        except Exception:
+            # the shards are written again by the next checkpoint
+            with _mutation_lock:
+                for shard, shard_generation in frozen.items():
+                    _dirty_shards.setdefault(shard, shard_generation)
+                _all_shards_dirty = _all_shards_dirty or replace_all
+            raise
+
+        with _mutation_lock:
+            _mutation_log.discard(log_size)
+
+
+def get_persistence_stats() -> dict:
+    '''
+    Gets how far the checkpoint on disk lags behind the data_store
+
+    Return Value:
+        { generation            (int): mutations applied to the data_store
+          checkpoint_generation (int): mutations included in the last checkpoint
+          checkpoint_duration (float): seconds the last checkpoint took to write
+          checkpoint_pause    (float): seconds the last checkpoint held back
+                                       mutations while copying the shards
+          checkpoint_time       (int): time the last checkpoint was written
+          shards_written        (int): shards the last checkpoint rewrote
+          bytes_written         (int): bytes the last checkpoint wrote
+          dirty_shards          (int): shards changed since the last checkpoint
+          log_size              (int): bytes in the mutation log
+          restore_duration    (float): seconds the last restore took
+          cold_messages         (int): messages not loaded from disk yet
+          resident_memory       (int): bytes of memory the server has resident }
+    '''
+
+    store = data_store.get()
+
+    if _all_shards_dirty:
+        dirty_shards = len(get_shard_names(store))
+    else:
+        dirty_shards = len(_dirty_shards)
+
+    return {
+        'generation': _generation,
+        'checkpoint_generation': _snapshot_writer.generation,
+        'checkpoint_duration': _snapshot_writer.duration,
+        'checkpoint_pause': _checkpoint_pause,
+        'checkpoint_time': _snapshot_writer.time_written,
+        'shards_written': _snapshot_writer.shards_written,
+        'bytes_written': _snapshot_writer.bytes_written,
+        'dirty_shards': dirty_shards,
+        'log_size': _mutation_log.size(),
+        'restore_duration': _restore_duration,
+        'cold_messages': getattr(store['message_data'], 'cold_messages', 0),
+        'resident_memory': resident_memory()
+    }
+
+
+def export_data_store() -> dict:
+    '''
+    Gets the whole data_store, for getdata/v1
+
+    Return Value:
+        store (dict): the data_store contents
+    '''
+
+    return data_store.get()
+
+
+def _new_message_data():
+    '''
+    Makes an empty message_data of the kind chosen by config.message_store
+    '''
+
+    if config.message_store == 'columnar':
+        return ColumnarMessageData()
+    return {}
+
+
+def _start_id_counters() -> None:
+    '''
+    Starts the id counters after the ids reserved in the data_store, after it
+    is reset or restored
+    '''
+
+    id_blocks = data_store.get()['id_blocks']
+    for kind in ID_KINDS:
+        _id_counters[kind] = itertools.count(id_blocks[kind] + 1)
+
+
+def allocate_id(kind: str) -> int:
+    '''
+    Gets a new id for a record, never given to another record of the same kind
+    even if that record has been removed
+
+    Arguments:
+        kind (str): one of ID_KINDS
+
+    Return Value:
+        new_id (int): the id, ids of each kind are handed out in increasing
+                      order starting from 1
+    '''
+
+    new_id = next(_id_counters[kind])
+
+    # reserve the next block once the reserved ids run out, the reservation
+    # is logged before the id is used by any mutation
+    if new_id > data_store.get()['id_blocks'][kind]:
+        reserve_ids(kind, new_id + config.id_block_size - 1)
+
+    return new_id
+
+
+@mutation
+def reserve_ids(kind: str, last_id: int) -> None:
+    '''
+    Reserves the ids of a kind of record up to last_id
+
+    Arguments:
+        kind    (str): one of ID_KINDS
+        last_id (int): highest id reserved
+
+    Return Value:
+        None
+    '''
+
+    data_source = data_store.get()
+    _mark_dirty('workspace')
+
+    # threads reserving blocks at the same time may finish in either order
+    id_blocks = data_source['id_blocks']
+    id_blocks[kind] = max(id_blocks[kind], last_id)
+
+
+def _upgrade_store(store: dict) -> None:
+    '''
+    Brings a data_store restored from the snapshot of an older version up to
+    date
+
+    Arguments:
+        store (dict): the data_store contents
+
+    Return Value:
+        None
+    '''
+
+    for entry in ID_INDEXES:
+        if isinstance(store[entry], list):
+            store[entry] = dict.fromkeys(store[entry])
+
+    # message_sendlaterdm_v1 in older versions reserved dms holding an empty
+    # message
+    for dm_id, dm in list(store['dm_data'].items()):
+        if isinstance(dm, dict) and 'members' not in dm:
+            del store['dm_data'][dm_id]
+            store['dm_ids'].pop(dm_id, None)
+
+    for conversations in (store['channel_data'], store['dm_data']):
+        for conversation in conversations.values():
+            for entry in ('owner', 'members', 'message_ids'):
+                if isinstance(conversation[entry], list):
+                    conversation[entry] = dict.fromkeys(conversation[entry])
+
+    for entry, key in (('user_emails', 'email_address'), ('user_handles', 'user_handle')):
+        if None in store[entry].values():
+            store[entry] = {store['user_data'][user_id][key]: user_id
+                            for user_id in store['user_ids']}
+
+    # older versions kept users, channels, dms and messages in dicts
+    for entry, record in (('user_data', User), ('channel_data', Channel), ('dm_data', Dm)):
+        for key, value in store[entry].items():
+            store[entry][key] = record.upgrade(value)
+
+    # messages left on disk are converted when they are loaded
+    messages = store['message_data']
+    for message_id, message in dict.items(messages):
+        if isinstance(message, dict):
+            dict.__setitem__(messages, message_id, Message.from_dict(message))
+
+    # older versions gave out the next id after the ones in use
+    if 'id_blocks' not in store:
+        store['id_blocks'] = {
+            'user': max(store['user_data'], default=0),
+            'channel': max(store['channel_data'], default=0),
+            'dm': max(store['dm_data'], default=0),
+            'message': max(store['message_ids'], default=0)
+        }
+
+    # older versions did not keep the jobs scheduled
+    store.setdefault('scheduled_jobs', {})
+
+    # older versions counted each user's messages when their stats changed,
+    # they are counted once here. Placeholders of messages sent later have no
+    # author.
+    if 'message_counts' not in store:
+        message_counts = store['message_counts'] = {}
+        for message in store['message_data'].values():
+            author = message['author']
+            if author in store['user_data']:
+                message_counts[author] = message_counts.get(author, 0) + 1
+
+    # older versions looked through every user for the utilization_rate
+    if 'involved_users' not in store:
+        store['involved_users'] = sum(
+            1 for user_id in store['user_ids']
+            if store['user_data'][user_id]['in_channels'] or store['user_data'][user_id]['in_dms'])
+
+
+def data_restore() -> None:
+    '''
+    Loads the last checkpoint of the data_store, replays the mutations logged
+    after it and starts logging new mutations. Snapshots from before the
+    data_store was sharded are read if there is no checkpoint, and are split
+    into shards by the next checkpoint.
+
+    With config.lazy_message_restore the messages of each channel and dm are
+    left on disk until they are first used, everything else is loaded. With
+    config.message_store set to 'columnar' the messages are all loaded into a
+    ColumnarMessageData instead.
+
+    Return Value:
+        None
+    '''
+
+    global _mutation_log, _snapshot_writer, _all_shards_dirty, _restore_duration
+
+    start = time.perf_counter()
+
+    shards, manifest, lsn = read_shards(
+        config.snapshot_dir, config.restore_workers, config.lazy_message_restore)
+
+    store = None
+    if shards is not None:
+        store = assemble_store(shards)
+    else:
+        for path in config.legacy_snapshot_paths:
+            store, lsn = read_snapshot(path)
+            if store is not None:
+                break
+
+    if store is not None:
+        _upgrade_store(store)
+        data_store.set(store)
+
+    # the columnar message_data holds every message, none are left on disk
+    store = data_store.get()
+    if config.message_store == 'columnar' and not isinstance(store['message_data'], ColumnarMessageData):
+        store['message_data'] = ColumnarMessageData(store['message_data'])
+
+    # the checkpoint holds the store as it is now, replaying the log moves the
+    # generation on so the next checkpoint includes the replayed mutations
+    _snapshot_writer = SnapshotWriter(config.snapshot_dir, manifest, _generation,
+                                      config.snapshot_codec, config.snapshot_codec_level)
+    _dirty_shards.clear()
+    _all_shards_dirty = shards is None
+
+    entries, valid_size = read_log(config.mutation_log_path)
+    for entry_lsn, function_name, args, kwargs in entries:
+        # entries already in the checkpoint are left in the log by a crash
+        # between writing the checkpoint and emptying the log
+        if entry_lsn <= lsn:
+            continue
+
+        # a call rejected when it was made is rejected the same way again.
+        # Anything else is a bug or a damaged entry, reported rather than
+        # dropped, and the rest of the log is still replayed.
+        try:
+            _mutations[function_name](*args, **kwargs)
+        except (InputError, AccessError):
+            pass
+        except Exception:
+            print(f'data_restore: replaying entry {entry_lsn} ({function_name}) failed',
+                  file=sys.stderr)
+            traceback.print_exc()
+        lsn = entry_lsn
+
+    _mutation_log = MutationLog(config.mutation_log_path, lsn, valid_size)
+    _start_id_counters()
+    _restore_duration = time.perf_counter() - start
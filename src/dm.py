@@ -1,23 +1,26 @@
 from src.error import InputError, AccessError
 from src.other import decode_token, check_valid_tag
+from src.locks import users_locked, conversation_locked
+import itertools
 from datetime import timezone, datetime
 from typing import Dict, List
 from typing_extensions import TypedDict
 
 from src.data_operations import (
+    get_read_view,
     add_dm,
     add_message,
     add_notification,
     add_user_to_dm,
+    allocate_id,
     get_dm_ids,
     get_dm,
-    get_message_by_id,
-    get_message_ids,
-    get_messages_by_dm,
     get_user,
     get_user_ids,
     remove_member_from_dm,
-    remove_dm
+    remove_owner_from_dm,
+    remove_dm,
+    cancel_conversation_jobs
 )
 
 
@@ -32,6 +35,7 @@ class dm_messages(TypedDict):
     end: int
 
 
+@users_locked(write=False)
 def dm_create_v1(token: str, u_ids: List[int]) -> Dict[str, int]:
     '''
     Creates a new dm
@@ -74,7 +78,7 @@ def dm_create_v1(token: str, u_ids: List[int]) -> Dict[str, int]:
     dm_name = ', '.join(sorted(user_handle_list))
 
     # get a new id for the dm and add DM to system
-    new_dm_id = len(get_dm_ids()) + 1
+    new_dm_id = allocate_id('dm')
     dt = datetime.now()
     time_created = int(dt.timestamp())
     add_dm(new_dm_id, dm_name, auth_user_id, time_created)
@@ -111,7 +115,7 @@ def dm_list_v1(token: str) -> Dict[str, list]:
     dms_list = []
 
     # Check each dm id from all dm ids in the database
-    for dm_id in get_dm_ids():
+    for dm_id in list(get_dm_ids()):
 
         # Check if user id is a member of the dm
         if auth_user_id in get_dm(dm_id)['members']:
@@ -125,6 +129,8 @@ def dm_list_v1(token: str) -> Dict[str, list]:
     }
 
 
+@users_locked(write=False)
+@conversation_locked(False, 'dm_id')
 def dm_remove_v1(token: str, dm_id: int) -> dict:
     '''
     Removes an existing dm and its members
@@ -159,12 +165,15 @@ def dm_remove_v1(token: str, dm_id: int) -> dict:
     dt = datetime.now()
     time_created = int(dt.timestamp())
 
+    # messages sent later to the DM are not sent
+    cancel_conversation_jobs(False, dm_id)
+
     # remove users from members in the DM
-    for member in reversed(dm_members):
+    for member in reversed(list(dm_members)):
         remove_member_from_dm(dm_id, member, time_created)
 
     # remove owner from owners in the DM
-    dm_owner.remove(auth_user_id)
+    remove_owner_from_dm(auth_user_id, dm_id)
 
     # remove dm_id from list
     remove_dm(dm_id, time_created)
@@ -172,6 +181,7 @@ def dm_remove_v1(token: str, dm_id: int) -> dict:
     return {}
 
 
+@conversation_locked(False, 'dm_id', write=False)
 def dm_details_v1(token: str, dm_id: int) -> dm_details:
     '''
     Returns the details dm such as the creator's name, each of the member's user ids, emails,
@@ -232,6 +242,8 @@ def dm_details_v1(token: str, dm_id: int) -> dm_details:
     }
 
 
+@users_locked(write=False)
+@conversation_locked(False, 'dm_id')
 def dm_leave_v1(token: str, dm_id: int) -> dict:
     '''
     Removes a user from a dm
@@ -265,7 +277,7 @@ def dm_leave_v1(token: str, dm_id: int) -> dict:
 
     # check if user is the owner of the DM
     if auth_user_id in dm_owner:
-        dm_owner.remove(auth_user_id)
+        remove_owner_from_dm(auth_user_id, dm_id)
 
     # find time updated
     dt = datetime.now()
@@ -277,6 +289,7 @@ def dm_leave_v1(token: str, dm_id: int) -> dict:
     return {}
 
 
+@conversation_locked(False, 'dm_id', write=False, snapshot_reads=True)
 def dm_messages_v1(token: str, dm_id: int, start: int) -> dm_messages:
     '''
     Retrieves data of up to 50 sent messages for pagination
@@ -301,44 +314,43 @@ def dm_messages_v1(token: str, dm_id: int, start: int) -> dm_messages:
 
     '''
     auth_user_id = decode_token(token)
+    reads = get_read_view()
 
     # invalid dm_id
-    if dm_id not in get_dm_ids():
+    if dm_id not in reads.get_dm_ids():
         raise InputError(description="Not a valid DM id")
 
     # check if user exists in DM membes
-    if auth_user_id not in get_dm(dm_id)['members']:
+    if auth_user_id not in reads.get_dm(dm_id)['members']:
         raise AccessError(description="User is not a member of the DM")
 
-    # Gets all the messages in the channel sorted from recent to old
-    message_id_list = list(reversed(get_messages_by_dm(dm_id)))
+    message_ids = reads.get_messages_by_dm(dm_id)
+    num_messages = len(message_ids)
     end = start + 50
 
     # checks that start does not exceed total messages
-    if start > len(message_id_list):
+    if start > num_messages:
         raise InputError(description="Start number exceeds total messages")
 
-    result_arr = []
-    for message_pos, message_id in enumerate(message_id_list):
-        # if message in given range
-        if start <= message_pos < end:
-            message_info = get_message_by_id(message_id)
-
-            result_arr.append({
-                'message_id': message_id,
-                'u_id': message_info['author'],
-                'message': message_info['content'],
-                'time_created': message_info['time_created'],
-                'reacts': message_info['reacts'],
-                'is_pinned': message_info['is_pinned']
-            })
+    # Gets the 50 messages from start, walking from recent to old without
+    # copying the rest of the dm's messages
+    page = list(itertools.islice(reversed(message_ids), start, end))
 
-        # if past 50 messages, then exit
-        if message_pos == end - 1:
-            break
+    result_arr = []
+    for message_id in page:
+        message_info = reads.get_message_by_id(message_id)
+
+        result_arr.append({
+            'message_id': message_id,
+            'u_id': message_info['author'],
+            'message': message_info['content'],
+            'time_created': message_info['time_created'],
+            'reacts': message_info['reacts'],
+            'is_pinned': message_info['is_pinned']
+        })
 
     # checks if 50 messages are displayed
-    if end > len(message_id_list) - 1:
+    if end > num_messages - 1:
         end = -1
 
     return {
@@ -348,6 +360,7 @@ def dm_messages_v1(token: str, dm_id: int, start: int) -> dm_messages:
     }
 
 
+@conversation_locked(False, 'dm_id')
 def message_senddm_v1(token: str, dm_id: int, message: str) -> Dict[str, int]:
     '''
     Sends a message into a dm
@@ -383,8 +396,7 @@ def message_senddm_v1(token: str, dm_id: int, message: str) -> Dict[str, int]:
         raise InputError(
             description="Invalid message length. Upgrade to nitro")
 
-    # get length of message_ids
-    new_message_id = len(get_message_ids()) + 1
+    new_message_id = allocate_id('message')
     is_channel = False
 
     # time created
@@ -0,0 +1,280 @@
+'''
+Locks held by requests while they read and change the data_store. Each
+channel and dm has its own reader-writer lock, so requests to different
+conversations go on in parallel while requests to the same one are kept
+apart, and the user table has one more for the users, their emails, handles,
+permissions and the conversations they are in.
+
+Lock order: a thread only takes a lock later in this order than every lock
+it already holds, so two threads never wait on each other
+    1. the user table
+    2. channels, by increasing channel_id
+    3. dms, by increasing dm_id
+    4. the storage engine's own lock, taken inside each data_operations
+       mutation and released before it returns
+Taking a lock out of order raises RuntimeError instead of risking a
+deadlock. A thread may take a lock it already holds again, but may not take
+the write lock of one it only holds for reading.
+
+Handlers take their locks with the decorators below, or with locked() when
+the locks they need are only known once they have started. Jobs run by
+src/scheduler.py take the same locks as requests. Read requests reading
+through data_operations.get_read_view() take no locks while the write
+pipeline publishes snapshots (see src/pipeline.py), as a snapshot is never
+changed.
+
+Classes:
+    RWLock()
+
+Functions:
+    locked(conversations: dict, users: Optional[bool])
+    users_locked(write: bool, snapshot_reads: bool)
+    conversation_locked(is_channel: bool, argument: str, write: bool,
+                        snapshot_reads: bool)
+    message_conversation_locked(argument: str, write: bool)
+'''
+
+import inspect
+import weakref
+import functools
+import threading
+import contextlib
+from typing import Optional, Tuple
+
+from src.pipeline import get_snapshot
+from src.data_operations import get_message_conversation
+
+
+class RWLock:
+    '''
+    A lock held by any number of readers or one writer. Waiting writers go
+    before new readers, so a steady stream of reads does not hold back a
+    write.
+    '''
+
+    def __init__(self):
+        self._condition = threading.Condition(threading.Lock())
+        self._readers = {}
+        self._writer = None
+        self._writer_depth = 0
+        self._writers_waiting = 0
+
+    def acquire_read(self) -> None:
+        me = threading.get_ident()
+        with self._condition:
+            # a thread already holding the lock goes ahead of waiting writers
+            if self._writer == me or me in self._readers:
+                self._readers[me] = self._readers.get(me, 0) + 1
+                return
+
+            while self._writer is not None or self._writers_waiting:
+                self._condition.wait()
+            self._readers[me] = 1
+
+    def release_read(self) -> None:
+        me = threading.get_ident()
+        with self._condition:
+            self._readers[me] -= 1
+            if not self._readers[me]:
+                del self._readers[me]
+                if not self._readers:
+                    self._condition.notify_all()
+
+    def acquire_write(self) -> None:
+        me = threading.get_ident()
+        with self._condition:
+            if self._writer == me:
+                self._writer_depth += 1
+                return
+            if me in self._readers:
+                raise RuntimeError('cannot take the write lock while holding the read lock')
+
+            self._writers_waiting += 1
+            try:
+                while self._writer is not None or self._readers:
+                    self._condition.wait()
+            finally:
+                self._writers_waiting -= 1
+            self._writer = me
+            self._writer_depth = 1
+
+    def release_write(self) -> None:
+        with self._condition:
+            self._writer_depth -= 1
+            if not self._writer_depth:
+                self._writer = None
+                self._condition.notify_all()
+
+
+# the position of each lock in the lock order
+USERS = (0, 0)
+CHANNEL = 1
+DM = 2
+
+_users_lock = RWLock()
+
+# a conversation's lock is kept while a thread holds it, and dropped once no
+# thread does, so requests naming channels and dms that do not exist leave
+# nothing behind
+_conversation_locks = weakref.WeakValueDictionary()
+_conversation_locks_lock = threading.Lock()
+
+# the locks each thread holds, by their position in the lock order
+_held = threading.local()
+
+
+def _conversation_key(is_channel: bool, conversation_id: int) -> Tuple[int, int]:
+    return (CHANNEL if is_channel else DM, conversation_id)
+
+
+def _get_lock(key: Tuple[int, int]) -> RWLock:
+    if key == USERS:
+        return _users_lock
+
+    with _conversation_locks_lock:
+        lock = _conversation_locks.get(key)
+        if lock is None:
+            lock = RWLock()
+            _conversation_locks[key] = lock
+        return lock
+
+
+@contextlib.contextmanager
+def locked(conversations: dict, users: Optional[bool] = None):
+    '''
+    Holds the locks of the user table and of channels and dms, taken in the
+    lock order
+
+    Arguments:
+        conversations (dict): maps (is_channel, conversation_id) of each
+                              channel or dm to lock to True to lock it for
+                              writing, False for reading
+        users         (bool): True to lock the user table for writing,
+                              False for reading, None to leave it
+
+    Exceptions:
+        RuntimeError: Occurs when a lock is taken out of the lock order
+
+    Return Value:
+        None
+    '''
+
+    wanted = {}
+    if users is not None:
+        wanted[USERS] = users
+    for (is_channel, conversation_id), write in conversations.items():
+        key = _conversation_key(is_channel, conversation_id)
+        wanted[key] = wanted.get(key, False) or write
+
+    held = getattr(_held, 'keys', None)
+    if held is None:
+        held = _held.keys = []
+
+    taken = []
+    try:
+        for key in sorted(wanted):
+            if held and key not in held and key < max(held):
+                raise RuntimeError(f'lock {key} taken after lock {max(held)}, '
+                                   'out of the lock order')
+
+            lock = _get_lock(key)
+            if wanted[key]:
+                lock.acquire_write()
+            else:
+                lock.acquire_read()
+            taken.append((key, lock, wanted[key]))
+            held.append(key)
+
+        yield
+    finally:
+        for key, lock, write in reversed(taken):
+            held.remove(key)
+            if write:
+                lock.release_write()
+            else:
+                lock.release_read()
+
+
+def _decorate(function, get_locks, snapshot_reads: bool = False):
+    '''
+    Wraps a handler so it runs holding the locks get_locks gives for its
+    arguments, or holding none if it reads a snapshot
+    '''
+
+    signature = inspect.signature(function)
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if snapshot_reads and get_snapshot() is not None:
+            return function(*args, **kwargs)
+
+        arguments = signature.bind(*args, **kwargs)
+        arguments.apply_defaults()
+        conversations, users = get_locks(arguments.arguments)
+        with locked(conversations, users):
+            return function(*args, **kwargs)
+
+    return wrapper
+
+
+def users_locked(write: bool = True, snapshot_reads: bool = False):
+    '''
+    Decorates a handler to run holding the user table lock
+
+    Arguments:
+        write          (bool): True to lock it for writing, False for reading
+        snapshot_reads (bool): True if the handler only reads, through
+                               get_read_view, so needs no lock while there
+                               is a snapshot
+    '''
+
+    def decorator(function):
+        return _decorate(function, lambda arguments: ({}, write), snapshot_reads)
+    return decorator
+
+
+def conversation_locked(is_channel: bool, argument: str, write: bool = True,
+                        snapshot_reads: bool = False):
+    '''
+    Decorates a handler to run holding the lock of the channel or dm its
+    argument names
+
+    Arguments:
+        is_channel     (bool): whether the argument is a channel_id or a dm_id
+        argument        (str): name of the argument
+        write          (bool): True to lock it for writing, False for reading
+        snapshot_reads (bool): True if the handler only reads, through
+                               get_read_view, so needs no lock while there
+                               is a snapshot
+    '''
+
+    def get_locks(arguments):
+        return {(is_channel, arguments[argument]): write}, None
+
+    def decorator(function):
+        return _decorate(function, get_locks, snapshot_reads)
+    return decorator
+
+
+def message_conversation_locked(argument: str, write: bool = True):
+    '''
+    Decorates a handler to run holding the lock of the channel or dm the
+    message its argument names was sent to. Nothing is locked for a message
+    that does not exist, which the handler rejects; a message is never moved
+    to another conversation, so the one found before locking is still the
+    message's once locked.
+
+    Arguments:
+        argument (str): name of the argument holding the message_id
+        write   (bool): True to lock it for writing, False for reading
+    '''
+
+    def get_locks(arguments):
+        conversation = get_message_conversation(arguments[argument])
+        if conversation is None:
+            return {}, None
+        return {conversation: write}, None
+
+    def decorator(function):
+        return _decorate(function, get_locks)
+    return decorator
@@ -1,15 +1,13 @@
-import threading
 from src.error import InputError, AccessError
-from src.other import decode_token, check_valid_tag
+from src.other import decode_token, check_valid_tag, check_message_visible
+from src.locks import locked, conversation_locked, message_conversation_locked
+from src.scheduler import job_kind
 from datetime import timezone, datetime
-from typing import Optional, Dict
+from typing import Dict
 from src.data_operations import (
     get_channel_ids,
     get_channel,
-    get_channel_messages,
     add_message,
-    get_user_channels,
-    get_user_dms,
     get_dm,
     get_dm_ids,
     get_message_by_id,
@@ -19,18 +17,21 @@ from src.data_operations import (
     get_message_by_id,
     edit_message,
     get_messages_by_dm,
-    get_dm_messages,
     react_message,
     pin_message,
     remove_message,
     get_user,
     add_notification,
-    add_sendlater_id,
-    add_dm_sendlater_id
+    allocate_id,
+    get_message_conversation,
+    add_messages,
+    schedule_sendlater_job,
+    is_sendlater_pending
 )
 
 
-def message_send_v1(token: str, channel_id: int, message: str, message_sendlater: Optional[int] = 0) -> Dict[str, int]:
+@conversation_locked(True, 'channel_id')
+def message_send_v1(token: str, channel_id: int, message: str) -> Dict[str, int]:
     '''
     Sends a message into the channel
 
@@ -64,10 +65,7 @@ def message_send_v1(token: str, channel_id: int, message: str, message_sendlater
     elif message_length > 1000:
         raise InputError(description="Message over 1000 characters")
 
-    if message_sendlater != 0:
-        message_id = message_sendlater
-    else:
-        message_id = len(get_message_ids()) + 1
+    message_id = allocate_id('message')
 
     # time created
     dt = datetime.now()
@@ -89,6 +87,7 @@ def message_send_v1(token: str, channel_id: int, message: str, message_sendlater
     }
 
 
+@message_conversation_locked('message_id')
 def message_edit_v1(token: str, message_id: int, message: str) -> dict:
     '''
     Edits a pre-existing message
@@ -160,6 +159,7 @@ def message_edit_v1(token: str, message_id: int, message: str) -> dict:
     return {}
 
 
+@message_conversation_locked('message_id')
 def message_remove_v1(token: str, message_id: int) -> dict:
     '''
     Removes message from the channel/DM it was sent from
@@ -214,6 +214,7 @@ def message_remove_v1(token: str, message_id: int) -> dict:
     return {}
 
 
+@message_conversation_locked('message_id')
 def message_react_v1(token: str, message_id: int, react_id: int) -> dict:
     '''
     Reacts to a message in a channel/DM
@@ -240,16 +241,7 @@ def message_react_v1(token: str, message_id: int, react_id: int) -> dict:
     if message_id not in get_message_ids():
         raise InputError(description="Invalid message id")
 
-    channel_ids = get_user_channels(auth_user_id)
-    dm_ids = get_user_dms(auth_user_id)
-
-    message_id_valid = False
-    if any(message_id in get_channel_messages(channel) for channel in channel_ids) == True:
-        message_id_valid = True
-    if any(message_id in get_dm_messages(dm) for dm in dm_ids) == True:
-        message_id_valid = True
-
-    if message_id_valid == False:
+    if not check_message_visible(auth_user_id, message_id):
         raise InputError(
             description="Not a valid message_id in any channels the user is in")
 
@@ -282,6 +274,7 @@ def message_react_v1(token: str, message_id: int, react_id: int) -> dict:
     return {}
 
 
+@message_conversation_locked('message_id')
 def message_unreact_v1(token: str, message_id: int, react_id: int) -> dict:
     '''
     Unreacts message in the channel/DM it was sent from
@@ -308,16 +301,7 @@ def message_unreact_v1(token: str, message_id: int, react_id: int) -> dict:
     if message_id not in get_message_ids():
         raise InputError(description="Invalid message id")
 
-    channel_ids = get_user_channels(auth_user_id)
-    dm_ids = get_user_dms(auth_user_id)
-
-    message_id_valid = False
-    if any(message_id in get_channel_messages(channel) for channel in channel_ids) == True:
-        message_id_valid = True
-    if any(message_id in get_dm_messages(dm) for dm in dm_ids) == True:
-        message_id_valid = True
-
-    if message_id_valid == False:
+    if not check_message_visible(auth_user_id, message_id):
         raise InputError(
             description="Not a valid message_id in any channels the user is in")
 
@@ -339,6 +323,7 @@ def message_unreact_v1(token: str, message_id: int, react_id: int) -> dict:
     react_message(auth_user_id, message_id, react_id)
 
 
+@message_conversation_locked('message_id')
 def message_pin_v1(token: str, message_id: int) -> dict:
     '''
     Pins message in the channel/DM it was sent from
@@ -364,17 +349,7 @@ def message_pin_v1(token: str, message_id: int) -> dict:
     if message_id not in get_message_ids():
         raise InputError(description="Invalid message id")
 
-    channel_ids = get_user_channels(auth_user_id)
-    dm_ids = get_user_dms(auth_user_id)
-    message_id_valid = False
-
-    if any(message_id in get_channel_messages(channel) for channel in channel_ids) == True:
-        message_id_valid = True
-        is_channel = True
-    if any(message_id in get_dm_messages(dm) for dm in dm_ids) == True:
-        message_id_valid = True
-
-    if message_id_valid == False:
+    if not check_message_visible(auth_user_id, message_id):
         raise InputError(
             description="Not a valid message_id in any channels the user is in")
 
@@ -400,6 +375,7 @@ def message_pin_v1(token: str, message_id: int) -> dict:
     return {}
 
 
+@message_conversation_locked('message_id')
 def message_unpin_v1(token: str, message_id: int) -> dict:
     '''
     Unpins message in the channel/DM it was sent from
@@ -425,17 +401,7 @@ def message_unpin_v1(token: str, message_id: int) -> dict:
     if message_id not in get_message_ids():
         raise InputError(description="Invalid message id")
 
-    channel_ids = get_user_channels(auth_user_id)
-    dm_ids = get_user_dms(auth_user_id)
-    message_id_valid = False
-
-    if any(message_id in get_channel_messages(channel) for channel in channel_ids) == True:
-        message_id_valid = True
-
-    if any(message_id in get_dm_messages(dm) for dm in dm_ids) == True:
-        message_id_valid = True
-
-    if message_id_valid == False:
+    if not check_message_visible(auth_user_id, message_id):
         raise InputError(
             description="Not a valid message_id in any channels the user is in")
 
@@ -487,9 +453,6 @@ def message_share_v1(token: str, og_message_id: int, message: str, channel_id: i
     '''
     user_id = decode_token(token)
 
-    users_channels = get_user_channels(user_id)
-    users_dms = get_user_dms(user_id)
-
     if channel_id == -1 and dm_id == -1:
         raise InputError(description="Must share to valid dm or channel")
 
@@ -497,68 +460,69 @@ def message_share_v1(token: str, og_message_id: int, message: str, channel_id: i
         raise InputError(
             description="User can only share to a channel or a dm")
 
-    is_channel = False
-    channel_name = ''
-
+    # the message is read from its conversation while it is shared to another
+    conversations = {}
+    source = get_message_conversation(og_message_id)
+    if source is not None:
+        conversations[source] = False
     if dm_id == -1:
-        channel_members = get_channel(channel_id)['members']
-        is_channel = True
-        channel_name = get_channel(channel_id)['name']
-        send_to = channel_id
+        conversations[(True, channel_id)] = True
+    else:
+        conversations[(False, dm_id)] = True
 
-        if user_id not in channel_members:
-            raise AccessError(
-                description="User not in channel they are trying to share the message to")
+    with locked(conversations):
+        is_channel = False
+        channel_name = ''
 
-    if channel_id == -1:
-        dm_members = get_dm(dm_id)['members']
-        channel_name = get_dm(dm_id)['name']
-        send_to = dm_id
+        if dm_id == -1:
+            channel_members = get_channel(channel_id)['members']
+            is_channel = True
+            channel_name = get_channel(channel_id)['name']
+            send_to = channel_id
 
-        if user_id not in dm_members:
-            raise AccessError(
-                description="User not in dm they are trying to share the message to")
+            if user_id not in channel_members:
+                raise AccessError(
+                    description="User not in channel they are trying to share the message to")
 
-    valid_message_ids = []
-    for channel_ids in users_channels:
-        channel_messages = get_channel_messages(channel_ids)
-        for ch_msg in channel_messages:
-            valid_message_ids.append(ch_msg)
+        if channel_id == -1:
+            dm_members = get_dm(dm_id)['members']
+            channel_name = get_dm(dm_id)['name']
+            send_to = dm_id
 
-    for dm_ids in users_dms:
-        dm_messages = get_dm_messages(dm_ids)
-        for dm_msg in dm_messages:
-            valid_message_ids.append(dm_msg)
+            if user_id not in dm_members:
+                raise AccessError(
+                    description="User not in dm they are trying to share the message to")
 
-    if og_message_id not in valid_message_ids:
-        raise InputError(description="Cannot share invalid message")
+        if not check_message_visible(user_id, og_message_id):
+            raise InputError(description="Cannot share invalid message")
 
-    if len(message) > 1000:
-        raise InputError(
-            description="Message must be less than or equal to 1000 characters")
+        if len(message) > 1000:
+            raise InputError(
+                description="Message must be less than or equal to 1000 characters")
 
-    old_message = get_message_content(og_message_id)
+        old_message = get_message_content(og_message_id)
 
-    shared_message_id = len(get_message_ids()) + 1
-    content = old_message + message
-    dt = datetime.now()
-    time_created = int(dt.timestamp())
+        shared_message_id = allocate_id('message')
+        content = old_message + message
+        dt = datetime.now()
+        time_created = int(dt.timestamp())
 
-    if "@" in message:
-        tagged_user = check_valid_tag(is_channel, message, send_to)
-        if tagged_user:
-            auth_user_handle = get_user(user_id)['user_handle']
-            add_notification(is_channel, send_to, tagged_user,
-                             f"{auth_user_handle} tagged you in {channel_name}: {message[:20]}")
+        if "@" in message:
+            tagged_user = check_valid_tag(is_channel, message, send_to)
+            if tagged_user:
+                auth_user_handle = get_user(user_id)['user_handle']
+                add_notification(is_channel, send_to, tagged_user,
+                                 f"{auth_user_handle} tagged you in {channel_name}: {message[:20]}")
 
-    add_message(is_channel, user_id, send_to,
-                shared_message_id, content, time_created)
+        add_message(is_channel, user_id, send_to,
+                    shared_message_id, content, time_created)
 
     return {
         'shared_message_id': int(shared_message_id)
     }
 
 
+@conversation_locked(True, 'channel_id')
 def message_sendlater_v1(token: str, channel_id: int, message: str, time_sent: int) -> Dict[str, int]:
     '''
     Send a message from the authorised user to the channel specified by channel_id automatically at a specified time in the future.
@@ -602,20 +566,18 @@ def message_sendlater_v1(token: str, channel_id: int, message: str, time_sent: i
     if len(message) > 1000:
         raise InputError(description="Message is too long")
 
-    delayed_message_id = len(get_message_ids()) + 1
-    add_sendlater_id(delayed_message_id)
+    delayed_message_id = allocate_id('message')
 
-    # set a timer, send the message when the standup ends
-    timer = threading.Timer(length, message_send_v1,
-                            (token, channel_id, message, delayed_message_id))
-    timer.daemon = True
-    timer.start()
+    # send the message when it is due, even if the server restarts first
+    schedule_sendlater_job(delayed_message_id, time_sent - dt.timestamp(), 'sendlater',
+                           True, channel_id, token, channel_id, message, delayed_message_id)
 
     return {
         'message_id': delayed_message_id
     }
 
 
+@conversation_locked(False, 'dm_id')
 def message_sendlaterdm_v1(token, dm_id, message, time_sent):
     '''
     Send a message from the authorised user to the channel specified by channel_id automatically at a specified time in the future.
@@ -659,15 +621,135 @@ def message_sendlaterdm_v1(token, dm_id, message, time_sent):
     if len(message) > 1000:
         raise InputError(description="Message is too long")
 
-    delayed_message_id = len(get_dm_ids()) + 1
-    add_dm_sendlater_id(delayed_message_id)
+    delayed_message_id = allocate_id('message')
 
-    # set a timer, send the message when the standup ends
-    timer = threading.Timer(length, message_send_v1,
-                            (token, dm_id, message, delayed_message_id))
-    timer.daemon = True
-    timer.start()
+    # send the message when it is due, even if the server restarts first
+    schedule_sendlater_job(delayed_message_id, time_sent - dt.timestamp(), 'sendlaterdm',
+                           False, dm_id, token, dm_id, message, delayed_message_id)
 
     return {
         'message_id': delayed_message_id
     }
+
+
+def send_later_batch(is_channel: bool, conversation_id: int, jobs: list) -> None:
+    '''
+    Sends the messages sent later to a channel or dm that fell due in the
+    same tick as one batch. Each is checked as message_send_v1 and
+    message_senddm_v1 check a message, but the stats are updated once for
+    the batch. Messages they would refuse, or sent before the server
+    restarted, are skipped.
+
+    Arguments:
+        is_channel       (bool): whether the messages are to a channel or a dm
+        conversation_id   (int): id of the channel or dm
+        jobs             (list): [token, conversation_id, message, message_id]
+                                 of each message, in the order they were due
+
+    Return Value:
+        None
+    '''
+
+    if is_channel:
+        if conversation_id not in get_channel_ids():
+            return
+        conversation = get_channel(conversation_id)
+    else:
+        if conversation_id not in get_dm_ids():
+            return
+        conversation = get_dm(conversation_id)
+
+    # time created
+    dt = datetime.now()
+    time_created = int(dt.timestamp())
+
+    auth_user_ids = {}
+    messages = []
+    notifications = []
+    for token, _, message, message_id in jobs:
+        # each user's token is only decoded once
+        if token not in auth_user_ids:
+            try:
+                auth_user_ids[token] = decode_token(token)
+            except AccessError:
+                auth_user_ids[token] = None
+        auth_user_id = auth_user_ids[token]
+
+        if auth_user_id not in conversation['members'] or not 1 <= len(message) <= 1000:
+            continue
+        if not is_sendlater_pending(message_id):
+            continue
+
+        if "@" in message:
+            tagged_user = check_valid_tag(is_channel, message, conversation_id)
+            if tagged_user:
+                auth_user_handle = get_user(auth_user_id)['user_handle']
+                notifications.append([tagged_user,
+                                      f"{auth_user_handle} tagged you in {conversation['name']}: {message[:20]}"])
+
+        messages.append([int(auth_user_id), int(message_id), message, time_created])
+
+    add_messages(is_channel, conversation_id, messages, notifications)
+
+
+@job_kind('sendlater', batched=True)
+def send_later(jobs: list) -> None:
+    '''
+    Sends the messages reserved by message_sendlater_v1 that fell due in the
+    same tick, in one batch for each channel
+
+    Arguments:
+        jobs (list): [token, channel_id, message, message_id] of each message
+
+    Return Value:
+        None
+    '''
+
+    for channel_id, channel_jobs in group_by_conversation(jobs).items():
+        send_later_to_channel(channel_id, channel_jobs)
+
+
+@job_kind('sendlaterdm', batched=True)
+def send_later_dm(jobs: list) -> None:
+    '''
+    Sends the messages reserved by message_sendlaterdm_v1 that fell due in
+    the same tick, in one batch for each dm
+
+    Arguments:
+        jobs (list): [token, dm_id, message, message_id] of each message
+
+    Return Value:
+        None
+    '''
+
+    for dm_id, dm_jobs in group_by_conversation(jobs).items():
+        send_later_to_dm(dm_id, dm_jobs)
+
+
+@conversation_locked(True, 'channel_id')
+def send_later_to_channel(channel_id: int, jobs: list) -> None:
+    send_later_batch(True, channel_id, jobs)
+
+
+@conversation_locked(False, 'dm_id')
+def send_later_to_dm(dm_id: int, jobs: list) -> None:
+    send_later_batch(False, dm_id, jobs)
+
+
+def group_by_conversation(jobs: list) -> dict:
+    '''
+    Groups the jobs of messages sent later by the channel or dm they are
+    sent to, keeping the order they were due in
+
+    Arguments:
+        jobs (list): [token, conversation_id, message, message_id] of each
+                     message
+
+    Return Value:
+        conversations (dict): maps each conversation_id to its jobs
+    '''
+
+    conversations = {}
+    for job in jobs:
+        conversations.setdefault(job[1], []).append(job)
+    return conversations
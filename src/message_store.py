@@ -0,0 +1,324 @@
+'''
+A columnar message_data for workspaces with tens of millions of messages,
+used in place of the dict of Message records when config.message_store is
+'columnar'. Only data_operations and persistence should use it.
+
+Every message id is a row. The author, time created, channel or dm id,
+flags and the position of the content are kept in typed arrays indexed by
+row, the content of every message is appended to one bytearray (the arena)
+as utf-8, and the users who reacted are kept in a dict holding only the
+messages someone reacted to. A message takes a few dozen bytes besides its
+content instead of a record and the objects it points to, and scanning the
+content of many messages reads the arena instead of following pointers.
+
+Ids handed out by allocate_id increase from 1, so rows are dense. An edit
+appends the new content to the arena, the old content stays there.
+
+message_data[message_id] gives a MessageView, read and written with the same
+keys as a Message. Views pickle as the Message they show, so snapshots are
+the same whichever message_data is used.
+
+Classes:
+    ColumnarMessageData(messages: dict)
+    MessageView(messages: ColumnarMessageData, row: int)
+'''
+
+from array import array
+from collections.abc import MutableMapping
+
+from src.records import Message
+
+# state of each row
+ABSENT = 0
+PLACEHOLDER = 1
+SENT = 2
+
+# bits of the flags column
+IS_CHANNEL = 1
+IS_PINNED = 2
+USER_REACTED = 4
+
+
+class ColumnarMessageData(MutableMapping):
+    '''
+    Maps each message id to a MessageView of the message's row
+    '''
+
+    def __init__(self, messages: dict = None):
+        self._state = array('B')
+        self._author = array('q')
+        self._time_created = array('q')
+        self._conversation = array('q')
+        self._flags = array('B')
+        self._offset = array('Q')
+        self._length = array('I')
+        self._arena = bytearray()
+        self._react_u_ids = {}
+        self._count = 0
+
+        for message_id, message in (messages or {}).items():
+            self[message_id] = message
+
+    def _grow(self, rows: int) -> None:
+        '''
+        Adds empty rows so the columns have at least rows rows
+        '''
+
+        missing = rows - len(self._state)
+        if missing <= 0:
+            return
+
+        # grow by at least half again, so adding messages one at a time
+        # does not copy the columns every time
+        missing = max(missing, len(self._state) // 2)
+        for column in (self._state, self._author, self._time_created,
+                       self._conversation, self._flags, self._offset, self._length):
+            column.frombytes(bytes(missing * column.itemsize))
+
+    def _row(self, message_id) -> int:
+        '''
+        Gets the row of a message, -1 if there is no such message
+        '''
+
+        if type(message_id) is not int or not 0 <= message_id < len(self._state):
+            return -1
+        if self._state[message_id] == ABSENT:
+            return -1
+        return message_id
+
+    def set_content(self, row: int, content: str) -> None:
+        '''
+        Appends the content of a message to the arena and points its row at it
+        '''
+
+        encoded = content.encode()
+        self._offset[row] = len(self._arena)
+        self._length[row] = len(encoded)
+        self._arena += encoded
+
+    def get_content(self, row: int) -> str:
+        offset = self._offset[row]
+        return self._arena[offset:offset + self._length[row]].decode()
+
+    def set_flag(self, row: int, flag: int, value: bool) -> None:
+        if value:
+            self._flags[row] |= flag
+        else:
+            self._flags[row] &= ~flag
+
+    def find(self, message_ids, query_str: str) -> list:
+        '''
+        Gets the messages whose content contains a string, reading the
+        content from the arena in place
+
+        Arguments:
+            message_ids (iterable): ids of the messages to search
+            query_str        (str): string to search for
+
+        Return Value:
+            message_ids (list): ids of the messages containing it, in the
+                                order they were given
+        '''
+
+        query = query_str.encode()
+        arena, offsets, lengths = self._arena, self._offset, self._length
+
+        found = []
+        for message_id in message_ids:
+            row = self._row(message_id)
+            if row < 0:
+                continue
+            start = offsets[row]
+            if arena.find(query, start, start + lengths[row]) != -1:
+                found.append(message_id)
+        return found
+
+    @property
+    def arena_size(self) -> int:
+        return len(self._arena)
+
+    def __getitem__(self, message_id) -> 'MessageView':
+        row = self._row(message_id)
+        if row < 0:
+            raise KeyError(message_id)
+        return MessageView(self, row)
+
+    def __setitem__(self, message_id: int, message) -> None:
+        if type(message_id) is not int or message_id < 0:
+            raise KeyError(message_id)
+
+        if isinstance(message, MessageView):
+            message = message.to_record()
+        message = Message.upgrade(message)
+
+        self._grow(message_id + 1)
+        row = message_id
+        if self._state[row] == ABSENT:
+            self._count += 1
+        self._react_u_ids.pop(row, None)
+
+        # messages reserved by message_sendlater_v1 have no fields yet
+        if message.is_channel == '':
+            self._state[row] = PLACEHOLDER
+            self._flags[row] = 0
+            self._length[row] = 0
+            return
+
+        self._state[row] = SENT
+        self._author[row] = message.author
+        self._time_created[row] = message.time_created
+        self._conversation[row] = message.channel_created
+        self._flags[row] = ((IS_CHANNEL if message.is_channel else 0)
+                            | (IS_PINNED if message.is_pinned else 0)
+                            | (USER_REACTED if message.is_this_user_reacted else 0))
+        self.set_content(row, message.content)
+        if message.react_u_ids is not None:
+            self._react_u_ids[row] = list(message.react_u_ids)
+
+    def __delitem__(self, message_id) -> None:
+        row = self._row(message_id)
+        if row < 0:
+            raise KeyError(message_id)
+
+        self._state[row] = ABSENT
+        self._react_u_ids.pop(row, None)
+        self._count -= 1
+
+    def __contains__(self, message_id) -> bool:
+        return self._row(message_id) >= 0
+
+    def __iter__(self):
+        state = self._state
+        return (row for row in range(len(state)) if state[row] != ABSENT)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def to_dict(self) -> dict:
+        return dict(self.items())
+
+    def __repr__(self) -> str:
+        return f'ColumnarMessageData({self.to_dict()!r})'
+
+
+def _field(name: str, column: str, placeholder=''):
+    '''
+    Makes a property of MessageView reading a column, giving placeholder for
+    a message not sent yet
+    '''
+
+    def get(view):
+        messages = view._messages
+        if messages._state[view._row] == PLACEHOLDER:
+            return placeholder
+        return getattr(messages, column)[view._row]
+
+    get.__name__ = name
+    return property(get)
+
+
+def _flag(name: str, flag: int, placeholder=False):
+    '''
+    Makes a property of MessageView reading and writing a bit of the flags
+    column
+    '''
+
+    def get(view):
+        if view._messages._state[view._row] == PLACEHOLDER:
+            return placeholder
+        return bool(view._messages._flags[view._row] & flag)
+
+    def set(view, value):
+        view._messages.set_flag(view._row, flag, value)
+
+    get.__name__ = name
+    return property(get, set)
+
+
+class MessageView:
+    '''
+    One row of a ColumnarMessageData, read and written like a Message
+    '''
+
+    __slots__ = ('_messages', '_row')
+
+    def __init__(self, messages: ColumnarMessageData, row: int):
+        self._messages = messages
+        self._row = row
+
+    author = _field('author', '_author')
+    time_created = _field('time_created', '_time_created')
+    channel_created = _field('channel_created', '_conversation')
+    is_channel = _flag('is_channel', IS_CHANNEL, '')
+    is_pinned = _flag('is_pinned', IS_PINNED)
+    is_this_user_reacted = _flag('is_this_user_reacted', USER_REACTED)
+
+    @property
+    def message_id(self):
+        if self._messages._state[self._row] == PLACEHOLDER:
+            return ''
+        return self._row
+
+    @property
+    def content(self) -> str:
+        if self._messages._state[self._row] == PLACEHOLDER:
+            return ''
+        return self._messages.get_content(self._row)
+
+    @content.setter
+    def content(self, content: str) -> None:
+        self._messages.set_content(self._row, content)
+
+    @property
+    def react_u_ids(self):
+        return self._messages._react_u_ids.get(self._row)
+
+    @react_u_ids.setter
+    def react_u_ids(self, u_ids) -> None:
+        self._messages._react_u_ids[self._row] = u_ids
+
+    reacts = Message.reacts
+
+    def keys(self) -> tuple:
+        return Message.KEYS
+
+    def to_record(self) -> Message:
+        return Message(*(getattr(self, field) for field in Message.__slots__))
+
+    def to_dict(self) -> dict:
+        return self.to_record().to_dict()
+
+    def __getitem__(self, key: str):
+        if key not in Message.KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key: str, value) -> None:
+        if key not in Message.__slots__:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key: str) -> bool:
+        return key in Message.KEYS
+
+    def get(self, key: str, default=None):
+        return getattr(self, key) if key in Message.KEYS else default
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, MessageView):
+            other = other.to_record()
+        if not isinstance(other, Message):
+            return NotImplemented
+        return self.to_record() == other
+
+    def __ne__(self, other) -> bool:
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    __hash__ = None
+
+    def __reduce__(self):
+        return self.to_record().__reduce__()
+
+    def __repr__(self) -> str:
+        return repr(self.to_record())
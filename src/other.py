@@ -13,12 +13,13 @@ from src.data_operations import (
     reset_data_store_to_default,
     get_all_valid_tokens,
     add_session_token,
-    clear_active_threads,
+    cancel_workspace_jobs,
     get_user_handles,
     get_channel,
     get_dm,
-    get_user_ids,
-    get_user
+    get_message_conversation,
+    get_user_id_by_email,
+    get_user_id_by_handle
 )
 
 from src.error import AccessError
@@ -35,7 +36,7 @@ def clear_v1():
         { }
     '''
 
-    clear_active_threads()
+    cancel_workspace_jobs()
     reset_data_store_to_default()
     return {}
 
@@ -51,11 +52,7 @@ def get_uid_by_email(email: str) -> Dict[str, int]:
         user_id (int): the user's user_id
     '''
 
-    for person in get_user_ids():
-        if get_user(person)['email_address'] == email:
-            user_id = person
-
-    return user_id
+    return get_user_id_by_email(email)
 
 
 def encode_token(user_id: int) -> Dict[str, int]:
@@ -128,8 +125,31 @@ def check_valid_tag(is_channel: bool, message: str, channel_id: int) -> Union[in
 
 
 def get_user_from_handle(user_handle: str) -> Union[int, bool]:
-    for person in get_user_ids():
-        if get_user(person)['user_handle'] == user_handle:
-            user_id = person
-            return user_id
-    return False
+    user_id = get_user_id_by_handle(user_handle)
+    if user_id is None:
+        return False
+    return user_id
+
+
+def check_message_visible(user_id: int, message_id: int) -> bool:
+    '''
+    Checks whether a message was sent to a channel or dm the user is a member
+    of, looking up the message's conversation instead of searching the
+    message lists of every conversation the user has joined
+
+    Arguments:
+        user_id    (int): id of the user
+        message_id (int): id of the message
+
+    Return Value:
+        (bool): True if the user can see the message else False
+    '''
+
+    conversation = get_message_conversation(message_id)
+    if conversation is None:
+        return False
+
+    is_channel, conversation_id = conversation
+    if is_channel:
+        return user_id in get_channel(conversation_id)['members']
+    return user_id in get_dm(conversation_id)['members']
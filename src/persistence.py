@@ -0,0 +1,965 @@
+'''
+Durable storage for the data_store. Only data_operations should use this module.
+
+The data_store is persisted as a snapshot plus an append-only mutation log.
+Every mutation made through data_operations is appended to the log as it
+happens, and the log is folded into a fresh snapshot (a checkpoint) once it
+grows past config.checkpoint_log_size bytes. Restoring loads the snapshot and
+replays the log entries that are newer than it.
+
+Each log entry is one line of json:
+    [lsn, function_name, args, kwargs]
+where lsn is the log sequence number of the entry.
+
+The snapshot is split into shards, kept in config.snapshot_dir:
+    users          user_data and the user_handles, user_emails, user_ids,
+                   global_owners and password_reset_key lists
+    sessions       token
+    stats          user_stats and workspace_stats
+    workspace      channel_ids, dm_ids and message_ids
+    channel_<id>   the channel_data of one channel and the message_data of
+                   its messages
+    dm_<id>        the dm_data of one dm and the message_data of its messages
+
+The messages of a channel or dm are written after the rest of its shard, so
+data_restore can leave them on disk until they are first used (see
+LazyMessageData).
+A checkpoint only rewrites the shards changed since the last one. Each shard
+is written to a new file named after the generation of the checkpoint, and a
+manifest naming the current file of every shard is written last, so a crash
+part way through a checkpoint leaves the previous checkpoint intact.
+
+Every snapshot file is written to a temporary file which is synced and then
+renamed into place. It is a fixed size header, the id of the codec in
+SNAPSHOT_CODECS its frames are compressed with, and then the frames. The
+first frame holds the contents of the file pickled with protocol 5, which
+keeps the int keys and nested lists of the store exactly as they are, and
+the messages of a channel or dm shard are in a second frame of their own.
+Each frame is its compressed length followed by the compressed data. The
+header holds:
+    SNAPSHOT_MAGIC, snapshot format version, lsn
+Snapshots from versions 1 and 2 hold uncompressed pickles instead of frames.
+Snapshots without the header are read as the json written by older versions.
+
+Classes:
+    MutationLog(path: str, lsn: int, valid_size: int)
+    SnapshotWriter(directory: str, manifest: dict, generation: int,
+                   codec: str, level: int)
+    MessageSegment(path: str, offset: int, codec: str)
+    LazyMessageData(messages: dict, segments: dict)
+
+Functions:
+    channel_shard(channel_id: int) -> str
+    dm_shard(dm_id: int) -> str
+    get_shard_names(store: dict) -> list
+    capture_shard(store: dict, shard: str) -> dict
+    freeze_shard(store: dict, shard: str) -> list
+    assemble_store(shards: dict) -> dict
+    read_shards(directory: str, workers: int, lazy: bool) -> Tuple[dict, dict, int]
+    read_conversation_shard(path: str, lazy: bool) -> dict
+    read_log(path: str) -> Tuple[list, int]
+    write_snapshot(path: str, contents, lsn: int, codec: str, level: int)
+    encode_snapshot(frames: list, codec: str, level: int) -> bytes
+    write_snapshot_file(path: str, encoded: bytes, lsn: int)
+    sync_directory(path: str)
+    read_snapshot(path: str) -> Tuple[dict, int]
+    read_snapshot_header(snapshot_file, path: str) -> Tuple[int, str]
+    read_frame(snapshot_file, codec: str)
+    read_json_snapshot(snapshot_file) -> Tuple[dict, int]
+    resident_memory() -> int
+'''
+
+import os
+import gzip
+import json
+import lzma
+import mmap
+import time
+import zlib
+import pickle
+import struct
+import resource
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Tuple, Optional
+
+from src.records import Message, placeholder_message
+
+SNAPSHOT_MAGIC = b'BEAGLESNAP'
+SNAPSHOT_VERSION = 3
+# version 1 snapshots kept the messages of a channel or dm inside its shard,
+# versions 1 and 2 were not compressed
+SUPPORTED_SNAPSHOT_VERSIONS = (1, 2, 3)
+SNAPSHOT_HEADER = struct.Struct('<10sHQ')
+CODEC_ID = struct.Struct('<B')
+FRAME_LENGTH = struct.Struct('<Q')
+
+# codecs the frames of a snapshot can be compressed with, by the name used for
+# config.snapshot_codec. Each is
+#     (id stored in the file, compress(data, level), decompress(data))
+# and a level of None uses the codec's default level.
+SNAPSHOT_CODECS = {
+    'none': (0, lambda data, level: data, lambda data: data),
+    'zlib': (1, lambda data, level: zlib.compress(data, -1 if level is None else level),
+             zlib.decompress),
+    'gzip': (2, lambda data, level: gzip.compress(data, 9 if level is None else level),
+             gzip.decompress),
+    'lzma': (3, lambda data, level: lzma.compress(data, preset=level),
+             lzma.decompress)
+}
+CODEC_NAMES = {codec[0]: name for name, codec in SNAPSHOT_CODECS.items()}
+
+MANIFEST_NAME = 'MANIFEST'
+
+# data_store entries kept in each shard, besides the conversation shards
+STORE_SHARDS = {
+    'users': ('user_data', 'user_handles', 'user_emails', 'user_ids',
+              'global_owners', 'password_reset_key'),
+    'sessions': ('token',),
+    'stats': ('user_stats', 'workspace_stats', 'message_counts', 'involved_users'),
+    'workspace': ('channel_ids', 'dm_ids', 'message_ids', 'id_blocks', 'scheduled_jobs')
+}
+
+# data_store entries whose keys are ints (json snapshots store them as strings)
+INT_KEYED_ENTRIES = (
+    'user_data',
+    'channel_data',
+    'dm_data',
+    'message_data',
+    'user_stats',
+    'message_counts',
+    'scheduled_jobs'
+)
+
+
+class MutationLog:
+    '''
+    Append-only log of the mutations applied to the data_store
+
+    Arguments:
+        path       (str): file the log is written to
+        lsn        (int): sequence number of the last entry already applied
+        valid_size (int): number of bytes at the start of the file holding
+                          complete entries, anything after it is discarded
+    '''
+
+    def __init__(self, path: str, lsn: int, valid_size: int):
+        self.path = path
+        self.lsn = lsn
+        self._synced_lsn = lsn
+
+        # drop a partially written entry left behind by a crash
+        with open(path, 'a') as log_file:
+            log_file.truncate(valid_size)
+
+        self._file = open(path, 'a')
+
+    def append(self, function_name: str, args: tuple, kwargs: dict) -> int:
+        '''
+        Appends a mutation to the log
+
+        Arguments:
+            function_name (str): name of the data_operations function called
+            args        (tuple): positional arguments of the call
+            kwargs       (dict): keyword arguments of the call
+
+        Return Value:
+            lsn (int): sequence number given to the entry
+        '''
+
+        self.lsn += 1
+        entry = json.dumps([self.lsn, function_name, args, kwargs])
+
+        # hand the entry to the OS straight away so a crash of the process
+        # does not lose it, sync() makes it durable against power loss
+        self._file.write(entry + '\n')
+        self._file.flush()
+
+        return self.lsn
+
+    def sync(self) -> None:
+        '''
+        Forces all appended entries to disk, does nothing if no entries were
+        appended since the last sync
+        '''
+
+        if self.lsn == self._synced_lsn:
+            return
+
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._synced_lsn = self.lsn
+
+    def size(self) -> int:
+        '''
+        Gets the size of the log in bytes
+        '''
+
+        return self._file.tell()
+
+    def discard(self, size: int) -> None:
+        '''
+        Drops the entries at the start of the log, once they are covered by a
+        snapshot. Entries appended after them are kept.
+
+        Arguments:
+            size (int): bytes at the start of the log to drop, a size()
+                        taken before the entries after them were appended
+
+        Return Value:
+            None
+        '''
+
+        self._file.flush()
+
+        with open(self.path, 'rb') as log_file:
+            log_file.seek(size)
+            tail = log_file.read()
+
+        if not tail:
+            self._file.truncate(0)
+            self._file.seek(0)
+            os.fsync(self._file.fileno())
+            self._synced_lsn = self.lsn
+            return
+
+        # the kept entries replace the log in one rename
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'wb') as temp_file:
+            temp_file.write(tail)
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+
+        self._file.close()
+        os.replace(temp_path, self.path)
+        sync_directory(os.path.dirname(os.path.abspath(self.path)))
+        self._file = open(self.path, 'a')
+        self._synced_lsn = self.lsn
+
+    def close(self) -> None:
+        '''
+        Syncs and closes the log file
+        '''
+
+        self.sync()
+        self._file.close()
+
+
+class SnapshotWriter:
+    '''
+    Writes the shards of the data_store changed since the last checkpoint,
+    skipping the checkpoint when the store has not changed at all
+
+    Arguments:
+        directory  (str): directory the shards and manifest are written to
+        manifest  (dict): maps each shard to its file in the directory
+        generation (int): generation of the store held in the shards on disk
+        codec      (str): name of the codec in SNAPSHOT_CODECS the shards are
+                          compressed with
+        level      (int): compression level, None for the codec's default
+
+    Attributes:
+        generation    (int): generation of the store in the last checkpoint
+        duration    (float): seconds the last checkpoint took to write
+        time_written  (int): time the last checkpoint was written
+        shards_written (int): number of shards the last checkpoint wrote
+        bytes_written  (int): bytes the last checkpoint wrote
+    '''
+
+    def __init__(self, directory: str, manifest: dict, generation: int,
+                 codec: str = 'none', level: Optional[int] = None):
+        if codec not in SNAPSHOT_CODECS:
+            raise ValueError(f'Unknown snapshot codec {codec}')
+
+        self.directory = directory
+        self.manifest = manifest
+        self.generation = generation
+        self.codec = codec
+        self.level = level
+        self.duration = 0.0
+        self.time_written = None
+        self.shards_written = 0
+        self.bytes_written = 0
+
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, shards: dict, lsn: int, generation: int, replace_all: bool) -> bool:
+        '''
+        Writes a checkpoint if the store has changed since the last one
+
+        Arguments:
+            shards      (dict): maps each changed shard to its frames from
+                                freeze_shard, None if the shard no longer
+                                exists
+            lsn          (int): sequence number of the last log entry the
+                                store includes
+            generation   (int): current generation of the store
+            replace_all (bool): True if shards holds every shard of the store
+                                and any others should be dropped
+
+        Return Value:
+            written (bool): True if a checkpoint was written else False
+        '''
+
+        if generation == self.generation:
+            return False
+
+        start = time.perf_counter()
+
+        bytes_written = 0
+
+        manifest = {} if replace_all else dict(self.manifest)
+        for shard, frames in shards.items():
+            if frames is None:
+                manifest.pop(shard, None)
+                continue
+
+            file_name = f'{shard}.{generation}.snapshot'
+            encoded = encode_snapshot(frames, self.codec, self.level)
+            write_snapshot_file(os.path.join(
+                self.directory, file_name), encoded, lsn)
+            manifest[shard] = file_name
+            bytes_written += SNAPSHOT_HEADER.size + len(encoded)
+
+        # the manifest switches over to the new shards in one rename
+        sync_directory(self.directory)
+        write_snapshot(os.path.join(
+            self.directory, MANIFEST_NAME), manifest, lsn)
+
+        # the files the manifest no longer names can go
+        in_use = set(manifest.values())
+        for file_name in os.listdir(self.directory):
+            if file_name.endswith('.snapshot') and file_name not in in_use:
+                os.remove(os.path.join(self.directory, file_name))
+
+        self.manifest = manifest
+        self.generation = generation
+        self.duration = time.perf_counter() - start
+        self.time_written = int(time.time())
+        self.shards_written = len(shards)
+        self.bytes_written = bytes_written
+
+        return True
+
+
+class MessageSegment:
+    '''
+    The messages of a channel or dm shard, left in the shard file until they
+    are needed
+
+    Arguments:
+        path   (str): file holding the shard
+        offset (int): position in the file the messages are at
+        codec  (str): codec the messages are compressed with, None if they
+                      are an uncompressed pickle
+    '''
+
+    def __init__(self, path: str, offset: int, codec: Optional[str]):
+        self.path = path
+        self.offset = offset
+        self.codec = codec
+
+    def load(self) -> dict:
+        '''
+        Reads the messages from the shard file
+
+        Return Value:
+            messages (dict): maps each message_id to its message
+        '''
+
+        with open(self.path, 'rb') as shard_file:
+            with mmap.mmap(shard_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                with memoryview(mapped)[self.offset:] as segment:
+                    if self.codec is None:
+                        return pickle.loads(segment)
+
+                    length, = FRAME_LENGTH.unpack_from(segment)
+                    frame = segment[FRAME_LENGTH.size:FRAME_LENGTH.size + length]
+                    with frame:
+                        decompress = SNAPSHOT_CODECS[self.codec][2]
+                        return pickle.loads(decompress(frame))
+
+
+class LazyMessageData(dict):
+    '''
+    The message_data of the data_store, where the messages of channels and
+    dms nobody has looked at since the store was restored are still on disk.
+    The first use of one of those messages loads every message of its
+    channel or dm.
+
+    Looking up, changing or deleting a message works as it does on a dict.
+    Iterating over the messages or comparing them loads all of them.
+
+    Arguments:
+        messages (dict): maps the id of each loaded message to the message
+        segments (dict): maps the id of each message still on disk to the
+                         MessageSegment it is in
+
+    Attributes:
+        cold_messages (int): number of messages still on disk
+    '''
+
+    def __init__(self, messages: dict, segments: dict):
+        super().__init__(messages)
+        self._segments = segments
+        self._load_lock = threading.Lock()
+
+    @property
+    def cold_messages(self) -> int:
+        return len(self._segments)
+
+    def load(self, message_id: int) -> None:
+        '''
+        Loads the messages of the channel or dm a message is in, if they are
+        still on disk
+
+        Arguments:
+            message_id (int): id of the message
+
+        Return Value:
+            None
+        '''
+
+        # request threads read the store without taking the mutation lock
+        with self._load_lock:
+            segment = self._segments.get(message_id)
+            if segment is None:
+                return
+
+            for loaded_id, message in segment.load().items():
+                # a message replaced since the restore keeps its new value,
+                # shards written by older versions hold dicts
+                if self._segments.get(loaded_id) is segment:
+                    del self._segments[loaded_id]
+                    dict.__setitem__(self, loaded_id, Message.upgrade(message))
+
+    def load_all(self) -> None:
+        '''
+        Loads every message still on disk
+        '''
+
+        while self._segments:
+            self.load(next(iter(self._segments)))
+
+    def __missing__(self, message_id):
+        if message_id not in self._segments:
+            raise KeyError(message_id)
+
+        self.load(message_id)
+        return dict.__getitem__(self, message_id)
+
+    def __contains__(self, message_id) -> bool:
+        return dict.__contains__(self, message_id) or message_id in self._segments
+
+    def __len__(self) -> int:
+        return dict.__len__(self) + len(self._segments)
+
+    def __setitem__(self, message_id, message) -> None:
+        self._segments.pop(message_id, None)
+        dict.__setitem__(self, message_id, message)
+
+    def __delitem__(self, message_id) -> None:
+        self.load(message_id)
+        dict.__delitem__(self, message_id)
+
+    def get(self, message_id, default=None):
+        try:
+            return self[message_id]
+        except KeyError:
+            return default
+
+    def pop(self, message_id, *default):
+        self.load(message_id)
+        return dict.pop(self, message_id, *default)
+
+    def __iter__(self):
+        self.load_all()
+        return dict.__iter__(self)
+
+    def keys(self):
+        self.load_all()
+        return dict.keys(self)
+
+    def values(self):
+        self.load_all()
+        return dict.values(self)
+
+    def items(self):
+        self.load_all()
+        return dict.items(self)
+
+    def copy(self) -> dict:
+        self.load_all()
+        return dict.copy(self)
+
+    def __eq__(self, other) -> bool:
+        self.load_all()
+        if isinstance(other, LazyMessageData):
+            other.load_all()
+        return dict.__eq__(self, other)
+
+    def __ne__(self, other) -> bool:
+        return not self == other
+
+    def __repr__(self) -> str:
+        self.load_all()
+        return dict.__repr__(self)
+
+    def __reduce__(self):
+        return dict, (self.copy(),)
+
+
+def channel_shard(channel_id: int) -> str:
+    '''
+    Gets the name of the shard holding a channel and its messages
+    '''
+
+    return f'channel_{channel_id}'
+
+
+def dm_shard(dm_id: int) -> str:
+    '''
+    Gets the name of the shard holding a dm and its messages
+    '''
+
+    return f'dm_{dm_id}'
+
+
+def get_shard_names(store: dict) -> list:
+    '''
+    Gets the names of all the shards of the data_store
+
+    Arguments:
+        store (dict): the data_store contents
+
+    Return Value:
+        shards (list): names of the shards
+    '''
+
+    shards = list(STORE_SHARDS)
+    shards.extend(channel_shard(channel_id)
+                  for channel_id in store['channel_data'])
+    shards.extend(dm_shard(dm_id) for dm_id in store['dm_data'])
+
+    return shards
+
+
+def capture_shard(store: dict, shard: str) -> Optional[dict]:
+    '''
+    Gets the contents of one shard of the data_store
+
+    Arguments:
+        store (dict): the data_store contents
+        shard  (str): name of the shard
+
+    Return Value:
+        contents (dict): the data_store entries in the shard, None if the
+                         shard's channel or dm does not exist
+    '''
+
+    if shard in STORE_SHARDS:
+        return {entry: store[entry] for entry in STORE_SHARDS[shard]}
+
+    kind, conversation_id = shard.split('_')
+    conversations = store['channel_data'] if kind == 'channel' else store['dm_data']
+    conversation = conversations.get(int(conversation_id))
+
+    if conversation is None:
+        return None
+
+    message_data = store['message_data']
+    return {
+        'conversation': conversation,
+        'messages': {message_id: message_data[message_id]
+                     for message_id in conversation.get('message_ids', [])
+                     if message_id in message_data}
+    }
+
+
+def freeze_shard(store: dict, shard: str) -> Optional[list]:
+    '''
+    Pickles one shard of the data_store as it is now, so it can be
+    compressed and written to disk while the store goes on changing
+
+    Arguments:
+        store (dict): the data_store contents
+        shard  (str): name of the shard
+
+    Return Value:
+        frames (list): the uncompressed frames of the shard's snapshot file,
+                       None if the shard's channel or dm does not exist
+    '''
+
+    contents = capture_shard(store, shard)
+
+    if contents is None:
+        return None
+    if shard in STORE_SHARDS:
+        return [pickle.dumps(contents, protocol=5)]
+    return [pickle.dumps({'conversation': contents['conversation']}, protocol=5),
+            pickle.dumps(contents['messages'], protocol=5)]
+
+
+def assemble_store(shards: dict) -> dict:
+    '''
+    Builds the data_store from the contents of its shards. Messages the
+    shards left on disk are loaded by the message_data when first used.
+
+    Arguments:
+        shards (dict): maps the name of each shard to its contents
+
+    Return Value:
+        store (dict): the data_store contents
+    '''
+
+    store = {'channel_data': {}, 'dm_data': {}}
+    messages = {}
+    segments = {}
+
+    for shard, contents in shards.items():
+        if shard in STORE_SHARDS:
+            store.update(contents)
+            continue
+
+        kind, conversation_id = shard.split('_')
+        conversations = store['channel_data'] if kind == 'channel' else store['dm_data']
+        conversation = contents['conversation']
+        conversations[int(conversation_id)] = conversation
+
+        if isinstance(contents['messages'], MessageSegment):
+            segments.update(dict.fromkeys(
+                conversation.get('message_ids', []), contents['messages']))
+        else:
+            messages.update(contents['messages'])
+
+    # ids reserved by message_sendlater_v1 have an empty placeholder message
+    # until the message is sent, the placeholders are not in any shard
+    placeholders = set(store['message_ids']).difference(messages, segments)
+    for message_id in sorted(placeholders):
+        messages[message_id] = placeholder_message()
+
+    store['message_data'] = LazyMessageData(messages, segments)
+
+    return store
+
+
+def read_shards(directory: str, workers: int, lazy: bool) -> Tuple[Optional[dict], dict, int]:
+    '''
+    Reads the shards named by the manifest in a directory, several at a time
+
+    Arguments:
+        directory (str): directory the shards and manifest are written to
+        workers   (int): number of shards to read at once
+        lazy     (bool): True to leave the messages of channels and dms on
+                         disk until they are used
+
+    Return Value:
+        (shards  (dict): maps each shard to its contents, None if there is
+                         no manifest
+         manifest (dict): maps each shard to its file in the directory
+         lsn       (int): sequence number of the last log entry the shards
+                          include)
+    '''
+
+    manifest, lsn = read_snapshot(os.path.join(directory, MANIFEST_NAME))
+    if manifest is None:
+        return None, {}, 0
+
+    def read_shard(shard: str) -> dict:
+        path = os.path.join(directory, manifest[shard])
+        if shard in STORE_SHARDS:
+            return read_snapshot(path)[0]
+        return read_conversation_shard(path, lazy)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        contents = pool.map(read_shard, manifest.keys())
+        shards = dict(zip(manifest.keys(), contents))
+
+    return shards, manifest, lsn
+
+
+def read_conversation_shard(path: str, lazy: bool) -> dict:
+    '''
+    Reads the shard of a channel or dm
+
+    Arguments:
+        path  (str): file holding the shard
+        lazy (bool): True to leave the messages on disk until they are used
+
+    Return Value:
+        { conversation (dict): the channel_data or dm_data of the conversation
+          messages     (dict): the message_data of its messages, or the
+                               MessageSegment they are in when lazy }
+    '''
+
+    with open(path, 'rb') as shard_file:
+        _, codec = read_snapshot_header(shard_file, path)
+        contents = read_frame(shard_file, codec)
+
+        if 'messages' not in contents:
+            if lazy:
+                contents['messages'] = MessageSegment(
+                    path, shard_file.tell(), codec)
+            else:
+                contents['messages'] = read_frame(shard_file, codec)
+
+    return contents
+
+
+def read_log(path: str) -> Tuple[list, int]:
+    '''
+    Reads all complete entries from a mutation log
+
+    Arguments:
+        path (str): file the log is written to
+
+    Return Value:
+        (entries   (list): list of [lsn, function_name, args, kwargs]
+         valid_size (int): bytes in the file that hold complete entries)
+    '''
+
+    entries = []
+    valid_size = 0
+
+    if not os.path.exists(path):
+        return entries, valid_size
+
+    with open(path, 'rb') as log_file:
+        for line in log_file:
+            # a crash can leave the final entry half written
+            if not line.endswith(b'\n'):
+                break
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                break
+            valid_size += len(line)
+
+    return entries, valid_size
+
+
+def write_snapshot(path: str, contents, lsn: int, codec: str = 'none',
+                   level: Optional[int] = None) -> None:
+    '''
+    Writes a snapshot file and makes it durable
+
+    Arguments:
+        path     (str): file the snapshot is written to
+        contents      : the data held in the file
+        lsn      (int): sequence number of the last log entry the contents
+                        include
+        codec    (str): name of the codec in SNAPSHOT_CODECS to compress with
+        level    (int): compression level, None for the codec's default
+
+    Return Value:
+        None
+    '''
+
+    frames = [pickle.dumps(contents, protocol=5)]
+    write_snapshot_file(path, encode_snapshot(frames, codec, level), lsn)
+    sync_directory(os.path.dirname(os.path.abspath(path)))
+
+
+def encode_snapshot(frames: list, codec: str, level: Optional[int]) -> bytes:
+    '''
+    Compresses the frames of a snapshot file, giving everything in the file
+    after its header
+
+    Arguments:
+        frames (list): the pickled frames
+        codec   (str): name of the codec in SNAPSHOT_CODECS to compress with
+        level   (int): compression level, None for the codec's default
+
+    Return Value:
+        encoded (bytes): the codec id followed by the compressed frames
+    '''
+
+    codec_id, compress, _ = SNAPSHOT_CODECS[codec]
+
+    encoded = [CODEC_ID.pack(codec_id)]
+    for frame in frames:
+        compressed = compress(frame, level)
+        encoded.append(FRAME_LENGTH.pack(len(compressed)))
+        encoded.append(compressed)
+
+    return b''.join(encoded)
+
+
+def write_snapshot_file(path: str, encoded: bytes, lsn: int) -> None:
+    '''
+    Writes a snapshot file through a synced temporary file. The rename is only
+    durable once the directory holding the file is synced.
+
+    Arguments:
+        path     (str): file the snapshot is written to
+        encoded (bytes): everything in the file after its header, from
+                         encode_snapshot
+        lsn      (int): sequence number of the last log entry the contents
+                        include
+
+    Return Value:
+        None
+    '''
+
+    temp_path = path + '.tmp'
+
+    with open(temp_path, 'wb') as snapshot_file:
+        snapshot_file.write(SNAPSHOT_HEADER.pack(
+            SNAPSHOT_MAGIC, SNAPSHOT_VERSION, lsn))
+        snapshot_file.write(encoded)
+        snapshot_file.flush()
+        os.fsync(snapshot_file.fileno())
+
+    os.replace(temp_path, path)
+
+
+def sync_directory(path: str) -> None:
+    '''
+    Syncs a directory, making renames of the files in it durable
+
+    Arguments:
+        path (str): the directory
+
+    Return Value:
+        None
+    '''
+
+    directory = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(directory)
+    finally:
+        os.close(directory)
+
+
+def read_snapshot(path: str) -> Tuple[Optional[dict], int]:
+    '''
+    Reads a snapshot written by write_snapshot, or the json snapshot written
+    by older versions
+
+    Arguments:
+        path (str): file the snapshot is written to
+
+    Return Value:
+        (store (dict): the data_store contents, None if there is no snapshot
+         lsn    (int): sequence number of the last log entry the store includes)
+    '''
+
+    try:
+        with open(path, 'rb') as snapshot_file:
+            lsn, codec = read_snapshot_header(snapshot_file, path)
+
+            if lsn is None:
+                snapshot_file.seek(0)
+                return read_json_snapshot(snapshot_file)
+
+            return read_frame(snapshot_file, codec), lsn
+    except FileNotFoundError:
+        return None, 0
+
+
+def read_snapshot_header(snapshot_file, path: str) -> Tuple[Optional[int], Optional[str]]:
+    '''
+    Reads the header at the start of a snapshot file, and the codec its
+    frames are compressed with
+
+    Arguments:
+        snapshot_file (file): the open snapshot file
+        path           (str): file the snapshot is written to
+
+    Exceptions:
+        ValueError - Occurs when the snapshot is in a format this version
+                     cannot read
+
+    Return Value:
+        (lsn  (int): sequence number of the last log entry the snapshot
+                     includes, None if the file has no header
+         codec (str): name of the codec, None if the file holds uncompressed
+                      pickles instead of frames)
+    '''
+
+    header = snapshot_file.read(SNAPSHOT_HEADER.size)
+    if header[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+        return None, None
+
+    _, version, lsn = SNAPSHOT_HEADER.unpack(header)
+    if version not in SUPPORTED_SNAPSHOT_VERSIONS:
+        raise ValueError(f'Unsupported snapshot version {version} in {path}')
+
+    if version < 3:
+        return lsn, None
+
+    codec_id, = CODEC_ID.unpack(snapshot_file.read(CODEC_ID.size))
+    if codec_id not in CODEC_NAMES:
+        raise ValueError(f'Unsupported snapshot codec {codec_id} in {path}')
+
+    return lsn, CODEC_NAMES[codec_id]
+
+
+def read_frame(snapshot_file, codec: Optional[str]):
+    '''
+    Reads the next frame of a snapshot file
+
+    Arguments:
+        snapshot_file (file): the open snapshot file
+        codec          (str): codec the frames are compressed with, None if
+                              the file holds uncompressed pickles
+
+    Return Value:
+        contents: the data held in the frame
+    '''
+
+    if codec is None:
+        return pickle.load(snapshot_file)
+
+    length, = FRAME_LENGTH.unpack(snapshot_file.read(FRAME_LENGTH.size))
+    decompress = SNAPSHOT_CODECS[codec][2]
+    return pickle.loads(decompress(snapshot_file.read(length)))
+
+
+def read_json_snapshot(snapshot_file) -> Tuple[Optional[dict], int]:
+    '''
+    Reads a json snapshot. Snapshots written before the mutation log existed
+    hold the bare data_store and are treated as lsn 0.
+
+    Arguments:
+        snapshot_file (file): the open snapshot file
+
+    Return Value:
+        (store (dict): the data_store contents, None if the file is not json
+         lsn    (int): sequence number of the last log entry the store includes)
+    '''
+
+    try:
+        snapshot = json.load(snapshot_file)
+    except ValueError:
+        return None, 0
+
+    if 'lsn' in snapshot and 'data' in snapshot:
+        store, lsn = snapshot['data'], snapshot['lsn']
+    else:
+        store, lsn = snapshot, 0
+
+    # json turns int keys into strings, turn them back
+    for entry in INT_KEYED_ENTRIES:
+        if entry in store:
+            store[entry] = {int(key): value for key,
+                            value in store[entry].items()}
+
+    return store, lsn
+
+
+def resident_memory() -> int:
+    '''
+    Gets the memory the process has resident, or the most it has had resident
+    where the current figure is not available
+
+    Return Value:
+        resident_memory (int): resident memory in bytes
+    '''
+
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        # ru_maxrss is in kilobytes on linux and bytes on macOS
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
@@ -0,0 +1,878 @@
+'''
+The single-writer command pipeline, used when config.write_mode is
+'pipeline'. Only data_operations and locks should use this module.
+
+Every mutation of the storage engine is handed to one writer thread as a
+command. The writer takes the commands waiting for it in batches of up to
+config.pipeline_batch_size, applies them one after another, syncs the
+engine's log once for the whole batch (group commit) and then publishes a
+Snapshot of the data_store before the calls that submitted the commands
+return. A request sees its own changes in the snapshots read after it.
+
+A Snapshot is never changed once published, so the busiest read requests
+read the latest one without taking any locks (see get_read_view in
+data_operations). It holds copies of the users, channels and dms, and each
+snapshot shares the copies of everything its batch did not change with the
+one before: COMMANDS gives the parts of the data_store each command changes,
+down to the fields of a record, and only those are copied again. The users
+are kept in chunks of CHUNK_SIZE ids, so a change copies its chunk rather
+than every user. The message ids of a channel or dm, and the notifications
+of a user, are added to the end of a list each snapshot reads up to its own
+length, so sending a message copies none of the ids sent before it.
+
+The messages are only copied once they are changed, the rest are read
+through the engine, so messages restored lazily stay on disk and messages
+held in columns stay in their columns until a request reads them. Before a
+command changes a message the writer pins a copy of it as it was, which the
+snapshots published before read instead of the engine. A reset or restore
+of the data_store starts the snapshots again: one published before it reads
+the messages as they are after.
+
+The snapshots are built from the engine's own read operations, so any
+engine works, but they only see the changes made through this process's
+pipeline: another server sharing an sqlite database is not seen.
+
+Classes:
+    Snapshot()
+
+Functions:
+    wrap_engine(engine) -> namespace
+    start()
+    stop()
+    get_snapshot() -> Snapshot
+    get_pipeline_stats() -> dict
+'''
+
+import time
+import queue
+import itertools
+import types
+import threading
+from concurrent.futures import Future
+from typing import Optional
+
+from src import config
+from src.storage_engine import OPERATIONS, get_operation_names
+
+# the users and messages of a snapshot are kept in chunks of this many ids
+CHUNK_BITS = 10
+CHUNK_SIZE = 1 << CHUNK_BITS
+
+# the parts of the data_store a command changes, which are copied into the
+# next snapshot. A user or conversation part names the field changed, or
+# None to copy the whole record again
+USER = 'user'
+NOTIFICATION = 'notification'
+USER_IDS = 'user_ids'
+CONVERSATION = 'conversation'
+MESSAGE_SENT = 'message_sent'
+MESSAGE_REMOVED = 'message_removed'
+CHANNEL_IDS = 'channel_ids'
+DM_IDS = 'dm_ids'
+MESSAGE = 'message'
+ALL = ('all',)
+
+
+def _user(argument, *fields):
+    return lambda call: tuple((USER, call[argument], field) for field in fields or (None,))
+
+
+def _conversation(is_channel, argument, *fields):
+    def get_parts(call):
+        channel = call[is_channel] if isinstance(is_channel, str) else is_channel
+        return tuple((CONVERSATION, channel, call[argument], field)
+                     for field in fields or (None,))
+    return get_parts
+
+
+def _message_ids(kind):
+    return lambda call: ((kind, call['is_channel'], call['channel_id'], call['message_id']),)
+
+
+def _message(call):
+    return ((MESSAGE, call['message_id']),)
+
+
+def _notification(call):
+    return ((NOTIFICATION, call['user_id']),)
+
+
+def _batch(call):
+    conversation = (call['is_channel'], call['conversation_id'])
+    return (tuple((MESSAGE_SENT,) + conversation + (message[1],) for message in call['messages'])
+            + tuple((USER, message[0], 'messages_sent') for message in call['messages'])
+            + tuple((NOTIFICATION, notification[0]) for notification in call['notifications'])
+            + tuple((MESSAGE, message[1]) for message in call['messages']))
+
+
+def _nothing(call):
+    return ()
+
+
+def _join(*get_parts):
+    return lambda call: tuple(part for parts in get_parts for part in parts(call))
+
+
+# every mutation of an engine and the parts of the data_store it changes,
+# given the arguments of the call by name. Operations not named here only
+# read the data_store, or (allocate_id) keep their own lock-free state.
+COMMANDS = {
+    # users
+    'add_user': _join(_user('user_id'), lambda call: ((USER_IDS,),)),
+    'remove_user_details': _join(_user('user_id', 'user_handle', 'email_address'),
+                                 lambda call: ((USER_IDS,),)),
+    'edit_user': lambda call: ((USER, call['user_id'], call['key']),),
+    'edit_user_permissions': _user('user_id', 'global_owner'),
+    'set_user_profileimage_url': _user('user_id', 'image_url'),
+
+    # sessions
+    'add_session_token': _nothing,
+    'remove_session_token': _nothing,
+
+    # conversations
+    'add_channel': _join(_conversation(True, 'channel_id'), _user('user_id', 'in_channels'),
+                         lambda call: ((CHANNEL_IDS,),)),
+    'add_member_to_channel': _join(_conversation(True, 'channel_id', 'members'),
+                                   _user('user_id', 'in_channels')),
+    'remove_member_from_channel': _join(_conversation(True, 'channel_id', 'owner', 'members'),
+                                        _user('user_id', 'in_channels')),
+    'add_owner_to_channel': _conversation(True, 'channel_id', 'owner'),
+    'remove_owner_from_channel': _conversation(True, 'channel_id', 'owner'),
+    'add_dm': _join(_conversation(False, 'dm_id'), _user('auth_user_id', 'in_dms'),
+                    lambda call: ((DM_IDS,),)),
+    'add_user_to_dm': _join(_conversation(False, 'dm_id', 'members'),
+                            _user('user_id', 'in_dms')),
+    'remove_member_from_dm': _join(_conversation(False, 'dm_id', 'owner', 'members'),
+                                   _user('user_id', 'in_dms')),
+    'remove_owner_from_dm': _conversation(False, 'dm_id', 'owner'),
+    'remove_dm': _join(_conversation(False, 'dm_id'), lambda call: ((DM_IDS,),)),
+    'set_active_standup': _conversation(True, 'channel_id', 'standup_data'),
+    'add_standup_message': _conversation(True, 'channel_id', 'standup_data'),
+    'clear_message_pack': _conversation(True, 'channel_id', 'standup_data'),
+
+    # messages
+    'add_message': _join(_message_ids(MESSAGE_SENT), _user('user_id', 'messages_sent'),
+                         _message),
+    'add_messages': _batch,
+    'add_sendlater_id': _message,
+    'set_message_content': _message,
+    'remove_message': _join(_message_ids(MESSAGE_REMOVED), _message),
+    'pin_message': _message,
+
+    # reactions
+    'react_message': _message,
+
+    # notifications
+    'add_notification': _notification,
+
+    # stats
+    'start_workspace_stats': _nothing,
+    'start_user_stats': _nothing,
+    'update_user_stats': _nothing,
+    'update_workspace_stats': _nothing,
+
+    # reset keys
+    'add_passwordreset_key': _nothing,
+
+    # jobs
+    'add_scheduled_job': _nothing,
+    'add_sendlater_job': _message,
+    'start_standup_job': _conversation(True, 'channel_id', 'standup_data'),
+    'remove_scheduled_jobs': _nothing,
+
+    # ids
+    'reserve_ids': _nothing,
+
+    # persistence
+    'reset_data_store_to_default': lambda call: (ALL,),
+    'data_restore': lambda call: (ALL,)
+}
+
+# the arguments of each operation, by name
+_PARAMETERS = {name: parameters
+               for operations in OPERATIONS.values()
+               for name, parameters in operations.items()}
+
+# a message that does not exist, as read or pinned
+_MISSING = None
+
+
+def _whole(part: tuple) -> tuple:
+    '''
+    Gets the part to copy again for a part of a command that failed, which
+    is the whole record the part is in as the command may have changed more
+    of it before failing
+    '''
+
+    kind = part[0]
+    if kind in (USER, NOTIFICATION):
+        return (USER, part[1], None)
+    if kind in (CONVERSATION, MESSAGE_SENT, MESSAGE_REMOVED):
+        return (CONVERSATION, part[1], part[2], None)
+    return part
+
+
+def _copy(value):
+    '''
+    Copies the dicts and lists in a value of a record, so the copy does not
+    change with the data_store
+    '''
+
+    if isinstance(value, dict):
+        return {key: _copy(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_copy(item) for item in value]
+    return value
+
+
+def _freeze(record, **fields):
+    '''
+    Copies a record of the data_store, with the fields given in place of its
+    own
+    '''
+
+    # rows of a columnar message store are views of its columns
+    if hasattr(record, 'to_record'):
+        record = record.to_record()
+
+    return type(record)(*(fields[field] if field in fields else _copy(getattr(record, field))
+                          for field in record.__slots__))
+
+
+def _refreeze(frozen, record, changed, **fields):
+    '''
+    Copies the changed fields of a record of the data_store, sharing the
+    rest with the copy made before, with the fields given in place of both
+    '''
+
+    return type(frozen)(*(fields[field] if field in fields
+                          else _copy(getattr(record, field)) if field in changed
+                          else getattr(frozen, field)
+                          for field in frozen.__slots__))
+
+
+class _Chunks:
+    '''
+    A read-only map from ints, split into chunks of CHUNK_SIZE keys so a
+    changed copy shares every chunk it does not change
+    '''
+
+    __slots__ = ('_chunks',)
+
+    def __init__(self, chunks: Optional[dict] = None):
+        self._chunks = chunks or {}
+
+    def __getitem__(self, key: int):
+        return self._chunks.get(key >> CHUNK_BITS, {})[key]
+
+    def __contains__(self, key: int) -> bool:
+        return key in self._chunks.get(key >> CHUNK_BITS, ())
+
+    def updated(self, changes: dict) -> '_Chunks':
+        '''
+        Gets a copy with the changes made, a key changed to None is removed
+        '''
+
+        chunks = dict(self._chunks)
+        copied = set()
+        for key, value in changes.items():
+            index = key >> CHUNK_BITS
+            if index not in copied:
+                chunks[index] = dict(chunks.get(index, ()))
+                copied.add(index)
+
+            if value is None:
+                chunks[index].pop(key, None)
+            else:
+                chunks[index][key] = value
+
+        return _Chunks(chunks)
+
+
+class _Appended:
+    '''
+    A read-only list of the first length items of a list shared with the
+    copies made before, which only the latest copy adds to
+    '''
+
+    __slots__ = ('_items', '_length')
+
+    def __init__(self, items: list, length: Optional[int] = None):
+        self._items = items
+        self._length = len(items) if length is None else length
+
+    def appended(self, items: list) -> '_Appended':
+        '''
+        Gets a copy with the items added to the end
+        '''
+
+        shared = self._items
+        if len(shared) != self._length:
+            shared = shared[:self._length]
+        shared.extend(items)
+        return _Appended(shared)
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __iter__(self):
+        return itertools.islice(self._items, self._length)
+
+    def __reversed__(self):
+        return (self._items[index] for index in range(self._length - 1, -1, -1))
+
+    def __getitem__(self, index):
+        return self._items[:self._length][index]
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}({list(self)!r})'
+
+
+class _MessageIds:
+    '''
+    The ids of a channel's or dm's messages in a snapshot, oldest first. Ids
+    sent are added to the end of a list shared with the copies made before,
+    and ids removed are skipped, until more are removed than are left.
+    '''
+
+    __slots__ = ('_ids', '_positions', '_length', '_removed', '_count')
+
+    def __init__(self, ids: list, positions: Optional[dict] = None, length: Optional[int] = None,
+                 removed: Optional[_Chunks] = None, count: Optional[int] = None):
+        self._ids = ids
+        self._positions = ({message_id: index for index, message_id in enumerate(ids)}
+                           if positions is None else positions)
+        self._length = len(ids) if length is None else length
+        self._removed = _Chunks() if removed is None else removed
+        self._count = self._length if count is None else count
+
+    def sent(self, message_id: int) -> '_MessageIds':
+        '''
+        Gets a copy with a message id added to the end
+        '''
+
+        if message_id in self._positions:
+            return self
+
+        ids = self._ids
+        positions = self._positions
+        if len(ids) != self._length:
+            ids = ids[:self._length]
+            positions = {message_id: index for index, message_id in enumerate(ids)}
+
+        ids.append(message_id)
+        positions[message_id] = self._length
+        return _MessageIds(ids, positions, self._length + 1, self._removed, self._count + 1)
+
+    def removed(self, message_id: int) -> '_MessageIds':
+        '''
+        Gets a copy without a message id
+        '''
+
+        if message_id not in self:
+            return self
+
+        count = self._count - 1
+        if self._length - count > count:
+            return _MessageIds([other for other in self if other != message_id])
+        return _MessageIds(self._ids, self._positions, self._length,
+                           self._removed.updated({message_id: True}), count)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __contains__(self, message_id) -> bool:
+        position = self._positions.get(message_id)
+        return (position is not None and position < self._length
+                and message_id not in self._removed)
+
+    def __iter__(self):
+        ids = itertools.islice(self._ids, self._length)
+        if self._count == self._length:
+            return ids
+        return (message_id for message_id in ids if message_id not in self._removed)
+
+    def __reversed__(self):
+        ids = (self._ids[index] for index in range(self._length - 1, -1, -1))
+        if self._count == self._length:
+            return ids
+        return (message_id for message_id in ids if message_id not in self._removed)
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}({list(self)!r})'
+
+
+class Snapshot:
+    '''
+    The data_store as it was after a batch of commands, read with the same
+    functions as data_operations. Nothing in it is changed once published.
+    '''
+
+    __slots__ = ('generation', '_user_ids', '_users', '_channel_ids', '_dm_ids',
+                 '_conversations', '_messages', '_pins')
+
+    def __init__(self, generation: int, user_ids: dict, users: _Chunks, channel_ids: dict,
+                 dm_ids: dict, conversations: dict, messages: _Chunks, pins: dict):
+        self.generation = generation
+        self._user_ids = user_ids
+        self._users = users
+        self._channel_ids = channel_ids
+        self._dm_ids = dm_ids
+        self._conversations = conversations
+        # copies of the messages changed since the snapshots were started,
+        # and (generation, copy) of each as it was before its first change
+        self._messages = messages
+        self._pins = pins
+
+    def get_user_ids(self):
+        return self._user_ids.keys()
+
+    def get_user(self, user_id: int):
+        return self._users[user_id]
+
+    def get_user_channels(self, user_id: int) -> list:
+        return self._users[user_id]['in_channels']
+
+    def get_user_dms(self, user_id: int) -> list:
+        return self._users[user_id]['in_dms']
+
+    def get_channel_ids(self):
+        return self._channel_ids.keys()
+
+    def get_channel(self, channel_id: int):
+        return self._conversations[(True, channel_id)]
+
+    def get_dm_ids(self):
+        return self._dm_ids.keys()
+
+    def get_dm(self, dm_id: int):
+        return self._conversations[(False, dm_id)]
+
+    def get_messages_by_channel(self, channel_id: int):
+        return self._conversations[(True, channel_id)]['message_ids']
+
+    get_channel_messages = get_messages_by_channel
+
+    def get_messages_by_dm(self, dm_id: int):
+        return self._conversations[(False, dm_id)]['message_ids']
+
+    get_dm_messages = get_messages_by_dm
+
+    def _get_kept(self, message_id: int):
+        '''
+        Gets the copy of a message this snapshot reads instead of the
+        engine, False if it reads the engine
+        '''
+
+        try:
+            return self._messages[message_id]
+        except KeyError:
+            pass
+
+        # pinned by the writer before changing it after this snapshot
+        pin = self._pins.get(message_id)
+        if pin is not None and self.generation < pin[0]:
+            return pin[1]
+        return False
+
+    def get_message_by_id(self, message_id: int):
+        message = self._get_kept(message_id)
+        if message is False:
+            message = _read_message(message_id)
+
+            # a message changed while it was read is read as it was pinned
+            kept = self._get_kept(message_id)
+            if kept is not False:
+                message = kept
+
+        if message is _MISSING:
+            raise KeyError(message_id)
+        return message
+
+    def get_messages_containing(self, message_ids, query_str: str) -> list:
+        message_ids = list(message_ids)
+        kept = {}
+        unread = []
+        for message_id in message_ids:
+            message = self._get_kept(message_id)
+            if message is False:
+                unread.append(message_id)
+            else:
+                kept[message_id] = message
+
+        # the engine searches the messages it holds where they are kept
+        try:
+            found = set(_engine.get_messages_containing(unread, query_str))
+        except KeyError:
+            found = {message_id for message_id in unread
+                     if query_str in self.get_message_by_id(message_id)['content']}
+
+        for message_id in unread:
+            message = self._get_kept(message_id)
+            if message is not False:
+                kept[message_id] = message
+
+        for message_id, message in kept.items():
+            if message is _MISSING:
+                raise KeyError(message_id)
+        return [message_id for message_id in message_ids
+                if (query_str in kept[message_id]['content'] if message_id in kept
+                    else message_id in found)]
+
+
+def _get_conversation(is_channel: bool, conversation_id: int):
+    if is_channel:
+        return _engine.get_channel(conversation_id)
+    return _engine.get_dm(conversation_id)
+
+
+def _conversation_exists(is_channel: bool, conversation_id: int) -> bool:
+    if is_channel:
+        return conversation_id in _engine.get_channel_ids()
+    return conversation_id in _engine.get_dm_ids()
+
+
+def _get_message_ids(is_channel: bool, conversation_id: int) -> _MessageIds:
+    if is_channel:
+        return _MessageIds(list(_engine.get_messages_by_channel(conversation_id)))
+    return _MessageIds(list(_engine.get_messages_by_dm(conversation_id)))
+
+
+def _read_message(message_id: int):
+    '''
+    Copies a message from the engine, _MISSING if it does not exist
+    '''
+
+    try:
+        return _freeze(_engine.get_message_by_id(message_id))
+    except KeyError:
+        return _MISSING
+
+
+def _freeze_user(user_id: int):
+    user = _engine.get_user(user_id)
+    return _freeze(user, notifications=_Appended(_copy(list(user['notifications']))))
+
+
+def _freeze_conversation(is_channel: bool, conversation_id: int):
+    return _freeze(_get_conversation(is_channel, conversation_id),
+                   message_ids=_get_message_ids(is_channel, conversation_id))
+
+
+def _build_snapshot(generation: int) -> Snapshot:
+    '''
+    Copies the users, channels and dms of the data_store into a snapshot,
+    which reads the messages through the engine
+    '''
+
+    users = {user_id: _freeze_user(user_id) for user_id in _engine.get_complete_user_ids()}
+    conversations = {}
+    for is_channel, ids in ((True, _engine.get_channel_ids()), (False, _engine.get_dm_ids())):
+        for conversation_id in ids:
+            conversations[(is_channel, conversation_id)] = _freeze_conversation(
+                is_channel, conversation_id)
+
+    return Snapshot(generation, dict.fromkeys(_engine.get_user_ids()),
+                    _Chunks().updated(users), dict.fromkeys(_engine.get_channel_ids()),
+                    dict.fromkeys(_engine.get_dm_ids()), conversations, _Chunks(), {})
+
+
+def _pin(snapshot: Snapshot, parts: tuple) -> None:
+    '''
+    Pins a copy of each message a command is about to change, unless it has
+    been changed since the snapshots were started
+    '''
+
+    for part in parts:
+        if part[0] == MESSAGE and part[1] not in snapshot._pins:
+            snapshot._pins[part[1]] = (snapshot.generation + 1, _read_message(part[1]))
+
+
+def _add_field(fields: dict, key, field: Optional[str]) -> None:
+    if field is None or fields.get(key, ()) is None:
+        fields[key] = None
+    else:
+        fields.setdefault(key, set()).add(field)
+
+
+def _next_snapshot(snapshot: Snapshot, changes: list) -> Snapshot:
+    '''
+    Copies the parts of the data_store a batch changed, in the order they
+    were changed, into a snapshot sharing everything else with the last one
+    '''
+
+    generation = snapshot.generation + 1
+    if ALL in changes:
+        return _build_snapshot(generation)
+
+    # the fields changed of each user and conversation, None for all of them
+    user_fields = {}
+    notified = {}
+    conversation_fields = {}
+    sent = {}
+    messages = {}
+    user_ids = snapshot._user_ids
+    channel_ids = snapshot._channel_ids
+    dm_ids = snapshot._dm_ids
+
+    for part in changes:
+        kind = part[0]
+        if kind == USER:
+            _add_field(user_fields, part[1], part[2])
+        elif kind == NOTIFICATION:
+            notified[part[1]] = notified.get(part[1], 0) + 1
+        elif kind == CONVERSATION:
+            _add_field(conversation_fields, part[1:3], part[3])
+        elif kind in (MESSAGE_SENT, MESSAGE_REMOVED):
+            sent.setdefault(part[1:3], []).append((kind, part[3]))
+        elif kind == MESSAGE:
+            messages[part[1]] = _read_message(part[1])
+        elif kind == USER_IDS:
+            user_ids = dict.fromkeys(_engine.get_user_ids())
+        elif kind == CHANNEL_IDS:
+            channel_ids = dict.fromkeys(_engine.get_channel_ids())
+        elif kind == DM_IDS:
+            dm_ids = dict.fromkeys(_engine.get_dm_ids())
+
+    users = {}
+    for user_id in user_fields.keys() | notified.keys():
+        fields = user_fields.get(user_id, set())
+        if fields is None or user_id not in snapshot._users:
+            users[user_id] = _freeze_user(user_id)
+            continue
+
+        user = _engine.get_user(user_id)
+        frozen = snapshot._users[user_id]
+        notifications = frozen.notifications
+        if user_id in notified:
+            notifications = notifications.appended(
+                _copy(list(user['notifications'][-notified[user_id]:])))
+        users[user_id] = _refreeze(frozen, user, fields, notifications=notifications)
+
+    conversations = snapshot._conversations
+    if conversation_fields or sent:
+        conversations = dict(conversations)
+    for key in conversation_fields.keys() | sent.keys():
+        fields = conversation_fields.get(key, set())
+        if key in conversation_fields or key not in conversations:
+            if not _conversation_exists(*key):
+                conversations.pop(key, None)
+                continue
+            if fields is None or key not in conversations:
+                conversations[key] = _freeze_conversation(*key)
+                continue
+
+        frozen = conversations[key]
+        message_ids = frozen.message_ids
+        for kind, message_id in sent.get(key, ()):
+            if kind == MESSAGE_SENT:
+                message_ids = message_ids.sent(message_id)
+            else:
+                message_ids = message_ids.removed(message_id)
+        record = _get_conversation(*key) if fields else None
+        conversations[key] = _refreeze(frozen, record, fields, message_ids=message_ids)
+
+    return Snapshot(generation, user_ids, snapshot._users.updated(users), channel_ids, dm_ids,
+                    conversations, snapshot._messages.updated(messages), snapshot._pins)
+
+
+# the engine the pipeline applies commands to
+_engine = None
+
+# commands waiting for the writer, each (name, args, kwargs, future), and
+# None to stop it
+_queue = queue.SimpleQueue()
+_writer = None
+_snapshot = None
+
+# counts kept by the writer, for get_pipeline_stats
+_commands_applied = 0
+_batches_applied = 0
+_largest_batch = 0
+_publish_duration = 0.0
+
+
+def _apply_batch(batch: list) -> None:
+    '''
+    Applies a batch of commands, syncs the engine and publishes a snapshot,
+    then gives each command's caller its result
+    '''
+
+    global _snapshot, _commands_applied, _batches_applied, _largest_batch, _publish_duration
+
+    outcomes = []
+    changes = []
+    for name, args, kwargs, future in batch:
+        parts = ()
+        try:
+            call = dict(zip(_PARAMETERS[name], args), **kwargs)
+            parts = COMMANDS[name](call)
+            _pin(_snapshot, parts)
+            outcomes.append((future, getattr(_engine, name)(*args, **kwargs), None))
+        except Exception as error:
+            parts = tuple(_whole(part) for part in parts)
+            outcomes.append((future, None, error))
+        changes.extend(parts)
+
+    try:
+        if config.pipeline_group_commit:
+            _engine.data_sync()
+
+        start = time.perf_counter()
+        _snapshot = _next_snapshot(_snapshot, changes)
+        _publish_duration = time.perf_counter() - start
+    except Exception as error:
+        # the changes were made but may not be readable or durable, every
+        # caller in the batch is told
+        outcomes = [(future, None, error) for future, _, _ in outcomes]
+
+    _commands_applied += len(batch)
+    _batches_applied += 1
+    _largest_batch = max(_largest_batch, len(batch))
+
+    for future, result, error in outcomes:
+        if error is None:
+            future.set_result(result)
+        else:
+            future.set_exception(error)
+
+
+def _write() -> None:
+    '''
+    The writer thread, applies the commands submitted in batches until
+    stopped
+    '''
+
+    while True:
+        batch = [_queue.get()]
+        while len(batch) < config.pipeline_batch_size:
+            try:
+                batch.append(_queue.get_nowait())
+            except queue.Empty:
+                break
+
+        stopping = None in batch
+        batch = [command for command in batch if command is not None]
+        if batch:
+            _apply_batch(batch)
+        if stopping:
+            return
+
+
+def _command(name: str):
+    '''
+    Gets a function submitting calls of an engine operation to the writer
+    and waiting for their result
+    '''
+
+    function = getattr(_engine, name)
+
+    def submit(*args, **kwargs):
+        # changes made before the pipeline starts, or by the writer itself,
+        # are made straight away
+        writer = _writer
+        if writer is None or writer is threading.current_thread():
+            return function(*args, **kwargs)
+
+        future = Future()
+        _queue.put((name, args, kwargs, future))
+        return future.result()
+
+    submit.__name__ = name
+    submit.__doc__ = function.__doc__
+    return submit
+
+
+def wrap_engine(engine):
+    '''
+    Gets the operations of an engine with every command in COMMANDS
+    submitted to the writer once the pipeline is started
+
+    Arguments:
+        engine (module): the engine
+
+    Return Value:
+        operations (namespace): every operation of the engine, by name
+    '''
+
+    global _engine
+    _engine = engine
+
+    return types.SimpleNamespace(**{
+        name: _command(name) if name in COMMANDS else getattr(engine, name)
+        for name in get_operation_names()
+    })
+
+
+def start() -> None:
+    '''
+    Publishes the first snapshot and starts the writer thread, unless it is
+    running already. Changes are made straight away until it is started.
+
+    Return Value:
+        None
+    '''
+
+    global _writer, _snapshot
+
+    if _writer is not None:
+        return
+
+    _snapshot = _build_snapshot(0)
+    _writer = threading.Thread(target=_write, name='pipeline-writer', daemon=True)
+    _writer.start()
+
+
+def stop() -> None:
+    '''
+    Applies the commands already submitted and stops the writer thread.
+    Changes are made straight away again once it has stopped.
+
+    Return Value:
+        None
+    '''
+
+    global _writer, _snapshot
+
+    if _writer is None:
+        return
+
+    _queue.put(None)
+    _writer.join()
+    _writer = None
+    _snapshot = None
+
+
+def get_snapshot() -> Optional[Snapshot]:
+    '''
+    Gets the latest snapshot
+
+    Return Value:
+        snapshot (Snapshot): the latest snapshot, None while the pipeline is
+                             not started
+    '''
+
+    return _snapshot
+
+
+def get_pipeline_stats() -> dict:
+    '''
+    Gets how much work the writer has done and has waiting
+
+    Return Value:
+        { queue_depth          (int): commands waiting for the writer
+          commands_applied     (int): commands applied since started
+          batches_applied      (int): batches applied since started
+          largest_batch        (int): most commands applied in one batch
+          publish_duration   (float): seconds the last snapshot took to build
+          generation           (int): batches included in the latest snapshot }
+    '''
+
+    return {
+        'queue_depth': _queue.qsize(),
+        'commands_applied': _commands_applied,
+        'batches_applied': _batches_applied,
+        'largest_batch': _largest_batch,
+        'publish_duration': _publish_duration,
+        'generation': None if _snapshot is None else _snapshot.generation
+    }
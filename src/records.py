@@ -0,0 +1,217 @@
+'''
+Record types for the users, channels, dms and messages held in the
+data_store. Only data_operations and persistence should create them.
+
+Each record keeps its fields in __slots__ instead of a dict, which saves the
+hash table every dict carries, so a workspace with millions of messages
+needs a fraction of the memory. Records are read and written with the same
+keys the dicts used, e.g. message['content'], and to_dict gives the dict
+shape when one is needed.
+
+A message keeps the users who reacted to it in one list, created on the
+first react, instead of a list holding a dict holding a list for every
+message. Its 'reacts' key gives the shape the API returns.
+
+Records are pickled as a tuple of their fields, so snapshots do not repeat
+the field names for every record.
+
+Classes:
+    Record()
+    User(first_name, last_name, email_address, password, user_handle,
+         global_owner, image_url, notifications, messages_sent, in_channels,
+         in_dms)
+    Channel(name, owner, is_public, members, standup_data, message_ids,
+            time_created)
+    Dm(name, owner, members, message_ids, time_created)
+    Message(author, content, time_created, message_id, channel_created,
+            is_channel, react_u_ids, is_this_user_reacted, is_pinned)
+
+Functions:
+    placeholder_message() -> Message
+    record_to_dict(value) -> dict
+'''
+
+
+class Record:
+    '''
+    Base of the record types. Subclasses list their fields in __slots__, in
+    the order the constructor takes them.
+    '''
+
+    __slots__ = ()
+
+    def __init__(self, *values):
+        for field, value in zip(self.__slots__, values):
+            setattr(self, field, value)
+
+    @classmethod
+    def from_dict(cls, values: dict) -> 'Record':
+        '''
+        Makes a record from the dict older versions of the data_store held
+
+        Arguments:
+            values (dict): maps each field to its value
+
+        Return Value:
+            record (Record): the record
+        '''
+
+        return cls(*(values[field] for field in cls.__slots__))
+
+    @classmethod
+    def upgrade(cls, value) -> 'Record':
+        '''
+        Gets a value as a record, converting it if it is a dict
+        '''
+
+        if isinstance(value, dict):
+            return cls.from_dict(value)
+        return value
+
+    def keys(self) -> tuple:
+        return self.__slots__
+
+    def to_dict(self) -> dict:
+        return {key: self[key] for key in self.keys()}
+
+    def __getitem__(self, key: str):
+        if key not in self.keys():
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key: str, value) -> None:
+        if key not in self.__slots__:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.keys()
+
+    def get(self, key: str, default=None):
+        return getattr(self, key) if key in self.keys() else default
+
+    def __eq__(self, other) -> bool:
+        if type(other) is not type(self):
+            return NotImplemented
+        return all(getattr(self, field) == getattr(other, field)
+                   for field in self.__slots__)
+
+    def __ne__(self, other) -> bool:
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    __hash__ = None
+
+    def __reduce__(self):
+        return type(self), tuple(getattr(self, field) for field in self.__slots__)
+
+    def __repr__(self) -> str:
+        fields = ', '.join(f'{field}={getattr(self, field)!r}'
+                           for field in self.__slots__)
+        return f'{type(self).__name__}({fields})'
+
+
+class User(Record):
+    '''
+    A user in user_data
+    '''
+
+    __slots__ = ('first_name', 'last_name', 'email_address', 'password',
+                 'user_handle', 'global_owner', 'image_url', 'notifications',
+                 'messages_sent', 'in_channels', 'in_dms')
+
+
+class Channel(Record):
+    '''
+    A channel in channel_data. owner and members are dicts from each user_id
+    to None, in the order users joined.
+    '''
+
+    __slots__ = ('name', 'owner', 'is_public', 'members', 'standup_data',
+                 'message_ids', 'time_created')
+
+
+class Dm(Record):
+    '''
+    A dm in dm_data, with owner and members kept the same way as a channel's
+    '''
+
+    __slots__ = ('name', 'owner', 'members', 'message_ids', 'time_created')
+
+
+class Message(Record):
+    '''
+    A message in message_data. react_u_ids is None until someone reacts.
+    '''
+
+    __slots__ = ('author', 'content', 'time_created', 'message_id',
+                 'channel_created', 'is_channel', 'react_u_ids',
+                 'is_this_user_reacted', 'is_pinned')
+
+    # the keys a message is read with, reacts in place of the fields it is
+    # made from
+    KEYS = ('author', 'content', 'time_created', 'message_id',
+            'channel_created', 'is_channel', 'reacts', 'is_pinned')
+
+    @classmethod
+    def from_dict(cls, values: dict) -> 'Message':
+        react_u_ids = None
+        is_this_user_reacted = False
+        if values['reacts']:
+            react_u_ids = list(values['reacts'][0]['u_ids']) or None
+            is_this_user_reacted = values['reacts'][0]['is_this_user_reacted']
+
+        return cls(values['author'], values['content'], values['time_created'],
+                   values['message_id'], values['channel_created'],
+                   values['is_channel'], react_u_ids, is_this_user_reacted,
+                   values['is_pinned'])
+
+    def keys(self) -> tuple:
+        return self.KEYS
+
+    @property
+    def reacts(self) -> list:
+        '''
+        The reacts of the message as the API returns them, empty for a
+        message reserved by message_sendlater_v1 and not sent yet
+        '''
+
+        if self.is_channel == '':
+            return []
+        return [{
+            'react_id': 1,
+            'u_ids': list(self.react_u_ids or ()),
+            'is_this_user_reacted': self.is_this_user_reacted
+        }]
+
+
+def placeholder_message() -> Message:
+    '''
+    Makes the empty message kept for an id reserved by message_sendlater_v1
+    until the message is sent
+
+    Return Value:
+        message (Message): the placeholder
+    '''
+
+    return Message('', '', '', '', '', '', None, False, False)
+
+
+def record_to_dict(value) -> dict:
+    '''
+    Gets the dict shape of a record, or of anything else in the data_store
+    with a to_dict method, for json.dumps(default=record_to_dict)
+
+    Arguments:
+        value: the value json could not serialise
+
+    Exceptions:
+        TypeError: Occurs when the value has no dict shape
+
+    Return Value:
+        values (dict): maps each key of the value to its value
+    '''
+
+    if not hasattr(value, 'to_dict'):
+        raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+    return value.to_dict()
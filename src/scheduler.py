@@ -0,0 +1,303 @@
+'''
+Runs jobs at a time in the future: messages sent later and the end of
+standups. One scheduler thread keeps every job waiting in a min-heap by the
+time it is due, sleeps until the first one is due and runs it, so thousands
+of jobs waiting take one thread and a heap entry each rather than a sleeping
+thread each.
+
+Jobs run one at a time on the scheduler thread, taking the same locks as
+requests. A job raising an exception has it printed, as a thread would, and
+the jobs after it still run.
+
+Jobs due within config.scheduler_tick seconds of each other run in the same
+tick, up to that much early. Jobs scheduled with schedule_batched are run
+together with the other jobs of the same function and key in their tick: the
+function is called once with all of their items, so a burst of messages due
+at the same time is sent as one batch.
+
+A cancelled job is dropped from the jobs waiting straight away and its heap
+entry when it reaches the top of the heap, or when cancelled entries make up
+most of the heap, so cancelling is O(1) and the heap does not keep growing.
+
+Jobs kept in the data_store (see schedule_message_job in
+src/data_operations.py) name the function they run by a kind registered with
+job_kind, so they can be scheduled again after a restart.
+
+Functions:
+    schedule(delay: float, function, *args) -> int
+    schedule_batched(delay: float, function, key, item) -> int
+    job_kind(kind: str, batched: bool) -> decorator
+    get_job_kind(kind: str) -> tuple
+    cancel(job_id: int) -> bool
+    cancel_all() -> int
+    get_scheduler_stats() -> dict
+'''
+
+import time
+import heapq
+import itertools
+import threading
+import traceback
+
+from src import config
+
+# (time due, job_id) of every job waiting, and of cancelled jobs not
+# dropped yet
+_heap = []
+
+# maps the id of each job waiting to (time due, function, args, batched),
+# where the args of a batched job are (key, item)
+_jobs = {}
+
+# maps each kind of job kept in the data_store to (function it runs, batched)
+_kinds = {}
+
+_job_ids = itertools.count(1)
+_condition = threading.Condition()
+_thread = None
+
+# counts kept by the scheduler thread, for get_scheduler_stats
+_jobs_run = 0
+_batches_run = 0
+_jobs_cancelled = 0
+_last_lag = 0.0
+_max_lag = 0.0
+
+
+def _run() -> None:
+    '''
+    The scheduler thread, runs each job once it is due
+    '''
+
+    global _jobs_run, _batches_run, _last_lag, _max_lag
+
+    while True:
+        with _condition:
+            while True:
+                # drop the entries of cancelled jobs
+                while _heap and _heap[0][1] not in _jobs:
+                    heapq.heappop(_heap)
+
+                if not _heap:
+                    _condition.wait()
+                    continue
+
+                now = time.monotonic()
+                due = _heap[0][0]
+                if due <= now:
+                    break
+                _condition.wait(due - now)
+
+            # take every job due in the same tick as the first
+            due_jobs = []
+            while _heap and _heap[0][0] <= due + config.scheduler_tick:
+                _, job_id = heapq.heappop(_heap)
+                if job_id in _jobs:
+                    due_jobs.append(_jobs.pop(job_id))
+
+            calls = _group_batches(due_jobs)
+
+            _last_lag = now - due
+            _max_lag = max(_max_lag, _last_lag)
+            _jobs_run += len(due_jobs)
+            _batches_run += len(calls)
+
+        for function, args in calls:
+            try:
+                function(*args)
+            except Exception:
+                traceback.print_exc()
+
+
+def _group_batches(due_jobs: list) -> list:
+    '''
+    Gets the calls running the jobs due in a tick, in the order they were
+    due. The batched jobs of each function and key make one call, where the
+    first of them was due.
+    '''
+
+    calls = []
+    batches = {}
+    for _, function, args, batched in due_jobs:
+        if not batched:
+            calls.append((function, args))
+            continue
+
+        key, item = args
+        if (function, key) not in batches:
+            batches[(function, key)] = []
+            calls.append((function, (key, batches[(function, key)])))
+        batches[(function, key)].append(item)
+
+    return calls
+
+
+def schedule(delay: float, function, *args) -> int:
+    '''
+    Schedules a job, starting the scheduler thread if it is not running
+
+    Arguments:
+        delay (float): seconds from now the job is due, jobs already
+                       overdue run in the order they were due
+        function     : function the job calls
+        args         : arguments it is called with
+
+    Return Value:
+        job_id (int): id of the job, to cancel it with
+    '''
+
+    return _add_job(delay, function, args, False)
+
+
+def schedule_batched(delay: float, function, key, item) -> int:
+    '''
+    Schedules a job run in one call with the other batched jobs of the same
+    function and key due in the same tick, as function(key, items) where
+    items are the items of the jobs in the order they were due
+
+    Arguments:
+        delay (float): seconds from now the job is due
+        function     : function the batch calls
+        key          : jobs are only batched with jobs of an equal key
+        item         : what the job adds to the batch
+
+    Return Value:
+        job_id (int): id of the job, to cancel it with
+    '''
+
+    return _add_job(delay, function, (key, item), True)
+
+
+def _add_job(delay: float, function, args: tuple, batched: bool) -> int:
+    '''
+    Adds a job to the heap, starting the scheduler thread if it is not running
+    '''
+
+    global _thread
+
+    due = time.monotonic() + delay
+    job_id = next(_job_ids)
+
+    with _condition:
+        if _thread is None:
+            _thread = threading.Thread(target=_run, name='scheduler', daemon=True)
+            _thread.start()
+
+        _jobs[job_id] = (due, function, args, batched)
+        heapq.heappush(_heap, (due, job_id))
+
+        # wake the scheduler if the job is due before the one it waits for
+        if _heap[0][1] == job_id:
+            _condition.notify()
+
+    return job_id
+
+
+def job_kind(kind: str, batched: bool = False):
+    '''
+    Registers the function jobs of a kind run
+
+    Arguments:
+        kind     (str): name the jobs are kept in the data_store under
+        batched (bool): True if the jobs of the kind due in the same tick are
+                        run in one call, given the list of their arguments
+
+    Return Value:
+        register (function): decorator registering the function it is given
+    '''
+
+    def register(function):
+        _kinds[kind] = (function, batched)
+        return function
+
+    return register
+
+
+def get_job_kind(kind: str) -> tuple:
+    '''
+    Gets the function jobs of a kind run, and whether they run in batches
+
+    Arguments:
+        kind (str): name the jobs are kept in the data_store under
+
+    Exceptions:
+        KeyError - Occurs when no function is registered for the kind
+
+    Return Value:
+        (function, batched): as registered with job_kind
+    '''
+
+    return _kinds[kind]
+
+
+def cancel(job_id: int) -> bool:
+    '''
+    Cancels a job that has not run yet
+
+    Arguments:
+        job_id (int): id of the job
+
+    Return Value:
+        cancelled (bool): False if the job has already run or been cancelled
+    '''
+
+    global _jobs_cancelled
+
+    with _condition:
+        if _jobs.pop(job_id, None) is None:
+            return False
+        _jobs_cancelled += 1
+
+        # the entry is left in the heap until it reaches the top, unless the
+        # heap is mostly cancelled entries
+        if len(_heap) > 2 * len(_jobs) + 64:
+            _heap[:] = [entry for entry in _heap if entry[1] in _jobs]
+            heapq.heapify(_heap)
+
+    return True
+
+
+def cancel_all() -> int:
+    '''
+    Cancels every job that has not run yet
+
+    Return Value:
+        cancelled (int): number of jobs cancelled
+    '''
+
+    global _jobs_cancelled
+
+    with _condition:
+        cancelled = len(_jobs)
+        _jobs.clear()
+        _heap.clear()
+        _jobs_cancelled += cancelled
+
+    return cancelled
+
+
+def get_scheduler_stats() -> dict:
+    '''
+    Gets how many jobs are waiting and how late jobs run
+
+    Return Value:
+        { queue_depth          (int): jobs waiting to run
+          jobs_run             (int): jobs run so far
+          batches_run          (int): calls the jobs were run in, a batch
+                                      of jobs making one call
+          jobs_cancelled       (int): jobs cancelled before they ran
+          dispatch_lag       (float): seconds the last job started after it
+                                      was due
+          max_dispatch_lag   (float): most seconds a job started after it
+                                      was due }
+    '''
+
+    with _condition:
+        return {
+            'queue_depth': len(_jobs),
+            'jobs_run': _jobs_run,
+            'batches_run': _batches_run,
+            'jobs_cancelled': _jobs_cancelled,
+            'dispatch_lag': _last_lag,
+            'max_dispatch_lag': _max_lag
+        }
@@ -2,13 +2,7 @@ from src.error import InputError
 from src.other import decode_token
 from typing import Dict
 
-from src.data_operations import (
-    get_user_channels,
-    get_user_dms,
-    get_channel_messages,
-    get_message_by_id,
-    get_messages_by_dm
-)
+from src.data_operations import get_read_view
 
 
 def search_v1(token: str, query_str: str) -> Dict[str, list]:
@@ -26,45 +20,35 @@ def search_v1(token: str, query_str: str) -> Dict[str, list]:
         {messages}
     '''
     auth_user_id = decode_token(token)
+    reads = get_read_view()
 
     if not 0 < len(query_str) < 1000:
         raise InputError(description='Invalid query string length')
 
     # get all the messages in dms and channels that the user is in that contain the substring
-    channels_list = get_user_channels(auth_user_id)
-    dm_list = get_user_dms(auth_user_id)
+    channels_list = reads.get_user_channels(auth_user_id)
+    dm_list = reads.get_user_dms(auth_user_id)
 
     message_list = []
 
-    # edit channel messages
+    # find the matching messages in channels, then in dms
+    matching_ids = []
     for channel_id in channels_list:
-        for message_id in get_channel_messages(channel_id):
-            message_content = get_message_by_id(message_id)['content']
-            if query_str in message_content:
-                message = {
-                    'message_id': message_id,
-                    'u_id': get_message_by_id(message_id)['author'],
-                    'message': message_content,
-                    'time_created': get_message_by_id(message_id)['time_created'],
-                    'reacts': get_message_by_id(message_id)['reacts'],
-                    'is_pinned': get_message_by_id(message_id)['is_pinned']
-                }
-                message_list.append(message)
-
-    # edit dm messages
+        matching_ids += reads.get_messages_containing(reads.get_channel_messages(channel_id), query_str)
     for dm_id in dm_list:
-        for message_id in get_messages_by_dm(dm_id):
-            message_content = get_message_by_id(message_id)['content']
-            if query_str in message_content:
-                message = {
-                    'message_id': message_id,
-                    'u_id': get_message_by_id(message_id)['author'],
-                    'message': message_content,
-                    'time_created': get_message_by_id(message_id)['time_created'],
-                    'reacts': get_message_by_id(message_id)['reacts'],
-                    'is_pinned': get_message_by_id(message_id)['is_pinned']
-                }
-                message_list.append(message)
+        matching_ids += reads.get_messages_containing(reads.get_messages_by_dm(dm_id), query_str)
+
+    for message_id in matching_ids:
+        message_info = reads.get_message_by_id(message_id)
+        message = {
+            'message_id': message_id,
+            'u_id': message_info['author'],
+            'message': message_info['content'],
+            'time_created': message_info['time_created'],
+            'reacts': message_info['reacts'],
+            'is_pinned': message_info['is_pinned']
+        }
+        message_list.append(message)
 
     return {
         'messages': message_list
@@ -1,4 +1,5 @@
 import sys
+import time
 import signal
 import threading
 from json import dumps
@@ -20,8 +21,8 @@ from src.other import clear_v1
 from src.channels import channels_create_v1, channels_list_v1, channels_listall_v1
 from src.channel import channel_details_v1, channel_join_v1
 from src.admin import admin_user_remove_v1, admin_userpermission_change_v1
-from src.data_operations import data_dump, data_restore
-from src.data_store import data_store
+from src.data_operations import data_dump, data_restore, get_persistence_stats, export_data_store, start_write_pipeline
+from src.records import record_to_dict
 from src.standup import standup_start_v1, standup_active_v1, standup_send_v1
 from src.search import search_v1
 
@@ -583,12 +584,34 @@ def clear_data_store():
 
 @APP.route("/getdata/v1", methods=['GET'])
 def get_data_store():
-    data_source = data_store.get()
-    return dumps(data_source)
+    data_source = export_data_store()
+    return dumps(data_source, default=record_to_dict)
+
+
+# time the server started, for logging how long it took to serve a request
+server_start = time.monotonic()
+first_request_served = False
+
+
+@APP.before_request
+def log_time_to_first_request():
+    global first_request_served
+    if first_request_served:
+        return
+
+    first_request_served = True
+    stats = get_persistence_stats()
+    print(f'First request after {time.monotonic() - server_start:.3f}s '
+          f'(restore {stats["restore_duration"]:.3f}s, '
+          f'{stats["cold_messages"]} messages left on disk, '
+          f'{stats["resident_memory"] / 2 ** 20:.1f}MiB resident)')
 
 
 def init_store():
     global worker
+    if config.write_mode == 'pipeline':
+        start_write_pipeline()  # started by data_restore, unless it was not called
+
     worker = threading.Thread(target=data_dump)
     worker.daemon = True  # get thread to end with the python program
     worker.start()  # start the thread
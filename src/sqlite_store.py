@@ -0,0 +1,1445 @@
+'''
+The data_store kept in an SQLite database, the 'sqlite' storage engine (see
+src/storage_engine.py). Only data_operations should use this module.
+
+Every table stays on disk at config.sqlite_path and only the rows a request
+reads are loaded, so memory does not grow with the workspace and a restart
+reads nothing back. The database is in WAL mode, so reads go on while a
+mutation is written, and several server processes can share one database.
+Each mutation runs in one transaction, along with the mutations it calls.
+The SQL statements are constant strings, so sqlite3 prepares each one once
+per connection and reuses it.
+
+Users, channels, dms and messages are read as records built from their rows.
+They are copies, changing one does not change the database. The ids, emails,
+handles and tokens the in-memory data_store gives as KeysViews are given as
+QueryKeys, and the messages of a channel or dm as MessageIds, which read the
+database when they are used.
+
+Classes:
+    QueryKeys(key_type: type, select: str, contains: str, count: str,
+              args: tuple)
+    MessageIds(is_channel: bool, conversation_id: int)
+
+Functions:
+    the operations named in storage_engine.OPERATIONS
+'''
+
+import os
+import json
+import time
+import sqlite3
+import functools
+import threading
+import contextlib
+from collections.abc import Set, Sequence
+from typing import Optional, Tuple
+
+from src import config
+from src.records import User, Channel, Dm, Message, placeholder_message
+from src.persistence import resident_memory
+from src.storage_engine import (
+    ID_KINDS,
+    calculate_involvement_rate,
+    calculate_utilization_rate
+)
+
+# positions are INTEGER PRIMARY KEYs, so a new row is given a position after
+# every row there is and ordering by position gives the order rows were added
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS users (
+    user_id INTEGER PRIMARY KEY,
+    first_name TEXT NOT NULL,
+    last_name TEXT NOT NULL,
+    email_address TEXT NOT NULL,
+    password TEXT NOT NULL,
+    user_handle TEXT NOT NULL,
+    global_owner INTEGER NOT NULL,
+    image_url TEXT NOT NULL,
+    messages_sent INTEGER NOT NULL,
+    is_removed INTEGER NOT NULL DEFAULT 0
+);
+CREATE UNIQUE INDEX IF NOT EXISTS users_by_email
+    ON users (email_address) WHERE NOT is_removed;
+CREATE UNIQUE INDEX IF NOT EXISTS users_by_handle
+    ON users (user_handle) WHERE NOT is_removed;
+CREATE INDEX IF NOT EXISTS global_owners ON users (user_id) WHERE global_owner;
+
+CREATE TABLE IF NOT EXISTS channels (
+    channel_id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    is_public INTEGER NOT NULL,
+    time_created INTEGER,
+    standup_active INTEGER NOT NULL DEFAULT 0,
+    standup_time_finish INTEGER
+);
+
+CREATE TABLE IF NOT EXISTS standup_messages (
+    position INTEGER PRIMARY KEY,
+    channel_id INTEGER NOT NULL,
+    content TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS standup_messages_by_channel
+    ON standup_messages (channel_id, position);
+
+-- a removed dm is kept, only its id is dropped from the dm ids
+CREATE TABLE IF NOT EXISTS dms (
+    dm_id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    time_created INTEGER,
+    is_removed INTEGER NOT NULL DEFAULT 0
+);
+
+-- the owners and members of channels and dms, a user who is both has a row
+-- for each
+CREATE TABLE IF NOT EXISTS members (
+    position INTEGER PRIMARY KEY,
+    is_channel INTEGER NOT NULL,
+    conversation_id INTEGER NOT NULL,
+    is_owner INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    UNIQUE (is_channel, conversation_id, is_owner, user_id)
+);
+CREATE INDEX IF NOT EXISTS members_by_user
+    ON members (user_id, is_channel, is_owner, position);
+
+-- is_channel, conversation_id and position are NULL for a message reserved
+-- by message_sendlater_v1 and not sent yet
+CREATE TABLE IF NOT EXISTS messages (
+    message_id INTEGER PRIMARY KEY,
+    author INTEGER,
+    content TEXT NOT NULL DEFAULT '',
+    time_created INTEGER,
+    is_channel INTEGER,
+    conversation_id INTEGER,
+    position INTEGER,
+    is_this_user_reacted INTEGER NOT NULL DEFAULT 0,
+    is_pinned INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS messages_by_conversation
+    ON messages (is_channel, conversation_id, position);
+CREATE INDEX IF NOT EXISTS messages_by_author ON messages (author);
+CREATE INDEX IF NOT EXISTS messages_by_time ON messages (time_created);
+
+CREATE TABLE IF NOT EXISTS reacts (
+    position INTEGER PRIMARY KEY,
+    message_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    UNIQUE (message_id, user_id)
+);
+
+CREATE TABLE IF NOT EXISTS notifications (
+    position INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    channel_id INTEGER NOT NULL,
+    dm_id INTEGER NOT NULL,
+    content TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS notifications_by_user
+    ON notifications (user_id, position);
+
+CREATE TABLE IF NOT EXISTS sessions (
+    token TEXT PRIMARY KEY,
+    user_id INTEGER NOT NULL
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS password_reset_keys (
+    reset_key TEXT PRIMARY KEY,
+    user_id INTEGER NOT NULL
+) WITHOUT ROWID;
+
+-- the histories of user_stats and workspace_stats, user_id is 0 for the
+-- workspace. Each entry is the json of the dict it was added as.
+CREATE TABLE IF NOT EXISTS stats_history (
+    position INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    metric TEXT NOT NULL,
+    entry TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS stats_history_by_user
+    ON stats_history (user_id, metric, position);
+
+-- the involvement_rate of each user and the utilization_rate of the
+-- workspace, for those whose stats have been started
+CREATE TABLE IF NOT EXISTS stats_rates (
+    user_id INTEGER PRIMARY KEY,
+    rate REAL NOT NULL
+);
+
+-- the channels and dms each user is a member of and the messages they wrote,
+-- kept up to date by the mutations changing them so the involvement_rate
+-- does not count them. user_id is 0 for the channels, dms and messages of
+-- the workspace, messages sent later are counted once they are reserved.
+-- involved is the users not removed in at least one channel or dm, counted
+-- for the workspace's utilization_rate.
+CREATE TABLE IF NOT EXISTS counts (
+    user_id INTEGER PRIMARY KEY,
+    channels INTEGER NOT NULL DEFAULT 0,
+    dms INTEGER NOT NULL DEFAULT 0,
+    messages INTEGER NOT NULL DEFAULT 0,
+    involved INTEGER NOT NULL DEFAULT 0
+);
+
+-- the highest id reserved for each kind of record
+CREATE TABLE IF NOT EXISTS id_blocks (
+    kind TEXT PRIMARY KEY,
+    last_id INTEGER NOT NULL
+) WITHOUT ROWID;
+
+-- jobs scheduled to send a message, by the id of the message. arguments is
+-- the json of the list the job's function is called with.
+CREATE TABLE IF NOT EXISTS scheduled_jobs (
+    message_id INTEGER PRIMARY KEY,
+    time_due REAL NOT NULL,
+    kind TEXT NOT NULL,
+    is_channel INTEGER NOT NULL,
+    conversation_id INTEGER NOT NULL,
+    arguments TEXT NOT NULL
+);
+'''
+
+TABLES = ('users', 'channels', 'standup_messages', 'dms', 'members', 'messages',
+          'reacts', 'notifications', 'sessions', 'password_reset_keys',
+          'stats_history', 'stats_rates', 'counts', 'id_blocks', 'scheduled_jobs')
+
+# user_id of the workspace in the stats tables
+WORKSPACE = 0
+
+USER_STATS = ('channels_joined', 'dms_joined', 'messages_sent')
+WORKSPACE_STATS = ('channels_exist', 'dms_exist', 'messages_exist')
+
+# fields of a user edit_user can change, they are also their column names
+USER_FIELDS = ('first_name', 'last_name', 'email_address', 'password',
+               'user_handle', 'image_url')
+
+# connections not in use, for each database path. A thread takes one for
+# each read, or for the whole of a mutation, and puts it back afterwards.
+_idle_connections = {}
+_connections_lock = threading.Lock()
+_created_paths = set()
+_local = threading.local()
+
+# one mutation of this process is written at a time, other processes wait
+# for the database to be free (up to the connection timeout)
+_write_lock = threading.Lock()
+
+# counts the mutations committed by this process
+_generation = 0
+
+_checkpoint_generation = 0
+_checkpoint_duration = 0.0
+_checkpoint_time = None
+_restore_duration = 0.0
+
+# the ids of each kind this process has reserved and not handed out yet, as
+# (next id, last id)
+_id_ranges = {}
+_id_lock = threading.Lock()
+
+
+def _after_fork() -> None:
+    '''
+    Drops what a forked process inherited from its parent: the connections,
+    which two processes must not share, and the ids the parent reserved
+    '''
+
+    global _connections_lock, _write_lock, _id_lock
+
+    _connections_lock = threading.Lock()
+    _write_lock = threading.Lock()
+    _id_lock = threading.Lock()
+    _idle_connections.clear()
+    _local.connection = None
+    _id_ranges.clear()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    '''
+    Opens a connection to the database, creating its tables the first time
+    the process opens it
+    '''
+
+    connection = sqlite3.connect(path, timeout=30, isolation_level=None,
+                                 check_same_thread=False, cached_statements=256)
+    connection.execute('PRAGMA synchronous = NORMAL')
+
+    with _connections_lock:
+        if path not in _created_paths:
+            connection.execute('PRAGMA journal_mode = WAL')
+            connection.executescript(SCHEMA)
+            connection.executemany('INSERT OR IGNORE INTO id_blocks VALUES (?, 0)',
+                                   ((kind,) for kind in ID_KINDS))
+            _count_existing(connection)
+            _created_paths.add(path)
+
+    return connection
+
+
+def _count_existing(connection: sqlite3.Connection) -> None:
+    '''
+    Fills the counts table of a database made by an older version, which
+    counted the rows each time the stats changed
+    '''
+
+    connection.execute('BEGIN IMMEDIATE')
+    columns = [row[1] for row in connection.execute('PRAGMA table_info(counts)')]
+    if 'involved' not in columns:
+        connection.execute('ALTER TABLE counts ADD COLUMN involved INTEGER NOT NULL DEFAULT 0')
+        connection.execute(
+            'UPDATE counts SET involved = (SELECT COUNT(*) FROM users WHERE NOT is_removed '
+            'AND EXISTS (SELECT 1 FROM members WHERE members.user_id = users.user_id '
+            'AND NOT is_owner)) WHERE user_id = ?', (WORKSPACE,))
+    if connection.execute('SELECT 1 FROM counts WHERE user_id = ?', (WORKSPACE,)).fetchone() is None:
+        connection.execute(
+            'INSERT INTO counts (user_id, channels, dms, messages) SELECT user_id, '
+            '(SELECT COUNT(*) FROM members WHERE members.user_id = users.user_id '
+            'AND is_channel AND NOT is_owner), '
+            '(SELECT COUNT(*) FROM members WHERE members.user_id = users.user_id '
+            'AND NOT is_channel AND NOT is_owner), '
+            '(SELECT COUNT(*) FROM messages WHERE author = users.user_id) FROM users')
+        connection.execute(
+            'INSERT INTO counts (user_id, channels, dms, messages, involved) VALUES (?, '
+            '(SELECT COUNT(*) FROM channels), (SELECT COUNT(*) FROM dms WHERE NOT is_removed), '
+            '(SELECT COUNT(*) FROM messages), '
+            '(SELECT COUNT(*) FROM users WHERE NOT is_removed AND EXISTS '
+            '(SELECT 1 FROM members WHERE members.user_id = users.user_id AND NOT is_owner)))',
+            (WORKSPACE,))
+    connection.execute('COMMIT')
+
+
+@contextlib.contextmanager
+def _connection():
+    '''
+    Gives a connection to config.sqlite_path for the calling thread to use,
+    the one its mutation is using if it is in one
+    '''
+
+    connection = getattr(_local, 'connection', None)
+    if connection is not None:
+        yield connection
+        return
+
+    path = config.sqlite_path
+    with _connections_lock:
+        idle = _idle_connections.setdefault(path, [])
+        connection = idle.pop() if idle else None
+    if connection is None:
+        connection = _connect(path)
+
+    _local.connection = connection
+    try:
+        yield connection
+    finally:
+        _local.connection = None
+        with _connections_lock:
+            _idle_connections.setdefault(path, []).append(connection)
+
+
+def _fetch_one(sql: str, args: tuple = ()) -> Optional[tuple]:
+    with _connection() as connection:
+        return connection.execute(sql, args).fetchone()
+
+
+def _fetch_all(sql: str, args: tuple = ()) -> list:
+    with _connection() as connection:
+        return connection.execute(sql, args).fetchall()
+
+
+def _column(sql: str, args: tuple = ()) -> list:
+    '''
+    Gets the first column of the rows a query selects
+    '''
+
+    with _connection() as connection:
+        return [row[0] for row in connection.execute(sql, args)]
+
+
+def _execute(sql: str, args: tuple = ()) -> int:
+    '''
+    Runs a statement changing the database
+
+    Return Value:
+        rowcount (int): rows the statement changed
+    '''
+
+    with _connection() as connection:
+        return connection.execute(sql, args).rowcount
+
+
+def mutation(function):
+    '''
+    Marks a function as one that changes the database. It runs in a
+    transaction of its own, and the mutations it calls run in the same one,
+    so either all of its changes are made or none are.
+
+    Arguments:
+        function (function): function that changes the database
+
+    Return Value:
+        wrapper (function): function that makes the call in a transaction
+    '''
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        global _generation
+
+        with _connection() as connection:
+            if connection.in_transaction:
+                return function(*args, **kwargs)
+
+            with _write_lock:
+                connection.execute('BEGIN IMMEDIATE')
+                try:
+                    result = function(*args, **kwargs)
+                except BaseException:
+                    connection.execute('ROLLBACK')
+                    raise
+                connection.execute('COMMIT')
+                _generation += 1
+
+            return result
+
+    return wrapper
+
+
+class QueryKeys(Set):
+    '''
+    The ids or keys of the rows a query selects, read from the database each
+    time they are used, in place of the KeysView of a dict
+    '''
+
+    def __init__(self, key_type: type, select: str, contains: str, count: str,
+                 args: tuple = ()):
+        self._key_type = key_type
+        self._select = select
+        self._contains = contains
+        self._count = count
+        self._args = args
+
+    def __contains__(self, key) -> bool:
+        # the dicts of the in-memory data_store never hold '1' for 1
+        if not isinstance(key, self._key_type):
+            return False
+        try:
+            return _fetch_one(self._contains, (*self._args, key)) is not None
+        except OverflowError:
+            return False
+
+    def __iter__(self):
+        return iter(_column(self._select, self._args))
+
+    def __len__(self) -> int:
+        return _fetch_one(self._count, self._args)[0]
+
+    def __repr__(self) -> str:
+        return f'QueryKeys({list(self)!r})'
+
+
+class MessageIds(Sequence):
+    '''
+    The ids of the messages sent to a channel or dm, oldest first, read from
+    the database each time they are used
+    '''
+
+    def __init__(self, is_channel: bool, conversation_id: int):
+        self._args = (is_channel, conversation_id)
+
+    def __len__(self) -> int:
+        return _fetch_one('SELECT COUNT(*) FROM messages '
+                          'WHERE is_channel = ? AND conversation_id = ?', self._args)[0]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self)[index]
+
+        if index < 0:
+            index += len(self)
+        row = None
+        if index >= 0:
+            row = _fetch_one('SELECT message_id FROM messages '
+                             'WHERE is_channel = ? AND conversation_id = ? '
+                             'ORDER BY position LIMIT 1 OFFSET ?', (*self._args, index))
+        if row is None:
+            raise IndexError('message index out of range')
+        return row[0]
+
+    def __iter__(self):
+        return iter(_column('SELECT message_id FROM messages '
+                            'WHERE is_channel = ? AND conversation_id = ? '
+                            'ORDER BY position', self._args))
+
+    def __reversed__(self):
+        return iter(_column('SELECT message_id FROM messages '
+                            'WHERE is_channel = ? AND conversation_id = ? '
+                            'ORDER BY position DESC', self._args))
+
+    def __contains__(self, message_id) -> bool:
+        return _fetch_one('SELECT 1 FROM messages WHERE message_id = ? '
+                          'AND is_channel = ? AND conversation_id = ?',
+                          (message_id, *self._args)) is not None
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Sequence) or isinstance(other, str):
+            return NotImplemented
+        return list(self) == list(other)
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f'MessageIds({list(self)!r})'
+
+
+@mutation
+def reset_data_store_to_default() -> None:
+    '''
+    Deletes every row of every table
+    '''
+
+    with _connection() as connection:
+        for table in TABLES:
+            connection.execute(f'DELETE FROM {table}')
+        connection.executemany('INSERT INTO id_blocks VALUES (?, 0)',
+                               ((kind,) for kind in ID_KINDS))
+        connection.execute('INSERT INTO counts (user_id) VALUES (?)', (WORKSPACE,))
+
+    with _id_lock:
+        _id_ranges.clear()
+
+
+@mutation
+def add_user(user_id: int, user_details: tuple, password: str, user_handle: str, is_owner: bool) -> None:
+    name_first, name_last, email = user_details
+
+    _execute('INSERT INTO users (user_id, first_name, last_name, email_address, '
+             'password, user_handle, global_owner, image_url, messages_sent) '
+             "VALUES (?, ?, ?, ?, ?, ?, ?, '', 0)",
+             (user_id, name_first, name_last, email, password, user_handle, is_owner))
+    _execute('INSERT INTO counts (user_id) VALUES (?)', (user_id,))
+
+
+@mutation
+def remove_user_details(user_id: int) -> None:
+    '''
+    Blanks the handle and email of a user and leaves them out of the ids of
+    users
+    '''
+
+    # removed users are not counted in the utilization_rate
+    if _fetch_one('SELECT 1 FROM users JOIN counts USING (user_id) '
+                  'WHERE user_id = ? AND NOT is_removed AND channels + dms > 0', (user_id,)):
+        _count(WORKSPACE, 'involved', -1)
+    _execute("UPDATE users SET user_handle = '', email_address = '', is_removed = 1 "
+             'WHERE user_id = ?', (user_id,))
+
+
+def _user_conversations(user_id: int, is_channel: bool) -> list:
+    return _column('SELECT conversation_id FROM members '
+                   'WHERE user_id = ? AND is_channel = ? AND NOT is_owner '
+                   'ORDER BY position', (user_id, is_channel))
+
+
+def get_user_channels(user_id: int) -> list:
+    return _user_conversations(user_id, True)
+
+
+def get_user_dms(user_id: int) -> list:
+    return _user_conversations(user_id, False)
+
+
+def get_user(user_id: int) -> User:
+    row = _fetch_one('SELECT first_name, last_name, email_address, password, '
+                     'user_handle, global_owner, image_url, messages_sent '
+                     'FROM users WHERE user_id = ?', (user_id,))
+    if row is None:
+        raise KeyError(user_id)
+
+    (first_name, last_name, email_address, password, user_handle, global_owner,
+     image_url, messages_sent) = row
+
+    return User(
+        first_name,                         # first_name
+        last_name,                          # last_name
+        email_address,                      # email_address
+        password,                           # password
+        user_handle,                        # user_handle
+        bool(global_owner),                 # global_owner
+        image_url,                          # image_url
+        get_user_notifications(user_id),    # notifications
+        messages_sent,                      # messages_sent
+        get_user_channels(user_id),         # in_channels
+        get_user_dms(user_id)               # in_dms
+    )
+
+
+@mutation
+def edit_user(user_id: int, key: str, new_value: str) -> None:
+    if key not in USER_FIELDS:
+        raise KeyError(key)
+
+    _execute(f'UPDATE users SET {key} = ? WHERE user_id = ?', (new_value, user_id))
+
+
+@mutation
+def edit_user_permissions(user_id: int, permission_id: int) -> None:
+    if permission_id in (1, 2):
+        _execute('UPDATE users SET global_owner = ? WHERE user_id = ?',
+                 (permission_id == 1, user_id))
+
+
+def get_user_handles() -> QueryKeys:
+    return QueryKeys(str, 'SELECT user_handle FROM users WHERE NOT is_removed ORDER BY user_id',
+                     'SELECT 1 FROM users WHERE user_handle = ? AND NOT is_removed',
+                     'SELECT COUNT(*) FROM users WHERE NOT is_removed')
+
+
+def get_user_emails() -> QueryKeys:
+    return QueryKeys(str, 'SELECT email_address FROM users WHERE NOT is_removed ORDER BY user_id',
+                     'SELECT 1 FROM users WHERE email_address = ? AND NOT is_removed',
+                     'SELECT COUNT(*) FROM users WHERE NOT is_removed')
+
+
+def get_user_id_by_email(email: str) -> Optional[int]:
+    row = _fetch_one('SELECT user_id FROM users WHERE email_address = ? AND NOT is_removed',
+                     (email,))
+    return row[0] if row else None
+
+
+def get_user_id_by_handle(user_handle: str) -> Optional[int]:
+    row = _fetch_one('SELECT user_id FROM users WHERE user_handle = ? AND NOT is_removed',
+                     (user_handle,))
+    return row[0] if row else None
+
+
+def get_user_ids() -> QueryKeys:
+    return QueryKeys(int, 'SELECT user_id FROM users WHERE NOT is_removed ORDER BY user_id',
+                     'SELECT 1 FROM users WHERE user_id = ? AND NOT is_removed',
+                     'SELECT COUNT(*) FROM users WHERE NOT is_removed')
+
+
+def get_complete_user_ids() -> QueryKeys:
+    return QueryKeys(int, 'SELECT user_id FROM users ORDER BY user_id',
+                     'SELECT 1 FROM users WHERE user_id = ?',
+                     'SELECT COUNT(*) FROM users')
+
+
+def _count(user_id: int, column: str, change: int) -> None:
+    '''
+    Changes the channels, dms or messages counted for a user, or for the
+    workspace
+    '''
+
+    _execute(f'UPDATE counts SET {column} = {column} + ? WHERE user_id = ?', (change, user_id))
+
+
+def _get_count(user_id: int, column: str) -> int:
+    return _fetch_one(f'SELECT {column} FROM counts WHERE user_id = ?', (user_id,))[0]
+
+
+def _count_membership(user_id: int, is_channel: bool, change: int) -> None:
+    '''
+    Changes the channels or dms counted for a user, and the users in a
+    channel or dm counted for the workspace when it is the first the user
+    is in or the last they leave
+    '''
+
+    _count(user_id, 'channels' if is_channel else 'dms', change)
+    if _fetch_one('SELECT 1 FROM users JOIN counts USING (user_id) '
+                  'WHERE user_id = ? AND NOT is_removed AND channels + dms = ?',
+                  (user_id, 1 if change > 0 else 0)):
+        _count(WORKSPACE, 'involved', change)
+
+
+def _add_member(is_channel: bool, conversation_id: int, user_id: int, is_owner: bool) -> None:
+    added = _execute('INSERT OR IGNORE INTO members (is_channel, conversation_id, is_owner, user_id) '
+                     'VALUES (?, ?, ?, ?)', (is_channel, conversation_id, is_owner, user_id))
+    if added and not is_owner:
+        _count_membership(user_id, is_channel, 1)
+
+
+def _remove_member(is_channel: bool, conversation_id: int, user_id: int, is_owner: bool) -> None:
+    removed = _execute('DELETE FROM members '
+                       'WHERE is_channel = ? AND conversation_id = ? AND is_owner = ? AND user_id = ?',
+                       (is_channel, conversation_id, is_owner, user_id))
+    if removed and not is_owner:
+        _count_membership(user_id, is_channel, -1)
+
+
+def _count_user_conversations(user_id: int, is_channel: bool) -> int:
+    return _get_count(user_id, 'channels' if is_channel else 'dms')
+
+
+@mutation
+def add_member_to_channel(channel_id: int, user_id: int, time_updated: int) -> None:
+    _add_member(True, channel_id, user_id, False)
+
+    channel_data = {
+        'num_channels_joined': _count_user_conversations(user_id, True),
+        'time_stamp': time_updated
+    }
+
+    update_user_stats(user_id, channel_data, False, False)
+
+
+@mutation
+def remove_member_from_channel(channel_id: int, user_id: int, time_updated: int) -> None:
+    _remove_member(True, channel_id, user_id, True)
+    _remove_member(True, channel_id, user_id, False)
+
+    channel_data = {
+        'num_channels_joined': _count_user_conversations(user_id, True),
+        'time_stamp': time_updated
+    }
+
+    update_user_stats(user_id, channel_data, False, False)
+
+
+@mutation
+def add_channel(channel_id: int, channel_name: str, user_id: int, is_public: bool, time_created: int) -> None:
+    _execute('INSERT INTO channels (channel_id, name, is_public, time_created) '
+             'VALUES (?, ?, ?, ?)', (channel_id, channel_name, is_public, time_created))
+    _count(WORKSPACE, 'channels', 1)
+    _add_member(True, channel_id, user_id, True)
+    _add_member(True, channel_id, user_id, False)
+
+    channel_data = {
+        'num_channels_joined': _count_user_conversations(user_id, True),
+        'time_stamp': time_created
+    }
+
+    update_user_stats(user_id, channel_data, False, False)
+
+    channel_data_2 = {
+        'num_channels_exist': len(get_channel_ids()),
+        'time_stamp': time_created
+    }
+
+    update_workspace_stats(channel_data_2, False, False)
+
+
+def _conversation_users(is_channel: bool, conversation_id: int, is_owner: bool) -> dict:
+    '''
+    Gets the owners or members of a channel or dm as a dict from each user_id
+    to None, in the order they were added
+    '''
+
+    return dict.fromkeys(_column('SELECT user_id FROM members '
+                                 'WHERE is_channel = ? AND conversation_id = ? AND is_owner = ? '
+                                 'ORDER BY position', (is_channel, conversation_id, is_owner)))
+
+
+def get_channel(channel_id: int) -> Channel:
+    row = _fetch_one('SELECT name, is_public, time_created, standup_active, standup_time_finish '
+                     'FROM channels WHERE channel_id = ?', (channel_id,))
+    if row is None:
+        raise KeyError(channel_id)
+
+    name, is_public, time_created, standup_active, standup_time_finish = row
+    message_package = _column('SELECT content FROM standup_messages '
+                              'WHERE channel_id = ? ORDER BY position', (channel_id,))
+
+    return Channel(
+        name,                                               # name
+        _conversation_users(True, channel_id, True),        # owner
+        bool(is_public),                                    # is_public
+        _conversation_users(True, channel_id, False),       # members
+        {                                                   # standup_data
+            'is_active': bool(standup_active),
+            'time_finish': standup_time_finish,
+            'message_package': message_package
+        },
+        MessageIds(True, channel_id),                       # message_ids
+        time_created                                        # time_created
+    )
+
+
+def get_channel_messages(channel_id: int) -> MessageIds:
+    return MessageIds(True, channel_id)
+
+
+def get_dm_messages(dm_id: int) -> MessageIds:
+    return MessageIds(False, dm_id)
+
+
+def get_channel_ids() -> QueryKeys:
+    return QueryKeys(int, 'SELECT channel_id FROM channels ORDER BY channel_id',
+                     'SELECT 1 FROM channels WHERE channel_id = ?',
+                     f'SELECT channels FROM counts WHERE user_id = {WORKSPACE}')
+
+
+@mutation
+def remove_member_from_dm(dm_id: int, user_id: int, time_updated: int) -> None:
+    _remove_member(False, dm_id, user_id, True)
+    _remove_member(False, dm_id, user_id, False)
+
+    # the in-memory data_store records this under the same key
+    dm_data = {
+        'num_channels_joined': _count_user_conversations(user_id, False),
+        'time_stamp': time_updated
+    }
+
+    update_user_stats(user_id, False, dm_data, False)
+
+
+@mutation
+def add_user_to_dm(dm_id: int, user_id: int, time_updated: int) -> None:
+    _add_member(False, dm_id, user_id, False)
+
+    dm_data = {
+        'num_dms_joined': _count_user_conversations(user_id, False),
+        'time_stamp': time_updated
+    }
+
+    update_user_stats(user_id, False, dm_data, False)
+
+
+@mutation
+def add_dm(dm_id: int, dm_name: str, auth_user_id: int, time_created: int) -> None:
+    _execute('INSERT INTO dms (dm_id, name, time_created) VALUES (?, ?, ?)',
+             (dm_id, dm_name, time_created))
+    _count(WORKSPACE, 'dms', 1)
+    _add_member(False, dm_id, auth_user_id, True)
+    _add_member(False, dm_id, auth_user_id, False)
+
+    dm_data = {
+        'num_dms_exist': len(get_dm_ids()),
+        'time_stamp': time_created
+    }
+
+    update_workspace_stats(False, dm_data, False)
+
+    dm_data = {
+        'num_dms_joined': _count_user_conversations(auth_user_id, False),
+        'time_stamp': time_created
+    }
+
+    update_user_stats(auth_user_id, False, dm_data, False)
+
+
+def get_dm(dm_id: int) -> Dm:
+    row = _fetch_one('SELECT name, time_created FROM dms WHERE dm_id = ?', (dm_id,))
+    if row is None:
+        raise KeyError(dm_id)
+
+    name, time_created = row
+
+    return Dm(
+        name,                                       # name
+        _conversation_users(False, dm_id, True),    # owner
+        _conversation_users(False, dm_id, False),   # members
+        MessageIds(False, dm_id),                   # message_ids
+        time_created                                # time_created
+    )
+
+
+def get_dm_ids() -> QueryKeys:
+    return QueryKeys(int, 'SELECT dm_id FROM dms WHERE NOT is_removed ORDER BY dm_id',
+                     'SELECT 1 FROM dms WHERE dm_id = ? AND NOT is_removed',
+                     f'SELECT dms FROM counts WHERE user_id = {WORKSPACE}')
+
+
+@mutation
+def remove_dm(dm_id: int, time_updated: int) -> None:
+    if _execute('UPDATE dms SET is_removed = 1 WHERE dm_id = ? AND NOT is_removed', (dm_id,)):
+        _count(WORKSPACE, 'dms', -1)
+
+    dm_data = {
+        'num_dms_exist': len(get_dm_ids()),
+        'time_stamp': time_updated
+    }
+
+    update_workspace_stats(False, dm_data, False)
+
+
+def get_global_owners() -> QueryKeys:
+    return QueryKeys(int, 'SELECT user_id FROM users WHERE global_owner ORDER BY user_id',
+                     'SELECT 1 FROM users WHERE user_id = ? AND global_owner',
+                     'SELECT COUNT(*) FROM users WHERE global_owner')
+
+
+def _drop_message_count(message_id: int) -> bool:
+    '''
+    Uncounts a message about to be replaced or removed
+
+    Return Value:
+        exists (bool): whether there is a message or placeholder with the id
+    '''
+
+    row = _fetch_one('SELECT author FROM messages WHERE message_id = ?', (message_id,))
+    if row is None:
+        return False
+    if row[0] is not None:
+        _count(row[0], 'messages', -1)
+    return True
+
+
+def _insert_message(is_channel: bool, conversation_id: int, user_id: int, message_id: int,
+                    content: str, time_created: int) -> None:
+    '''
+    Adds a message for add_message and add_messages, counting it for its
+    author, and for the workspace unless it replaces a placeholder
+    '''
+
+    if not _drop_message_count(message_id):
+        _count(WORKSPACE, 'messages', 1)
+    _count(user_id, 'messages', 1)
+
+    _execute('INSERT OR REPLACE INTO messages (message_id, author, content, time_created, '
+             'is_channel, conversation_id, position) '
+             'VALUES (?, ?, ?, ?, ?, ?, (SELECT IFNULL(MAX(position), 0) + 1 FROM messages '
+             'WHERE is_channel = ? AND conversation_id = ?))',
+             (message_id, user_id, content, time_created, is_channel, conversation_id,
+              is_channel, conversation_id))
+    _execute('UPDATE users SET messages_sent = messages_sent + 1 WHERE user_id = ?', (user_id,))
+
+
+@mutation
+def add_message(is_channel: bool, user_id: int, channel_id: int, message_id: int, content: str, time_created: int) -> None:
+    '''
+    Adds a message after the last one in its channel or dm, replacing the
+    placeholder of a message reserved by message_sendlater_v1
+    '''
+
+    _insert_message(is_channel, channel_id, user_id, message_id, content, time_created)
+
+    message_data = {
+        'num_messages_exist': len(get_message_ids()),
+        'time_stamp': time_created
+    }
+
+    update_workspace_stats(False, False, message_data)
+
+    message_data = {
+        'num_messages_sent': _fetch_one('SELECT messages_sent FROM users WHERE user_id = ?',
+                                        (user_id,))[0],
+        'time_stamp': time_created
+    }
+
+    update_user_stats(user_id, False, False, message_data)
+
+
+@mutation
+def add_messages(is_channel: bool, conversation_id: int, messages: list, notifications: list) -> None:
+    if not messages:
+        return
+
+    # the time of each author's last message
+    authors = {}
+    for user_id, message_id, content, time_created in messages:
+        _insert_message(is_channel, conversation_id, user_id, message_id, content, time_created)
+        authors[user_id] = time_created
+
+    for user_id, content in notifications:
+        add_notification(is_channel, conversation_id, user_id, content)
+
+    update_workspace_stats(False, False, {
+        'num_messages_exist': len(get_message_ids()),
+        'time_stamp': messages[-1][3]
+    })
+
+    for user_id, time_stamp in authors.items():
+        update_user_stats(user_id, False, False, {
+            'num_messages_sent': _fetch_one('SELECT messages_sent FROM users WHERE user_id = ?',
+                                            (user_id,))[0],
+            'time_stamp': time_stamp
+        })
+
+
+@mutation
+def add_standup_message(channel_id: int, content: str) -> None:
+    _execute('INSERT INTO standup_messages (channel_id, content) VALUES (?, ?)',
+             (channel_id, content))
+
+
+@mutation
+def clear_message_pack(channel_id: int) -> None:
+    _execute('DELETE FROM standup_messages WHERE channel_id = ?', (channel_id,))
+
+
+@mutation
+def set_message_content(message_id: int, message: str) -> None:
+    _execute('UPDATE messages SET content = ? WHERE message_id = ?', (message, message_id))
+
+
+@mutation
+def remove_message(is_channel: bool, channel_id: int, message_id: int, time_updated: int) -> None:
+    if _drop_message_count(message_id):
+        _count(WORKSPACE, 'messages', -1)
+    _execute('DELETE FROM messages WHERE message_id = ?', (message_id,))
+    _execute('DELETE FROM reacts WHERE message_id = ?', (message_id,))
+
+    message_data = {
+        'num_messages_exist': len(get_message_ids()),
+        'time_stamp': time_updated
+    }
+
+    update_workspace_stats(False, False, message_data)
+
+
+def get_message_ids() -> QueryKeys:
+    return QueryKeys(int, 'SELECT message_id FROM messages ORDER BY message_id',
+                     'SELECT 1 FROM messages WHERE message_id = ?',
+                     f'SELECT messages FROM counts WHERE user_id = {WORKSPACE}')
+
+
+def get_message_content(message_id: int) -> str:
+    row = _fetch_one('SELECT content FROM messages WHERE message_id = ?', (message_id,))
+    if row is None:
+        raise KeyError(message_id)
+    return row[0]
+
+
+def get_message_by_id(message_id: int) -> Message:
+    row = _fetch_one('SELECT author, content, time_created, is_channel, conversation_id, '
+                     'is_this_user_reacted, is_pinned FROM messages WHERE message_id = ?',
+                     (message_id,))
+    if row is None:
+        raise KeyError(message_id)
+
+    author, content, time_created, is_channel, conversation_id, reacted, is_pinned = row
+
+    # messages reserved by message_sendlater_v1 have no fields yet
+    if is_channel is None:
+        return placeholder_message()
+
+    react_u_ids = _column('SELECT user_id FROM reacts WHERE message_id = ? ORDER BY position',
+                          (message_id,))
+
+    return Message(
+        author,                 # author
+        content,                # content
+        time_created,           # time_created
+        message_id,             # message_id
+        conversation_id,        # channel_created
+        bool(is_channel),       # is_channel
+        react_u_ids or None,    # react_u_ids
+        bool(reacted),          # is_this_user_reacted
+        bool(is_pinned)         # is_pinned
+    )
+
+
+def get_message_conversation(message_id: int) -> Optional[Tuple[bool, int]]:
+    row = _fetch_one('SELECT is_channel, conversation_id FROM messages WHERE message_id = ?',
+                     (message_id,))
+
+    # messages reserved by message_sendlater_v1 are not in a channel or dm yet
+    if row is None or row[0] is None:
+        return None
+    return bool(row[0]), row[1]
+
+
+def get_messages_containing(message_ids: list, query_str: str) -> list:
+    '''
+    Gets the messages whose content contains a string, searching them all in
+    one query
+    '''
+
+    message_ids = list(message_ids)
+    found = set(_column('SELECT message_id FROM messages '
+                        'WHERE message_id IN (SELECT value FROM json_each(?)) '
+                        'AND instr(content, ?) > 0', (json.dumps(message_ids), query_str)))
+    return [message_id for message_id in message_ids if message_id in found]
+
+
+def get_messages_by_channel(channel_id: int) -> MessageIds:
+    return MessageIds(True, channel_id)
+
+
+def get_messages_by_dm(dm_id: int) -> MessageIds:
+    return MessageIds(False, dm_id)
+
+
+@mutation
+def add_notification(is_channel: bool, channel_id: int, user_id: int, content: str) -> None:
+    if is_channel:
+        conversation_ids = (channel_id, -1)
+    else:
+        conversation_ids = (-1, channel_id)
+
+    _execute('INSERT INTO notifications (user_id, channel_id, dm_id, content) '
+             'VALUES (?, ?, ?, ?)', (user_id, *conversation_ids, content))
+
+
+def get_user_notifications(user_id: int) -> list:
+    return [{'channel_id': channel_id, 'dm_id': dm_id, 'content': content}
+            for channel_id, dm_id, content in _fetch_all(
+                'SELECT channel_id, dm_id, content FROM notifications '
+                'WHERE user_id = ? ORDER BY position', (user_id,))]
+
+
+@mutation
+def set_active_standup(set_active: bool, channel_id: int, time_finished: int) -> None:
+    if set_active:
+        _execute('UPDATE channels SET standup_active = 1, standup_time_finish = ? '
+                 'WHERE channel_id = ?', (time_finished, channel_id))
+    else:
+        _execute('UPDATE channels SET standup_active = 0 WHERE channel_id = ?', (channel_id,))
+
+
+@mutation
+def set_user_profileimage_url(user_id: int, image_url: str) -> None:
+    _execute('UPDATE users SET image_url = ? WHERE user_id = ?', (image_url, user_id))
+
+
+@mutation
+def add_session_token(token: str, user_id: int) -> None:
+    _execute('INSERT OR REPLACE INTO sessions VALUES (?, ?)', (token, user_id))
+
+
+@mutation
+def remove_session_token(token: str) -> None:
+    if not _execute('DELETE FROM sessions WHERE token = ?', (token,)):
+        raise KeyError(token)
+
+
+def get_all_valid_tokens() -> QueryKeys:
+    return QueryKeys(str, 'SELECT token FROM sessions',
+                     'SELECT 1 FROM sessions WHERE token = ?',
+                     'SELECT COUNT(*) FROM sessions')
+
+
+@mutation
+def add_passwordreset_key(user_id: int, reset_key: str) -> None:
+    _execute('INSERT OR REPLACE INTO password_reset_keys VALUES (?, ?)', (reset_key, user_id))
+
+
+def get_passwordreset_key(reset_key: str) -> Tuple[bool, str]:
+    row = _fetch_one('SELECT user_id FROM password_reset_keys WHERE reset_key = ?', (reset_key,))
+    if row is None:
+        return (False, 0)
+    return (True, row[0])
+
+
+@mutation
+def add_owner_to_channel(user_id: int, channel_id: int) -> None:
+    _add_member(True, channel_id, user_id, True)
+
+
+@mutation
+def remove_owner_from_channel(user_id: int, channel_id: int) -> None:
+    _remove_member(True, channel_id, user_id, True)
+
+
+@mutation
+def remove_owner_from_dm(user_id: int, dm_id: int) -> None:
+    _remove_member(False, dm_id, user_id, True)
+
+
+@mutation
+def react_message(user_id: int, message_id: int, react_id: int) -> None:
+    # 1 is the only react, a user who has reacted unreacts
+    is_reacted = not _execute('DELETE FROM reacts WHERE message_id = ? AND user_id = ?',
+                              (message_id, user_id))
+    if is_reacted:
+        _execute('INSERT INTO reacts (message_id, user_id) VALUES (?, ?)', (message_id, user_id))
+
+    _execute('UPDATE messages SET is_this_user_reacted = ? WHERE message_id = ?',
+             (is_reacted, message_id))
+
+
+def _start_stats(user_id: int, metrics: tuple, time_intialised: int) -> None:
+    '''
+    Starts the histories of a user's stats or the workspace's from 0
+    '''
+
+    _execute('DELETE FROM stats_history WHERE user_id = ?', (user_id,))
+    for metric in metrics:
+        key = 'num_' + metric
+        _add_stats_entry(user_id, metric, {key: 0, 'time_stamp': time_intialised})
+    _execute('INSERT OR REPLACE INTO stats_rates VALUES (?, 0.0)', (user_id,))
+
+
+def _add_stats_entry(user_id: int, metric: str, entry: dict) -> None:
+    _execute('INSERT INTO stats_history (user_id, metric, entry) VALUES (?, ?, ?)',
+             (user_id, metric, json.dumps(entry)))
+
+
+def _get_stats(user_id: int, metrics: tuple, rate_name: str) -> dict:
+    '''
+    Gets the histories and rate of a user's stats or the workspace's, None if
+    they have not been started
+    '''
+
+    row = _fetch_one('SELECT rate FROM stats_rates WHERE user_id = ?', (user_id,))
+    if row is None:
+        return None
+
+    stats = {}
+    for metric in metrics:
+        stats[metric] = [json.loads(entry) for entry in _column(
+            'SELECT entry FROM stats_history WHERE user_id = ? AND metric = ? '
+            'ORDER BY position', (user_id, metric))]
+    stats[rate_name] = row[0]
+    return stats
+
+
+@mutation
+def start_workspace_stats(time_intialised: int) -> None:
+    _start_stats(WORKSPACE, WORKSPACE_STATS, time_intialised)
+
+
+@mutation
+def start_user_stats(user_id: int, time_intialised: int) -> None:
+    _start_stats(user_id, USER_STATS, time_intialised)
+
+
+@mutation
+def update_user_stats(user_id: int, channel_data: dict, dm_data: dict, message_data: dict) -> None:
+    for metric, entry in zip(USER_STATS, (channel_data, dm_data, message_data)):
+        if entry:
+            _add_stats_entry(user_id, metric, entry)
+
+    num_messages_sent = _get_count(user_id, 'messages')
+    involvement = (_count_user_conversations(user_id, True)
+                   + _count_user_conversations(user_id, False) + num_messages_sent)
+    denom = len(get_channel_ids()) + len(get_dm_ids()) + len(get_message_ids())
+    rate = calculate_involvement_rate(involvement, denom)
+
+    _execute('UPDATE stats_rates SET rate = ? WHERE user_id = ?', (rate, user_id))
+
+
+@mutation
+def update_workspace_stats(channel_data: dict, dm_data: dict, message_data: dict) -> None:
+    for metric, entry in zip(WORKSPACE_STATS, (channel_data, dm_data, message_data)):
+        if entry:
+            _add_stats_entry(WORKSPACE, metric, entry)
+
+    rate = calculate_utilization_rate(_get_count(WORKSPACE, 'involved'), len(get_user_ids()))
+
+    _execute('UPDATE stats_rates SET rate = ? WHERE user_id = ?', (rate, WORKSPACE))
+
+
+def get_user_stats(user_id: int) -> dict:
+    stats = _get_stats(user_id, USER_STATS, 'involvement_rate')
+    if stats is None:
+        raise KeyError(user_id)
+    return stats
+
+
+def get_workspace_stats() -> dict:
+    return _get_stats(WORKSPACE, WORKSPACE_STATS, 'utilization_rate') or {}
+
+
+@mutation
+def pin_message(message_id: int) -> None:
+    _execute('UPDATE messages SET is_pinned = NOT is_pinned WHERE message_id = ?', (message_id,))
+
+
+@mutation
+def add_sendlater_id(message_id: int) -> None:
+    if not _drop_message_count(message_id):
+        _count(WORKSPACE, 'messages', 1)
+    _execute('INSERT OR REPLACE INTO messages (message_id) VALUES (?)', (message_id,))
+
+
+@mutation
+def add_scheduled_job(message_id: int, time_due: float, kind: str, is_channel: bool,
+                      conversation_id: int, arguments: list) -> None:
+    _execute('INSERT OR REPLACE INTO scheduled_jobs VALUES (?, ?, ?, ?, ?, ?)',
+             (message_id, time_due, kind, is_channel, conversation_id,
+              json.dumps(list(arguments))))
+
+
+@mutation
+def add_sendlater_job(message_id: int, time_due: float, kind: str, is_channel: bool,
+                      conversation_id: int, arguments: list) -> None:
+    add_sendlater_id(message_id)
+    add_scheduled_job(message_id, time_due, kind, is_channel, conversation_id, arguments)
+
+
+@mutation
+def start_standup_job(channel_id: int, time_finish: int, message_id: int, time_due: float,
+                      kind: str, arguments: list) -> None:
+    set_active_standup(True, channel_id, time_finish)
+    add_scheduled_job(message_id, time_due, kind, True, channel_id, arguments)
+
+
+@mutation
+def remove_scheduled_jobs(message_ids: list) -> None:
+    for message_id in message_ids:
+        _execute('DELETE FROM scheduled_jobs WHERE message_id = ?', (message_id,))
+
+
+def get_scheduled_jobs() -> dict:
+    return {message_id: {'time_due': time_due, 'kind': kind, 'is_channel': bool(is_channel),
+                         'conversation_id': conversation_id, 'arguments': json.loads(arguments)}
+            for message_id, time_due, kind, is_channel, conversation_id, arguments
+            in _fetch_all('SELECT message_id, time_due, kind, is_channel, conversation_id, '
+                          'arguments FROM scheduled_jobs ORDER BY message_id')}
+
+
+def data_dump() -> None:
+    '''
+    Checkpoints the write-ahead log into the database every
+    config.checkpoint_interval seconds, run in its own thread. Every mutation
+    is on disk once it is committed, this only keeps the log from growing.
+    '''
+
+    while True:
+        time.sleep(config.checkpoint_interval)
+        data_checkpoint()
+
+
+def data_sync() -> None:
+    '''
+    Does nothing, every mutation is on disk once it is committed
+    '''
+
+
+def data_checkpoint() -> None:
+    '''
+    Copies the pages in the write-ahead log into the database, without
+    waiting for readers, if anything was committed since the last time
+    '''
+
+    global _checkpoint_generation, _checkpoint_duration, _checkpoint_time
+
+    generation = _generation
+    if generation == _checkpoint_generation:
+        return
+
+    start = time.perf_counter()
+    with _connection() as connection:
+        connection.execute('PRAGMA wal_checkpoint(PASSIVE)')
+
+    _checkpoint_generation = generation
+    _checkpoint_duration = time.perf_counter() - start
+    _checkpoint_time = int(time.time())
+
+
+def get_persistence_stats() -> dict:
+    '''
+    Gets how much this process has written and how long the database took
+    to open
+
+    Return Value:
+        { generation            (int): mutations this process has committed
+          checkpoint_generation (int): mutations committed before the last
+                                       checkpoint of the write-ahead log
+          checkpoint_duration (float): seconds the last checkpoint took
+          checkpoint_time       (int): time the last checkpoint was made
+          log_size              (int): bytes in the write-ahead log
+          restore_duration    (float): seconds the last restore took
+          cold_messages         (int): messages left on disk, which is all
+                                       of them
+          resident_memory       (int): bytes of memory the server has resident }
+    '''
+
+    try:
+        log_size = os.path.getsize(config.sqlite_path + '-wal')
+    except OSError:
+        log_size = 0
+
+    return {
+        'generation': _generation,
+        'checkpoint_generation': _checkpoint_generation,
+        'checkpoint_duration': _checkpoint_duration,
+        'checkpoint_time': _checkpoint_time,
+        'log_size': log_size,
+        'restore_duration': _restore_duration,
+        'cold_messages': len(get_message_ids()),
+        'resident_memory': resident_memory()
+    }
+
+
+def export_data_store() -> dict:
+    '''
+    Reads the whole database into the dicts the in-memory data_store holds
+    '''
+
+    user_ids = get_user_ids()
+    channel_ids = get_channel_ids()
+    message_ids = get_message_ids()
+
+    user_data = {user_id: get_user(user_id) for user_id in get_complete_user_ids()}
+    channel_data = {channel_id: get_channel(channel_id) for channel_id in channel_ids}
+    dm_data = {dm_id: get_dm(dm_id) for dm_id in _column('SELECT dm_id FROM dms ORDER BY dm_id')}
+    for conversation in (*channel_data.values(), *dm_data.values()):
+        conversation['message_ids'] = dict.fromkeys(conversation['message_ids'])
+
+    user_stats = {}
+    for user_id in _column('SELECT user_id FROM stats_rates WHERE user_id != ?', (WORKSPACE,)):
+        user_stats[user_id] = get_user_stats(user_id)
+
+    return {
+        'user_data': user_data,
+        'user_handles': {user_data[user_id]['user_handle']: user_id for user_id in user_ids},
+        'user_emails': {user_data[user_id]['email_address']: user_id for user_id in user_ids},
+        'user_ids': dict.fromkeys(user_ids),
+        'channel_data': channel_data,
+        'channel_ids': dict.fromkeys(channel_ids),
+        'dm_data': dm_data,
+        'dm_ids': dict.fromkeys(get_dm_ids()),
+        'global_owners': dict.fromkeys(get_global_owners()),
+        'message_data': {message_id: get_message_by_id(message_id) for message_id in message_ids},
+        'message_ids': dict.fromkeys(message_ids),
+        'token': dict(_fetch_all('SELECT token, user_id FROM sessions')),
+        'password_reset_key': dict(_fetch_all('SELECT reset_key, user_id FROM password_reset_keys')),
+        'workspace_stats': get_workspace_stats(),
+        'user_stats': user_stats,
+        'id_blocks': dict(_fetch_all('SELECT kind, last_id FROM id_blocks')),
+        'message_counts': dict(_fetch_all('SELECT user_id, messages FROM counts '
+                                          'WHERE user_id != ? AND messages', (WORKSPACE,))),
+        'involved_users': _get_count(WORKSPACE, 'involved'),
+        'scheduled_jobs': get_scheduled_jobs()
+    }
+
+
+@mutation
+def _reserve_block(kind: str) -> int:
+    '''
+    Reserves the next config.id_block_size ids of a kind of record, after
+    the ones reserved by every process sharing the database
+
+    Return Value:
+        last_id (int): highest id reserved
+    '''
+
+    return _fetch_all('UPDATE id_blocks SET last_id = last_id + ? WHERE kind = ? '
+                      'RETURNING last_id', (config.id_block_size, kind))[0][0]
+
+
+def allocate_id(kind: str) -> int:
+    '''
+    Gets a new id for a record, from the block of ids this process reserved
+    '''
+
+    with _id_lock:
+        next_id, last_id = _id_ranges.get(kind, (1, 0))
+        if next_id <= last_id:
+            _id_ranges[kind] = (next_id + 1, last_id)
+            return next_id
+
+    # the block is reserved without holding _id_lock, which mutations take.
+    # Threads reserving at the same time each get a block of their own, and
+    # only the last one's is kept, so some ids go unused but none are reused.
+    last_id = _reserve_block(kind)
+    next_id = last_id - config.id_block_size + 1
+    with _id_lock:
+        _id_ranges[kind] = (next_id + 1, last_id)
+    return next_id
+
+
+@mutation
+def reserve_ids(kind: str, last_id: int) -> None:
+    _execute('UPDATE id_blocks SET last_id = MAX(last_id, ?) WHERE kind = ?', (last_id, kind))
+
+
+def data_restore() -> None:
+    '''
+    Opens the database, creating it if it does not exist. Nothing is read
+    until it is used.
+    '''
+
+    global _restore_duration
+
+    start = time.perf_counter()
+    with _connection() as connection:
+        connection.execute('SELECT 1 FROM id_blocks').fetchall()
+
+    with _id_lock:
+        _id_ranges.clear()
+    _restore_duration = time.perf_counter() - start
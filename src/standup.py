@@ -1,12 +1,14 @@
-import threading
 from typing import Dict
 from typing_extensions import TypedDict
 from src.error import InputError, AccessError
 from src.other import decode_token
+from src.locks import conversation_locked
+from src.scheduler import job_kind
 from datetime import timezone, datetime
 
 from src.data_operations import (
-    get_channel_ids, get_channel, set_active_standup, add_standup_message, get_user, add_message, get_message_ids, clear_message_pack)
+    get_channel_ids, get_channel, set_active_standup, add_standup_message, get_user, add_message, allocate_id, clear_message_pack,
+    get_message_ids, schedule_standup_job)
 
 
 class standup_start(TypedDict):
@@ -14,15 +16,22 @@ class standup_start(TypedDict):
     time_finish: int
 
 
-def send_message_package(channel_id: int, auth_user_id: int, time_finish: int) -> None:
+@job_kind('standup')
+@conversation_locked(True, 'channel_id')
+def send_message_package(channel_id: int, auth_user_id: int, time_finish: int, message_id: int) -> None:
+    # the standup may have ended before the server restarted
+    standup_data = get_channel(channel_id)['standup_data']
+    if not standup_data['is_active'] or standup_data['time_finish'] != time_finish:
+        return
+
     # get message data for the channel
-    message_pack = get_channel(channel_id)['standup_data']['message_package']
+    message_pack = standup_data['message_package']
     message_content = '\n'.join(line for line in message_pack)
-    message_id = len(get_message_ids()) + 1
 
-    # add the message to the channel
-    add_message(True, auth_user_id, channel_id,
-                message_id, message_content, time_finish)
+    # add the message to the channel, unless it was added before a restart
+    if message_id not in get_message_ids():
+        add_message(True, auth_user_id, channel_id,
+                    message_id, message_content, time_finish)
 
     # clear message_pack and set_active_standup to False
     set_active_standup(False, channel_id, time_finish)
@@ -30,6 +39,7 @@ def send_message_package(channel_id: int, auth_user_id: int, time_finish: int) -
     clear_message_pack(channel_id)
 
 
+@conversation_locked(True, 'channel_id')
 def standup_start_v1(token: str, channel_id: int, length: int) -> Dict[str, int]:
     '''
     starts a standup
@@ -78,19 +88,18 @@ def standup_start_v1(token: str, channel_id: int, length: int) -> Dict[str, int]
     time_created = int(dt.replace(tzinfo=timezone.utc).timestamp())
     time_finish = time_created + length
 
-    set_active_standup(True, channel_id, time_finish)
-
-    # set a timer, send the message when the standup ends
-    timer = threading.Timer(length, lambda: send_message_package(
-        channel_id, auth_user_id, time_finish))
-    timer.daemon = True
-    timer.start()
+    # send the message package when the standup ends, even if the server
+    # restarts first
+    message_id = allocate_id('message')
+    schedule_standup_job(channel_id, time_finish, message_id, length, 'standup',
+                         channel_id, auth_user_id, time_finish, message_id)
 
     return {
         'time_finish': time_finish
     }
 
 
+@conversation_locked(True, 'channel_id', write=False)
 def standup_active_v1(token: str, channel_id: int) -> standup_start:
     '''
     starts a standup
@@ -134,6 +143,7 @@ def standup_active_v1(token: str, channel_id: int) -> standup_start:
     }
 
 
+@conversation_locked(True, 'channel_id')
 def standup_send_v1(token: str, channel_id: int, message: str) -> dict:
     '''
     Sends a message to an active standup
@@ -0,0 +1,250 @@
+'''
+The interface between data_operations and the storage engines that keep the
+data_store. Only data_operations and the engines should use this module.
+
+An engine is a module with a function for every operation in OPERATIONS,
+taking the arguments named there. Every engine takes and gives the same
+values for the same calls, so data_operations and everything built on it
+work the same whichever engine config.storage_backend chooses:
+    - users, channels, dms and messages are given as the records in
+      src/records.py, channel and dm owners and members as dicts from each
+      user_id to None in the order they were added
+    - ids, emails, handles and tokens are given as sets or set-like views,
+      supporting in, len() and iteration
+    - the messages of a channel or dm are given as a collection of their
+      ids, oldest first, supporting in, len(), iteration and reversed(), so
+      the newest messages are found without reading the rest; removing one
+      does not search or shift the others
+    - a mutation either makes all of its changes or leaves the data_store as
+      a failed call to it would in the dict engine
+
+ENGINES names the module of each engine. tests/storage_engine_test.py checks
+every engine in it behaves the same, and benchmarks/storage_engine_bench.py
+times each operation on each engine.
+
+Functions:
+    get_operation_names() -> list
+    check_engine(engine)
+    load_engine(name: str) -> module
+    calculate_utilization_rate(users_in_channels_or_dms: int,
+                               total_users: int) -> float
+    calculate_involvement_rate(numerator: int, denominator: int) -> float
+'''
+
+import inspect
+import importlib
+
+# the module of each engine, by the name config.storage_backend gives it
+ENGINES = {
+    'dict': 'src.dict_store',
+    'sqlite': 'src.sqlite_store'
+}
+
+# kinds of record given ids by allocate_id
+ID_KINDS = ('user', 'channel', 'dm', 'message')
+
+# the operations of an engine and the arguments each takes, by the part of
+# the data_store they read and change
+OPERATIONS = {
+    'users': {
+        'add_user': ('user_id', 'user_details', 'password', 'user_handle', 'is_owner'),
+        'remove_user_details': ('user_id',),
+        'get_user': ('user_id',),
+        'edit_user': ('user_id', 'key', 'new_value'),
+        'edit_user_permissions': ('user_id', 'permission_id'),
+        'set_user_profileimage_url': ('user_id', 'image_url'),
+        'get_user_handles': (),
+        'get_user_emails': (),
+        'get_user_id_by_email': ('email',),
+        'get_user_id_by_handle': ('user_handle',),
+        'get_user_ids': (),
+        'get_complete_user_ids': (),
+        'get_global_owners': (),
+        'get_user_channels': ('user_id',),
+        'get_user_dms': ('user_id',)
+    },
+    'sessions': {
+        'add_session_token': ('token', 'user_id'),
+        'remove_session_token': ('token',),
+        'get_all_valid_tokens': ()
+    },
+    'conversations': {
+        'add_channel': ('channel_id', 'channel_name', 'user_id', 'is_public', 'time_created'),
+        'get_channel': ('channel_id',),
+        'get_channel_ids': (),
+        'add_member_to_channel': ('channel_id', 'user_id', 'time_updated'),
+        'remove_member_from_channel': ('channel_id', 'user_id', 'time_updated'),
+        'add_owner_to_channel': ('user_id', 'channel_id'),
+        'remove_owner_from_channel': ('user_id', 'channel_id'),
+        'add_dm': ('dm_id', 'dm_name', 'auth_user_id', 'time_created'),
+        'get_dm': ('dm_id',),
+        'get_dm_ids': (),
+        'add_user_to_dm': ('dm_id', 'user_id', 'time_updated'),
+        'remove_member_from_dm': ('dm_id', 'user_id', 'time_updated'),
+        'remove_owner_from_dm': ('user_id', 'dm_id'),
+        'remove_dm': ('dm_id', 'time_updated'),
+        'set_active_standup': ('set_active', 'channel_id', 'time_finished'),
+        'add_standup_message': ('channel_id', 'content'),
+        'clear_message_pack': ('channel_id',)
+    },
+    'messages': {
+        'add_message': ('is_channel', 'user_id', 'channel_id', 'message_id', 'content',
+                        'time_created'),
+        'add_messages': ('is_channel', 'conversation_id', 'messages', 'notifications'),
+        'add_sendlater_id': ('message_id',),
+        'set_message_content': ('message_id', 'message'),
+        'remove_message': ('is_channel', 'channel_id', 'message_id', 'time_updated'),
+        'pin_message': ('message_id',),
+        'get_message_ids': (),
+        'get_message_content': ('message_id',),
+        'get_message_by_id': ('message_id',),
+        'get_message_conversation': ('message_id',),
+        'get_messages_containing': ('message_ids', 'query_str'),
+        'get_messages_by_channel': ('channel_id',),
+        'get_messages_by_dm': ('dm_id',),
+        'get_channel_messages': ('channel_id',),
+        'get_dm_messages': ('dm_id',)
+    },
+    'reactions': {
+        'react_message': ('user_id', 'message_id', 'react_id')
+    },
+    'notifications': {
+        'add_notification': ('is_channel', 'channel_id', 'user_id', 'content'),
+        'get_user_notifications': ('user_id',)
+    },
+    'stats': {
+        'start_workspace_stats': ('time_intialised',),
+        'start_user_stats': ('user_id', 'time_intialised'),
+        'update_user_stats': ('user_id', 'channel_data', 'dm_data', 'message_data'),
+        'update_workspace_stats': ('channel_data', 'dm_data', 'message_data'),
+        'get_user_stats': ('user_id',),
+        'get_workspace_stats': ()
+    },
+    'reset_keys': {
+        'add_passwordreset_key': ('user_id', 'reset_key'),
+        'get_passwordreset_key': ('reset_key',)
+    },
+    'jobs': {
+        'add_scheduled_job': ('message_id', 'time_due', 'kind', 'is_channel', 'conversation_id',
+                              'arguments'),
+        'add_sendlater_job': ('message_id', 'time_due', 'kind', 'is_channel', 'conversation_id',
+                              'arguments'),
+        'start_standup_job': ('channel_id', 'time_finish', 'message_id', 'time_due', 'kind',
+                              'arguments'),
+        'remove_scheduled_jobs': ('message_ids',),
+        'get_scheduled_jobs': ()
+    },
+    'ids': {
+        'allocate_id': ('kind',),
+        'reserve_ids': ('kind', 'last_id')
+    },
+    'persistence': {
+        'reset_data_store_to_default': (),
+        'data_restore': (),
+        'data_dump': (),
+        'data_sync': (),
+        'data_checkpoint': (),
+        'get_persistence_stats': (),
+        'export_data_store': ()
+    }
+}
+
+
+def get_operation_names() -> list:
+    '''
+    Gets the name of every operation of an engine
+
+    Return Value:
+        names (list): names of the operations, in the order of OPERATIONS
+    '''
+
+    return [name for operations in OPERATIONS.values() for name in operations]
+
+
+def check_engine(engine) -> None:
+    '''
+    Checks an engine has every operation, taking the arguments named in
+    OPERATIONS
+
+    Arguments:
+        engine (module): the engine
+
+    Exceptions:
+        TypeError: Occurs when an operation is missing or takes other
+                   arguments
+
+    Return Value:
+        None
+    '''
+
+    for operations in OPERATIONS.values():
+        for name, arguments in operations.items():
+            function = getattr(engine, name, None)
+            if not callable(function):
+                raise TypeError(f'storage engine {engine.__name__} has no {name}')
+
+            parameters = tuple(inspect.signature(function).parameters)
+            if parameters != arguments:
+                raise TypeError(f'{engine.__name__}.{name} takes {parameters}, '
+                                f'not {arguments}')
+
+
+def load_engine(name: str):
+    '''
+    Imports an engine and checks it has every operation
+
+    Arguments:
+        name (str): name of the engine in ENGINES
+
+    Exceptions:
+        ValueError: Occurs when there is no engine with the name
+        TypeError: Occurs when the engine is missing an operation
+
+    Return Value:
+        engine (module): the engine
+    '''
+
+    if name not in ENGINES:
+        raise ValueError(f'unknown storage engine {name!r}, '
+                         f'expected one of {", ".join(ENGINES)}')
+
+    engine = importlib.import_module(ENGINES[name])
+    check_engine(engine)
+    return engine
+
+
+def calculate_utilization_rate(users_in_channels_or_dms: int, total_users: int) -> float:
+    '''
+    calculates utilization rate
+
+    Arguments:
+        users_in_channels_or_dms    (int): number of users who are in atleast one channel or dm
+        total_users                 (int): total number of users in the database
+    '''
+    if users_in_channels_or_dms == 0 or total_users == 0:
+        rate = 0.0
+    else:
+        rate = float(users_in_channels_or_dms / total_users)
+
+    return rate
+
+
+def calculate_involvement_rate(numerator: int, denominator: int) -> float:
+    '''
+    calculates involvement rate
+
+    Arguments:
+        numerator       (int): sum(num_channels_joined, num_dms_joined, num_msgs_sent)
+        denominator     (int): sum(num_channels, num_dms, num_msgs)
+
+    Return Value:
+        involvement_rate    (float): the rate of the user's involvement in the stream
+    '''
+
+    if numerator == 0 or denominator == 0:
+        rate = 0.0
+    else:
+        rate = float(numerator / denominator)
+    if rate > 1.0:
+        rate = 1.0
+    return rate
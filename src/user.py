@@ -28,9 +28,11 @@ from src.data_operations import (
     get_user_stats
 )
 from src.other import decode_token
+from src.locks import users_locked
 from typing import Dict
 
 
+@users_locked(write=False)
 def user_profile(token: str, user_id: int) -> dict:
     '''
     Update a user's first and last name
@@ -72,6 +74,7 @@ def user_profile(token: str, user_id: int) -> dict:
     }
 
 
+@users_locked()
 def user_profile_setname(token: str, first_name: str, last_name: str) -> dict:
     '''
     Update a user's email address
@@ -106,6 +109,7 @@ def user_profile_setname(token: str, first_name: str, last_name: str) -> dict:
     edit_user(user_id, 'last_name', last_name)
 
 
+@users_locked()
 def user_profile_setemail(token: str, email: str) -> dict:
     '''
     Update a user's email
@@ -139,6 +143,7 @@ def user_profile_setemail(token: str, email: str) -> dict:
     edit_user(user_id, 'email_address', email)
 
 
+@users_locked()
 def user_profile_sethandle(token: str, handle_str: str) -> None:
     '''
     Update a user's handle
@@ -178,6 +183,7 @@ def user_profile_sethandle(token: str, handle_str: str) -> None:
     edit_user(user_id, 'user_handle', handle_str)
 
 
+@users_locked()
 def user_profile_uploadphoto_v1(token: str, img_url: str, x_start: int, y_start: int, x_end: int, y_end: int) -> dict:
     '''
     Uploads a user's profile photo
@@ -20,15 +20,18 @@ from src.data_operations import (
     get_message_ids,
     calculate_utilization_rate,
     get_workspace_stats,
-    update_workspace_stats
+    update_workspace_stats,
+    get_read_view
 )
 from src.other import decode_token
+from src.locks import users_locked
 
 
 class users_all_dict(TypedDict):
     user: List[dict]
 
 
+@users_locked(write=False, snapshot_reads=True)
 def users_all(token: str) -> users_all_dict:
     '''
     Returns a list of all users, including user ids, emails, first name, 
@@ -54,11 +57,12 @@ def users_all(token: str) -> users_all_dict:
         }
     '''
     user_id = decode_token(token)
+    reads = get_read_view()
 
     users = {'users': []}
 
-    for user_id in get_user_ids():
-        user_info = get_user(user_id)
+    for user_id in reads.get_user_ids():
+        user_info = reads.get_user(user_id)
         users['users'].append({
             'u_id': user_id,
             'email': user_info['email_address'],
@@ -0,0 +1,50 @@
+import pytest
+
+from src import config
+from src import dict_store
+from src.data_store import data_store, initial_object
+from src.data_operations import reset_data_store_to_default, data_restore
+from src.persistence import get_shard_names, capture_shard, freeze_shard
+from benchmarks import snapshot_codec_bench, persistence_bench
+
+'''
+Whitebox tests for the data_stores the benchmarks build
+
+BUILD_STORE
+    - Has every entry of the data_store, so every shard can be written
+    - Counts the messages of each user as the data_store does
+'''
+
+
+@pytest.fixture
+def persistence(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'snapshot_dir', str(tmp_path / 'snapshots'))
+    monkeypatch.setattr(config, 'legacy_snapshot_paths', [])
+    monkeypatch.setattr(config, 'mutation_log_path', str(tmp_path / 'data_store.log'))
+    monkeypatch.setattr(config, 'message_store', 'dict')
+    monkeypatch.setattr(dict_store, '_mutation_log', None)
+
+    reset_data_store_to_default()
+    data_restore()
+    yield tmp_path
+    dict_store._mutation_log.close()
+
+
+def check_shards(store: dict) -> None:
+    assert set(store) == set(initial_object)
+    for shard in get_shard_names(store):
+        assert capture_shard(store, shard) is not None
+        assert freeze_shard(store, shard)
+
+
+def test_snapshot_codec_store():
+    store = snapshot_codec_bench.build_store(1000)
+    check_shards(store)
+
+    authors = [message['author'] for message in store['message_data'].values()]
+    assert store['message_counts'] == {author: authors.count(author) for author in set(authors)}
+
+
+def test_persistence_store(persistence):
+    persistence_bench.build_store(10, 2, 2, 100)
+    check_shards(data_store.get())
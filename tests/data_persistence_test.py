@@ -0,0 +1,481 @@
+import os
+import sys
+import json
+import pytest
+import threading
+import subprocess
+
+from src import config
+from src import dict_store
+from src.data_store import data_store
+from src.data_operations import (
+    reset_data_store_to_default,
+    initialise_workspace_stats,
+    initialise_user_stats,
+    add_user,
+    add_channel,
+    add_member_to_channel,
+    add_message,
+    add_session_token,
+    edit_message,
+    remove_message,
+    react_message,
+    pin_message,
+    data_checkpoint,
+    get_persistence_stats,
+    get_message_by_id,
+    get_messages_by_channel,
+    get_user_id_by_email,
+    get_user_id_by_handle,
+    get_messages_containing,
+    allocate_id,
+    data_restore
+)
+
+'''
+Whitebox tests for the persistence of the data_store
+
+DATA_RESTORE
+    - Loads the last snapshot and replays the mutation log on top of it
+    - Restores users, channels, dms and messages as records
+    - Holds the messages in columns when config.message_store is columnar
+    - Leaves the messages of channels and dms on disk until they are used,
+      also when the changes are written through the pipeline
+    - Reports a logged call that fails on replay, and replays the rest
+
+DATA_CHECKPOINT
+    - Writes a snapshot of the data_store and empties the mutation log
+    - Skips the snapshot when nothing changed since the last one
+
+    - Only rewrites the shards changed since the last checkpoint
+    - Lets mutations carry on while the shards are written
+    - Compresses the shards with the codec chosen in config
+
+GET_PERSISTENCE_STATS
+    - Reports the generation of the data_store and of the last snapshot
+
+ALLOCATE_ID
+    - Never hands out an id twice, across threads and restarts
+'''
+
+
+@pytest.fixture
+def persistence(tmp_path, monkeypatch):
+    # keep the files out of the working directory
+    monkeypatch.setattr(config, 'snapshot_dir', str(tmp_path / 'snapshots'))
+    monkeypatch.setattr(config, 'legacy_snapshot_paths', [
+        str(tmp_path / 'data_store.snapshot'),
+        str(tmp_path / 'data_store.json')
+    ])
+    monkeypatch.setattr(config, 'mutation_log_path',
+                        str(tmp_path / 'data_store.log'))
+    monkeypatch.setattr(config, 'message_store', 'dict')
+    monkeypatch.setattr(dict_store, '_mutation_log', None)
+
+    reset_data_store_to_default()
+    data_restore()
+    yield tmp_path
+    dict_store._mutation_log.close()
+
+
+def restart() -> None:
+    # throw away everything held in memory and restore from disk
+    dict_store._mutation_log.close()
+    dict_store._mutation_log = None
+    reset_data_store_to_default()
+    data_restore()
+
+
+def create_workspace() -> None:
+    initialise_workspace_stats()
+    add_user(1, ('Eliza', 'Lee', 'eliza@gmail.com'),
+             'password', 'elizalee', True)
+    initialise_user_stats(1)
+    add_user(2, ('Eileen', 'Chong', 'eileen@gmail.com'),
+             'password', 'eileenchong', False)
+    initialise_user_stats(2)
+    add_channel(1, 'channel_1', 1, True, 100)
+    add_member_to_channel(1, 2, 101)
+    add_message(True, 1, 1, 1, 'hello', 102)
+    add_message(True, 2, 1, 2, 'world', 103)
+
+
+def test_restore_replays_log(persistence):
+    create_workspace()
+    edit_message(True, 1, 2, 'edited')
+    expected = data_store.get()
+
+    restart()
+
+    assert data_store.get() == expected
+    assert data_store.get()['message_data'][2]['content'] == 'edited'
+
+
+def test_restore_records(persistence):
+    create_workspace()
+    react_message(2, 1, 1)
+    data_checkpoint()
+    react_message(1, 1, 1)
+
+    restart()
+    assert get_message_by_id(1)['reacts'] == [
+        {'react_id': 1, 'u_ids': [2, 1], 'is_this_user_reacted': True}]
+    assert get_message_by_id(2)['reacts'][0]['u_ids'] == []
+    assert get_message_by_id(2).to_dict() == {
+        'author': 2,
+        'content': 'world',
+        'time_created': 103,
+        'message_id': 2,
+        'channel_created': 1,
+        'is_channel': True,
+        'reacts': [{'react_id': 1, 'u_ids': [], 'is_this_user_reacted': False}],
+        'is_pinned': False
+    }
+
+
+def test_restore_from_checkpoint_and_log_tail(persistence):
+    create_workspace()
+    data_checkpoint()
+    assert (persistence / 'data_store.log').stat().st_size == 0
+
+    remove_message(True, 1, 1, 104)
+    expected = data_store.get()
+
+    restart()
+
+    # int keys survive the snapshot
+    assert data_store.get() == expected
+    assert 1 not in data_store.get()['message_data']
+    assert list(data_store.get()['channel_data'][1]['message_ids']) == [2]
+
+
+def test_nested_mutations_logged_once(persistence):
+    create_workspace()
+    log_size = (persistence / 'data_store.log').stat().st_size
+
+    # updates the stats through update_workspace_stats and update_user_stats
+    add_message(True, 2, 1, 3, 'again', 104)
+
+    with open(persistence / 'data_store.log') as log_file:
+        new_entries = log_file.read()[log_size:].splitlines()
+    assert len(new_entries) == 1
+    assert '"add_message"' in new_entries[0]
+
+    restart()
+    assert list(data_store.get()['message_ids']) == [1, 2, 3]
+    assert len(data_store.get()['user_stats'][2]['messages_sent']) == 3
+
+
+def test_torn_log_entry_ignored(persistence):
+    create_workspace()
+    dict_store._mutation_log.close()
+
+    # a crash in the middle of writing an entry
+    with open(persistence / 'data_store.log', 'a') as log_file:
+        log_file.write('[999, "add_message", [true, 1')
+
+    dict_store._mutation_log = None
+    reset_data_store_to_default()
+    data_restore()
+    assert list(data_store.get()['message_ids']) == [1, 2]
+
+    # new entries are not appended onto the torn one
+    add_message(True, 1, 1, 3, 'again', 105)
+    restart()
+    assert list(data_store.get()['message_ids']) == [1, 2, 3]
+
+
+def test_failed_replay_reported(persistence, capsys):
+    create_workspace()
+
+    # logged before it fails, so it fails again on replay
+    with pytest.raises(KeyError):
+        dict_store.remove_dm(99, 104)
+    add_message(True, 1, 1, 3, 'after', 105)
+
+    restart()
+    assert 'replaying entry' in capsys.readouterr().err
+    assert list(data_store.get()['message_ids']) == [1, 2, 3]
+
+
+def test_checkpoint_skipped_when_unchanged(persistence):
+    create_workspace()
+    data_checkpoint()
+    manifest = persistence / 'snapshots' / 'MANIFEST'
+    modified = manifest.stat().st_mtime_ns
+
+    data_checkpoint()
+    assert manifest.stat().st_mtime_ns == modified
+    assert not list((persistence / 'snapshots').glob('*.tmp'))
+
+    stats = get_persistence_stats()
+    assert stats['checkpoint_generation'] == stats['generation']
+    assert stats['log_size'] == 0
+
+
+def test_persistence_stats_lag(persistence):
+    create_workspace()
+    data_checkpoint()
+    add_message(True, 1, 1, 3, 'unsaved', 104)
+
+    stats = get_persistence_stats()
+    assert stats['generation'] == stats['checkpoint_generation'] + 1
+    assert stats['checkpoint_duration'] >= 0
+    assert stats['log_size'] > 0
+
+
+def test_restore_legacy_json_snapshot(persistence):
+    create_workspace()
+    expected = data_store.get()
+    dict_store._mutation_log.close()
+    dict_store._mutation_log = None
+
+    # the bare data_store dumped as json by older versions, which kept the
+    # ids, owners, members and messages in lists and records in dicts
+    legacy = dict(expected)
+    for entry in dict_store.ID_INDEXES:
+        legacy[entry] = list(expected[entry])
+    del legacy['id_blocks']
+    del legacy['message_counts']
+    del legacy['involved_users']
+    legacy['channel_data'] = {
+        channel_id: dict(channel.to_dict(), owner=list(channel['owner']),
+                         members=list(channel['members']),
+                         message_ids=list(channel['message_ids']))
+        for channel_id, channel in expected['channel_data'].items()
+    }
+    for entry in ('user_data', 'message_data'):
+        legacy[entry] = {key: record.to_dict()
+                         for key, record in expected[entry].items()}
+    with open(persistence / 'data_store.json', 'w') as data_file:
+        json.dump(legacy, data_file)
+    (persistence / 'data_store.log').unlink()
+
+    reset_data_store_to_default()
+    data_restore()
+
+    # ids after the ones in use are handed out
+    expected['id_blocks'] = {'user': 2, 'channel': 1, 'dm': 0, 'message': 2}
+    assert data_store.get() == expected
+    assert get_user_id_by_email('eileen@gmail.com') == 2
+    assert get_user_id_by_handle('elizalee') == 1
+    assert allocate_id('user') == 3
+    assert list(data_store.get()['channel_data'][1]['members']) == [1, 2]
+
+    # the next checkpoint writes every shard in the binary format
+    add_message(True, 1, 1, 3, 'again', 104)
+    data_checkpoint()
+    assert get_persistence_stats()['shards_written'] == 5
+    with open(persistence / 'snapshots' / 'MANIFEST', 'rb') as snapshot_file:
+        assert snapshot_file.read(10) == b'BEAGLESNAP'
+
+    expected = data_store.get()
+    restart()
+    assert data_store.get() == expected
+
+
+def test_checkpoint_rewrites_changed_shards(persistence):
+    create_workspace()
+    add_channel(2, 'channel_2', 2, True, 104)
+    data_checkpoint()
+    shard_files = {path.name for path in (persistence / 'snapshots').iterdir()}
+
+    # only the channel the message is sent to is rewritten
+    add_message(True, 2, 2, 3, 'busy', 105)
+    data_checkpoint()
+    new_shard_files = {path.name for path in (persistence / 'snapshots').iterdir()}
+
+    rewritten = {name.split('.')[0] for name in new_shard_files - shard_files}
+    assert rewritten == {'channel_2', 'workspace', 'users', 'stats'}
+    assert 'channel_1' in {name.split('.')[0] for name in new_shard_files}
+
+    add_session_token('token', 1)
+    assert get_persistence_stats()['dirty_shards'] == 1
+
+    expected = data_store.get()
+    restart()
+    assert data_store.get() == expected
+
+
+def test_reset_drops_old_shards(persistence):
+    create_workspace()
+    data_checkpoint()
+
+    reset_data_store_to_default()
+    data_checkpoint()
+    shards = {path.name.split('.')[0]
+              for path in (persistence / 'snapshots').iterdir()}
+    assert shards == {'MANIFEST', 'users', 'sessions', 'stats', 'workspace'}
+
+    restart()
+    assert data_store.get()['channel_data'] == {}
+    assert data_store.get()['message_data'] == {}
+
+
+def test_restore_leaves_messages_on_disk(persistence):
+    create_workspace()
+    add_channel(2, 'channel_2', 2, True, 104)
+    add_message(True, 2, 2, 3, 'other', 105)
+    data_checkpoint()
+    expected = data_store.get()
+
+    restart()
+    assert get_persistence_stats()['cold_messages'] == 3
+    assert get_persistence_stats()['restore_duration'] > 0
+    assert get_persistence_stats()['resident_memory'] > 0
+
+    # the channel's messages are loaded together on first use
+    assert list(get_messages_by_channel(1)) == [1, 2]
+    assert get_message_by_id(2)['content'] == 'world'
+    assert get_persistence_stats()['cold_messages'] == 1
+
+    # messages still on disk can be changed and removed
+    remove_message(True, 2, 3, 106)
+    assert 3 not in data_store.get()['message_data']
+    data_checkpoint()
+
+    restart()
+    del expected['message_data'][3]
+    expected['channel_data'][2]['message_ids'] = {}
+    assert data_store.get()['message_data'] == expected['message_data']
+
+
+def test_mutations_not_blocked_by_checkpoint(persistence, monkeypatch):
+    create_workspace()
+    writer = dict_store._snapshot_writer
+    write = writer.write
+
+    def write_during_mutation(*args):
+        # a request thread sends a message while the checkpoint is written
+        sender = threading.Thread(
+            target=add_message, args=(True, 2, 1, 3, 'during', 104))
+        sender.start()
+        sender.join(timeout=5)
+        assert not sender.is_alive()
+        return write(*args)
+
+    monkeypatch.setattr(writer, 'write', write_during_mutation)
+    data_checkpoint()
+
+    # the checkpoint holds the store from before the message was sent, the
+    # message is kept in the log
+    stats = get_persistence_stats()
+    assert stats['generation'] == stats['checkpoint_generation'] + 1
+    assert stats['log_size'] > 0
+    assert stats['dirty_shards'] == 4
+    assert 0 < stats['checkpoint_pause'] < stats['checkpoint_duration']
+
+    expected = data_store.get()
+    restart()
+    assert data_store.get() == expected
+    assert list(data_store.get()['message_ids']) == [1, 2, 3]
+
+
+@pytest.mark.parametrize('codec', ['none', 'zlib', 'gzip', 'lzma'])
+def test_checkpoint_compressed(persistence, monkeypatch, codec):
+    monkeypatch.setattr(config, 'snapshot_codec', codec)
+    restart()
+
+    create_workspace()
+    data_checkpoint()
+    expected = data_store.get()
+
+    # shards written with one codec are read whichever codec is configured
+    monkeypatch.setattr(config, 'snapshot_codec', 'lzma' if codec == 'none' else 'none')
+    restart()
+    assert get_persistence_stats()['cold_messages'] == 2
+    assert data_store.get() == expected
+
+
+def test_pipeline_leaves_messages_on_disk():
+    # data_operations wraps the engine in the pipeline when it is imported,
+    # so the tests are run again in a process of their own
+    script = ('import sys, pytest\n'
+              'from src import config\n'
+              "config.write_mode = 'pipeline'\n"
+              'sys.exit(pytest.main(sys.argv[1:]))')
+    result = subprocess.run(
+        [sys.executable, '-c', script, '-q', '-p', 'no:cacheprovider',
+         f'{__file__}::test_restore_leaves_messages_on_disk',
+         f'{__file__}::test_checkpoint_compressed'],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        capture_output=True, text=True, check=False)
+    assert result.returncode == 0, result.stdout
+
+
+def test_unknown_codec_rejected(persistence, monkeypatch):
+    monkeypatch.setattr(config, 'snapshot_codec', 'snappy')
+    with pytest.raises(ValueError):
+        restart()
+
+    monkeypatch.setattr(config, 'snapshot_codec', 'zlib')
+    data_restore()
+
+
+def test_ids_not_reused(persistence, monkeypatch):
+    monkeypatch.setattr(config, 'id_block_size', 4)
+    create_workspace()
+    add_message(True, 1, 1, allocate_id('message'), 'allocated', 104)
+    assert allocate_id('message') == 2
+
+    # the ids of removed messages are not handed out again
+    remove_message(True, 1, 1, 105)
+    remove_message(True, 1, 2, 106)
+    assert allocate_id('message') == 3
+
+    # ids reserved but not used before a restart are skipped
+    restart()
+    assert allocate_id('message') == 5
+
+    # a reset starts the ids again
+    reset_data_store_to_default()
+    assert allocate_id('message') == 1
+
+
+def test_ids_unique_across_threads(persistence, monkeypatch):
+    monkeypatch.setattr(config, 'id_block_size', 8)
+    allocated = []
+
+    def allocate():
+        for _ in range(200):
+            allocated.append(allocate_id('message'))
+
+    threads = [threading.Thread(target=allocate) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(allocated) == list(range(1, 1601))
+
+    restart()
+    assert allocate_id('message') > 1600
+
+
+def test_columnar_message_store(persistence, monkeypatch):
+    monkeypatch.setattr(config, 'message_store', 'columnar')
+    restart()
+
+    create_workspace()
+    add_message(True, 1, 1, 3, 'héllo again', 104)
+    edit_message(True, 1, 2, 'edited world')
+    react_message(2, 2, 1)
+    pin_message(3)
+    remove_message(True, 1, 1, 105)
+
+    assert 1 not in data_store.get()['message_data']
+    assert get_message_by_id(2)['content'] == 'edited world'
+    assert get_message_by_id(3)['is_pinned']
+    assert get_message_by_id(2)['reacts'][0]['u_ids'] == [2]
+    assert get_messages_containing([2, 3], 'llo') == [3]
+    assert get_messages_containing([2, 3], 'world') == [2]
+    data_checkpoint()
+    expected = {message_id: message.to_dict()
+                for message_id, message in data_store.get()['message_data'].items()}
+
+    # the snapshot is read the same way by either message_data
+    for message_store in ('columnar', 'dict'):
+        monkeypatch.setattr(config, 'message_store', message_store)
+        restart()
+        assert {message_id: message.to_dict()
+                for message_id, message in data_store.get()['message_data'].items()} == expected
@@ -0,0 +1,224 @@
+import random
+import pytest
+import threading
+
+from src import config
+from src import dict_store
+from src.locks import RWLock, locked
+from src.error import InputError
+from src.auth import auth_register_v1
+from src.channels import channels_create_v1, channels_listall_v1
+from src.channel import channel_join_v1, channel_messages_v1
+from src.message import (
+    message_send_v1,
+    message_edit_v1,
+    message_remove_v1,
+    message_react_v1,
+    message_unreact_v1
+)
+from src.data_operations import (
+    reset_data_store_to_default,
+    data_restore,
+    get_channel_ids,
+    get_message_ids,
+    get_message_by_id,
+    get_messages_by_channel,
+    get_workspace_stats
+)
+
+'''
+Whitebox tests for the locks requests hold on the data_store
+
+RWLOCK
+    - Lets readers in together and keeps writers apart from everyone
+    - Lets a thread take a lock it holds again
+    - Refuses the write lock to a thread holding the read lock
+
+LOCKED
+    - Refuses locks taken out of the lock order
+
+STRESS
+    - Messages sent, edited, reacted to and removed from many threads at
+      once leave every message in exactly one channel, with the content of
+      its last edit and the stats counting it
+'''
+
+THREADS = 8
+ROUNDS = 150
+CHANNELS = 4
+
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    # keep the files out of the working directory
+    monkeypatch.setattr(config, 'snapshot_dir', str(tmp_path / 'snapshots'))
+    monkeypatch.setattr(config, 'legacy_snapshot_paths', [])
+    monkeypatch.setattr(config, 'mutation_log_path', str(tmp_path / 'data_store.log'))
+    monkeypatch.setattr(config, 'message_store', 'dict')
+    monkeypatch.setattr(dict_store, '_mutation_log', None)
+
+    reset_data_store_to_default()
+    data_restore()
+    yield tmp_path
+    dict_store._mutation_log.close()
+
+
+def test_readers_share_writers_exclusive():
+    lock = RWLock()
+    both_reading = threading.Barrier(2, timeout=5)
+    writer_done = threading.Event()
+
+    def reader():
+        lock.acquire_read()
+        both_reading.wait()
+        lock.release_read()
+
+    def writer():
+        lock.acquire_write()
+        writer_done.set()
+        lock.release_write()
+
+    # both readers hold the lock at once, or the barrier times out
+    readers = [threading.Thread(target=reader) for _ in range(2)]
+    for thread in readers:
+        thread.start()
+    for thread in readers:
+        thread.join()
+
+    lock.acquire_read()
+    thread = threading.Thread(target=writer)
+    thread.start()
+    assert not writer_done.wait(0.1)
+    lock.release_read()
+    assert writer_done.wait(5)
+    thread.join()
+
+
+def test_reentrant():
+    lock = RWLock()
+    lock.acquire_write()
+    lock.acquire_write()
+    lock.acquire_read()
+    lock.release_read()
+    lock.release_write()
+    lock.release_write()
+
+    lock.acquire_read()
+    with pytest.raises(RuntimeError):
+        lock.acquire_write()
+    lock.release_read()
+
+
+def test_lock_order():
+    with locked({(False, 1): True}):
+        with pytest.raises(RuntimeError):
+            with locked({(True, 5): True}):
+                pass
+
+        # the same lock again, and locks later in the order, are fine
+        with locked({(False, 1): False, (False, 2): True}):
+            pass
+
+    with locked({(True, 1): True}):
+        with pytest.raises(RuntimeError):
+            with locked({}, users=False):
+                pass
+
+    # every lock taken is released
+    with locked({(True, 5): True, (False, 1): True}, users=True):
+        pass
+
+
+def test_stress(workspace):
+    owner = auth_register_v1('owner@gmail.com', 'password', 'Channel', 'Owner')
+    users = [auth_register_v1(f'user{number}@gmail.com', 'password', 'User', f'Number{number}')
+             for number in range(THREADS)]
+    channel_ids = [channels_create_v1(owner['token'], f'channel{number}', True)['channel_id']
+                   for number in range(CHANNELS)]
+    for user in users:
+        for channel_id in channel_ids:
+            channel_join_v1(user['token'], channel_id)
+
+    errors = []
+    # the messages each thread has sent and not removed, with their content
+    kept = [{} for _ in range(THREADS)]
+    removed = [set() for _ in range(THREADS)]
+    start = threading.Barrier(THREADS + 1)
+
+    def hammer(number: int) -> None:
+        token = users[number]['token']
+        rng = random.Random(number)
+        mine = kept[number]
+        start.wait()
+
+        for round_number in range(ROUNDS):
+            action = rng.random()
+            try:
+                if action < 0.4 or not mine:
+                    content = f'thread {number} round {round_number}'
+                    sent = message_send_v1(token, rng.choice(channel_ids), content)
+                    mine[sent['message_id']] = content
+                elif action < 0.6:
+                    message_id = rng.choice(list(mine))
+                    content = f'edited by {number} in round {round_number}'
+                    message_edit_v1(token, message_id, content)
+                    mine[message_id] = content
+                elif action < 0.8:
+                    # another thread's message, which may be removed under us
+                    message_id = rng.choice(list(rng.choice(kept)) or list(mine))
+                    try:
+                        message_react_v1(token, message_id, 1)
+                        message_unreact_v1(token, message_id, 1)
+                    except InputError:
+                        pass
+                else:
+                    message_id = rng.choice(list(mine))
+                    message_remove_v1(token, message_id)
+                    del mine[message_id]
+                    removed[number].add(message_id)
+            except Exception as error:
+                errors.append(error)
+
+    def read() -> None:
+        start.wait()
+        while any(thread.is_alive() for thread in threads):
+            try:
+                channels_listall_v1(owner['token'])
+                for channel_id in channel_ids:
+                    channel_messages_v1(owner['token'], channel_id, 0)
+            except Exception as error:
+                errors.append(error)
+
+    threads = [threading.Thread(target=hammer, args=(number,)) for number in range(THREADS)]
+    reader = threading.Thread(target=read)
+    for thread in threads + [reader]:
+        thread.start()
+    for thread in threads + [reader]:
+        thread.join()
+
+    assert errors == []
+
+    # every message kept is in exactly one channel, the one it was sent to
+    in_channels = []
+    for channel_id in get_channel_ids():
+        for message_id in get_messages_by_channel(channel_id):
+            message = get_message_by_id(message_id)
+            assert message['channel_created'] == channel_id
+            assert message['is_channel'] is True
+            in_channels.append(message_id)
+
+    expected = {}
+    for mine in kept:
+        expected.update(mine)
+    assert len(in_channels) == len(set(in_channels))
+    assert set(in_channels) == set(get_message_ids()) == set(expected)
+    assert not set(expected).intersection(*removed)
+
+    # each message has the content of its last edit, and nobody is left
+    # reacted after reacting then unreacting
+    for message_id, content in expected.items():
+        assert get_message_by_id(message_id)['content'] == content
+        assert get_message_by_id(message_id)['reacts'][0]['u_ids'] == []
+
+    stats = get_workspace_stats()
+    assert stats['messages_exist'][-1]['num_messages_exist'] == len(expected)
@@ -336,6 +336,23 @@ def test_valid_message_and_channel_user_not_channel_member(clear_data, create_da
 
     assert unauthorised_react.status_code == 400
 
+def test_user_left_channel(clear_data, create_data):
+    _, token2, channel_messages, _, channel_id, _ = create_data
+
+    ## user_2 leaves the channel they sent the first message to
+    requests.post(config.url + 'channel/leave/v1', json={
+        'token': token2,
+        'channel_id': channel_id
+    })
+
+    unauthorised_react = requests.post(config.url + 'message/react/v1', json={
+        'token': token2,
+        'message_id': channel_messages[0],
+        'react_id': 1
+    })
+
+    assert unauthorised_react.status_code == 400
+
 def test_valid_message_and_dm_user_not_dm_member(clear_data, create_data):
     _, _, _, dm_messages, _, _ = create_data
 
@@ -3,6 +3,7 @@ import pytest
 from src import config
 import requests
 import json
+import time
 from datetime import timezone, datetime
 
 @pytest.fixture
@@ -84,6 +85,36 @@ def test_message_sendlater_simple(clear_data, user_and_channel_data):
     message_id = json.loads(message_data.text)['message_id']
     assert type(message_id) == int
 
+def test_message_sendlater_delivered(clear_data, user_and_channel_data):
+    user_token, _, dm_id, _ = user_and_channel_data
+
+    # get current time
+    dt = datetime.now(timezone.utc)
+    time_sent = int(dt.timestamp()) + 1
+
+    message_data = requests.post(config.url + 'message/sendlaterdm/v1', json={
+        'token': user_token,
+        'dm_id': dm_id,
+        'message': 'Hello this is a message',
+        'time_sent': time_sent
+    })
+    message_id = json.loads(message_data.text)['message_id']
+
+    # reserving the message id does not add a dm
+    dm_list = requests.get(config.url + 'dm/list/v1', params={'token': user_token})
+    assert len(json.loads(dm_list.text)['dms']) == 1
+
+    time.sleep(2)
+
+    dm_messages = requests.get(config.url + 'dm/messages/v1', params={
+        'token': user_token,
+        'dm_id': dm_id,
+        'start': 0
+    })
+    messages = json.loads(dm_messages.text)['messages']
+    assert [message['message_id'] for message in messages] == [message_id]
+    assert messages[0]['message'] == 'Hello this is a message'
+
 def test_message_sendlater_to_past(clear_data, user_and_channel_data):
     user_token, _, channel_id, _= user_and_channel_data
 
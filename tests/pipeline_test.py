@@ -0,0 +1,207 @@
+import pytest
+import threading
+
+from src import config
+from src import pipeline
+from src import dict_store
+
+'''
+Whitebox tests for the single-writer command pipeline
+
+COMMANDS
+    - Names every mutation of the dict engine
+
+PIPELINE
+    - Commands submitted from many threads are all applied, in batches
+    - A snapshot holds the data_store as it was when published, and is not
+      changed by later commands
+    - A command's caller sees its change in the next snapshot read
+    - Sending a message copies only the changed fields, sharing the message
+      ids, members and notifications with the snapshot before
+    - Messages are read through the engine until changed, and a snapshot
+      reads a message changed after it as it was
+    - Errors raised by a command are raised to its caller, the writer goes on
+    - Changes are made straight away once the pipeline is stopped
+'''
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'snapshot_dir', str(tmp_path / 'snapshots'))
+    monkeypatch.setattr(config, 'legacy_snapshot_paths', [])
+    monkeypatch.setattr(config, 'mutation_log_path', str(tmp_path / 'data_store.log'))
+    monkeypatch.setattr(config, 'message_store', 'dict')
+    monkeypatch.setattr(dict_store, '_mutation_log', None)
+
+    dict_store.data_restore()
+    dict_store.reset_data_store_to_default()
+    engine = pipeline.wrap_engine(dict_store)
+
+    engine.start_workspace_stats(0)
+    for user_id in (1, 2):
+        engine.add_user(user_id, ('First', 'Last', f'user{user_id}@gmail.com'),
+                        'password', f'user{user_id}', user_id == 1)
+        engine.start_user_stats(user_id, 0)
+    engine.add_channel(1, 'channel_1', 1, True, 0)
+    engine.add_member_to_channel(1, 2, 0)
+
+    pipeline.start()
+    yield engine
+
+    pipeline.stop()
+    dict_store._mutation_log.close()
+
+
+def send(engine, message_id: int, user_id: int = 1) -> None:
+    engine.add_message(True, user_id, 1, message_id, f'message {message_id}', message_id)
+
+
+def test_commands_cover_mutations():
+    assert set(dict_store._mutations) <= set(pipeline.COMMANDS)
+
+
+def test_concurrent_commands(engine):
+    start = threading.Barrier(8)
+
+    def sender(number):
+        start.wait()
+        for message_id in range(number * 100 + 1, number * 100 + 101):
+            send(engine, message_id, number % 2 + 1)
+
+    # the writer may have applied commands before, in write_mode 'pipeline'
+    before = pipeline.get_pipeline_stats()
+    threads = [threading.Thread(target=sender, args=(number,)) for number in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    snapshot = pipeline.get_snapshot()
+    assert set(snapshot.get_messages_by_channel(1)) == set(range(1, 801))
+    assert list(snapshot.get_messages_by_channel(1)) == list(dict_store.get_messages_by_channel(1))
+    assert snapshot.get_message_by_id(555)['content'] == 'message 555'
+
+    stats = pipeline.get_pipeline_stats()
+    assert stats['queue_depth'] == 0
+    batches = stats['batches_applied'] - before['batches_applied']
+    assert stats['commands_applied'] - before['commands_applied'] == 800
+    assert batches <= 800
+    assert stats['generation'] - before['generation'] == batches
+
+
+def test_snapshot_unchanged(engine):
+    send(engine, 1)
+    before = pipeline.get_snapshot()
+
+    send(engine, 2)
+    engine.set_message_content(1, 'edited')
+    engine.react_message(2, 1, 1)
+    engine.edit_user(2, 'first_name', 'Renamed')
+    engine.remove_member_from_channel(1, 2, 1)
+
+    assert list(before.get_messages_by_channel(1)) == [1]
+    assert before.get_message_by_id(1)['content'] == 'message 1'
+    assert before.get_message_by_id(1)['reacts'][0]['u_ids'] == []
+    assert before.get_user(2)['first_name'] == 'First'
+    assert list(before.get_channel(1)['members']) == [1, 2]
+    assert before.get_user_channels(2) == [1]
+
+    after = pipeline.get_snapshot()
+    assert after.generation > before.generation
+    assert list(after.get_messages_by_channel(1)) == [1, 2]
+    assert after.get_message_by_id(1)['content'] == 'edited'
+    assert after.get_message_by_id(1)['reacts'][0]['u_ids'] == [2]
+    assert after.get_user(2)['first_name'] == 'Renamed'
+    assert list(after.get_channel(1)['members']) == [1]
+    assert after.get_user_channels(2) == []
+
+
+def test_send_shares_unchanged(engine):
+    engine.add_notification(True, 1, 1, 'tagged')
+    send(engine, 1)
+    before = pipeline.get_snapshot()
+
+    send(engine, 2)
+    engine.add_notification(True, 1, 1, 'tagged again')
+    after = pipeline.get_snapshot()
+    assert after.get_channel(1)['members'] is before.get_channel(1)['members']
+    assert after.get_user(1)['in_channels'] is before.get_user(1)['in_channels']
+    assert after.get_user(1)['messages_sent'] == before.get_user(1)['messages_sent'] + 1
+
+    assert list(before.get_messages_by_channel(1)) == [1]
+    assert list(after.get_messages_by_channel(1)) == [1, 2]
+    assert 2 not in before.get_messages_by_channel(1)
+    assert list(reversed(after.get_messages_by_channel(1))) == [2, 1]
+    assert len(before.get_user(1)['notifications']) == 1
+    assert after.get_user(1)['notifications'][-1]['content'] == 'tagged again'
+
+    engine.remove_message(True, 1, 1, 3)
+    snapshot = pipeline.get_snapshot()
+    assert list(snapshot.get_messages_by_channel(1)) == [2]
+    assert len(snapshot.get_messages_by_channel(1)) == 1
+    assert list(after.get_messages_by_channel(1)) == [1, 2]
+
+
+def test_messages_read_through_engine(engine):
+    pipeline.stop()
+    send(engine, 1)
+    send(engine, 2)
+    pipeline.start()
+
+    # messages sent before the snapshots started are not copied into them
+    before = pipeline.get_snapshot()
+    assert 1 not in before._messages
+
+    engine.set_message_content(1, 'edited')
+    engine.remove_message(True, 1, 2, 3)
+    assert before.get_message_by_id(1)['content'] == 'message 1'
+    assert before.get_message_by_id(2)['content'] == 'message 2'
+    assert before.get_messages_containing([1, 2], 'message') == [1, 2]
+
+    after = pipeline.get_snapshot()
+    assert after.get_message_by_id(1)['content'] == 'edited'
+    assert after.get_messages_containing(after.get_messages_by_channel(1), 'edit') == [1]
+    with pytest.raises(KeyError):
+        after.get_message_by_id(2)
+
+
+def test_conversations_and_removal(engine):
+    engine.add_dm(1, 'user1, user2', 1, 0)
+    engine.add_user_to_dm(1, 2, 0)
+    engine.add_message(False, 2, 1, 1, 'hello dm', 1)
+    snapshot = pipeline.get_snapshot()
+    assert list(snapshot.get_dm_ids()) == [1]
+    assert list(snapshot.get_messages_by_dm(1)) == [1]
+    assert snapshot.get_user_dms(2) == [1]
+    assert snapshot.get_messages_containing(snapshot.get_messages_by_dm(1), 'dm') == [1]
+
+    engine.remove_message(False, 1, 1, 2)
+    engine.remove_dm(1, 2)
+    snapshot = pipeline.get_snapshot()
+    assert list(snapshot.get_dm_ids()) == []
+    with pytest.raises(KeyError):
+        snapshot.get_message_by_id(1)
+
+    engine.remove_user_details(2)
+    assert list(pipeline.get_snapshot().get_user_ids()) == [1]
+
+    engine.reset_data_store_to_default()
+    snapshot = pipeline.get_snapshot()
+    assert list(snapshot.get_user_ids()) == []
+    assert list(snapshot.get_channel_ids()) == []
+
+
+def test_command_error(engine):
+    with pytest.raises(KeyError):
+        engine.add_member_to_channel(99, 2, 0)
+
+    send(engine, 1)
+    assert list(pipeline.get_snapshot().get_messages_by_channel(1)) == [1]
+
+
+def test_stopped(engine):
+    pipeline.stop()
+    assert pipeline.get_snapshot() is None
+
+    send(engine, 1)
+    assert list(dict_store.get_messages_by_channel(1)) == [1]
@@ -0,0 +1,300 @@
+import time
+import pytest
+import threading
+
+from src import config
+from src import scheduler
+from src import data_operations
+from src import dict_store
+from src.auth import auth_register_v1, auth_logout_v1
+from src.channels import channels_create_v1
+from src.dm import dm_create_v1, dm_remove_v1
+from src.message import message_sendlater_v1, message_sendlaterdm_v1
+from src.standup import standup_start_v1, standup_send_v1
+from src.data_operations import (
+    reset_data_store_to_default,
+    data_restore,
+    cancel_scheduled_job,
+    cancel_conversation_jobs,
+    cancel_workspace_jobs,
+    restore_scheduled_jobs,
+    schedule_message_job,
+    add_scheduled_job,
+    add_message,
+    get_scheduled_jobs,
+    get_channel,
+    get_workspace_stats,
+    get_user_notifications,
+    get_message_content,
+    get_messages_by_channel,
+    get_messages_by_dm
+)
+
+'''
+Whitebox tests for the messages sent later and standup ends kept in the
+data_store
+
+DATA_RESTORE
+    - Schedules again the jobs waiting when the server went down
+    - Runs jobs that fell due while it was down straight away, in the order
+      they were due
+    - Sends each message once, even when the server went down after the
+      message was sent but before its job was dropped
+
+BATCHES
+    - Messages sent later that fall due together are sent in one batch for
+      each channel or dm, updating the stats once
+
+ATOMIC
+    - Starting a standup or reserving a message sent later is logged in the
+      same mutation as the job, so a crash between the two cannot leave a
+      standup or reserved message with no job
+
+RESTORE_SCHEDULED_JOBS
+    - Does not schedule a job scheduled already
+
+CANCEL
+    - Cancels a job, the jobs of a channel or dm, or every job, dropping them
+      from the data_store so they are not scheduled again after a restart
+    - Removing a dm cancels the messages sent later to it
+    - Cancelling every job leaves jobs not kept in the data_store
+    - A job cancelled as it falls due is not cancelled, it runs and then
+      drops itself from the data_store
+'''
+
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    # keep the files out of the working directory
+    monkeypatch.setattr(config, 'snapshot_dir', str(tmp_path / 'snapshots'))
+    monkeypatch.setattr(config, 'legacy_snapshot_paths', [])
+    monkeypatch.setattr(config, 'mutation_log_path', str(tmp_path / 'data_store.log'))
+    monkeypatch.setattr(config, 'message_store', 'dict')
+    monkeypatch.setattr(dict_store, '_mutation_log', None)
+
+    reset_data_store_to_default()
+    data_restore()
+
+    token = auth_register_v1('eliza@gmail.com', 'password', 'Eliza', 'Lee')['token']
+    channel_id = channels_create_v1(token, 'channel', True)['channel_id']
+    yield token, channel_id
+
+    cancel_workspace_jobs()
+    dict_store._mutation_log.close()
+
+
+def restart() -> None:
+    # the jobs waiting in the scheduler are lost with everything held in
+    # memory, only what was written to disk is left
+    scheduler.cancel_all()
+    data_operations._scheduled_jobs.clear()
+    data_operations._conversation_jobs.clear()
+    dict_store._mutation_log.close()
+    dict_store._mutation_log = None
+    reset_data_store_to_default()
+    data_restore()
+
+
+def make_overdue(message_id: int, seconds: float, now: float = None) -> None:
+    # as if the server had been down for a while
+    job = get_scheduled_jobs()[message_id]
+    add_scheduled_job(message_id, (now or time.time()) - seconds, job['kind'], job['is_channel'],
+                      job['conversation_id'], job['arguments'])
+
+
+def wait_for_jobs(remaining: int = 0) -> None:
+    deadline = time.monotonic() + 5
+    while len(get_scheduled_jobs()) > remaining and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert len(get_scheduled_jobs()) == remaining
+
+
+def contents(message_ids) -> list:
+    return [get_message_content(message_id) for message_id in message_ids]
+
+
+def test_overdue_sent_in_order(workspace):
+    token, channel_id = workspace
+    time_sent = int(time.time()) + 60
+    message_ids = [message_sendlater_v1(token, channel_id, f'later {number}', time_sent)['message_id']
+                   for number in range(3)]
+    waiting_id = message_sendlater_v1(token, channel_id, 'still waiting', time_sent)['message_id']
+
+    # due in the reverse order they were sent
+    for number, message_id in enumerate(message_ids):
+        make_overdue(message_id, number + 1)
+
+    restart()
+    wait_for_jobs(1)
+    assert contents(get_messages_by_channel(channel_id)) == ['later 2', 'later 1', 'later 0']
+    assert list(get_scheduled_jobs()) == [waiting_id]
+
+    # jobs that ran are not run again on the next restart
+    restart()
+    assert len(get_messages_by_channel(channel_id)) == 3
+    assert scheduler.get_scheduler_stats()['queue_depth'] == 1
+
+
+def test_dm_sent_once(workspace):
+    token, _ = workspace
+    dm_id = dm_create_v1(token, [])['dm_id']
+    message_id = message_sendlaterdm_v1(token, dm_id, 'later', int(time.time()) + 60)['message_id']
+
+    # the server went down once the message was sent, before its job was
+    # dropped
+    add_message(False, 1, dm_id, message_id, 'later', int(time.time()))
+    make_overdue(message_id, 1)
+
+    restart()
+    wait_for_jobs()
+    assert contents(get_messages_by_dm(dm_id)) == ['later']
+
+
+def test_sent_message_not_sent_again(workspace):
+    token, channel_id = workspace
+    message_id = message_sendlater_v1(token, channel_id, 'later', int(time.time()) + 60)['message_id']
+    add_message(True, 1, channel_id, message_id, 'later', int(time.time()))
+    make_overdue(message_id, 1)
+
+    restart()
+    wait_for_jobs()
+    assert list(get_messages_by_channel(channel_id)) == [message_id]
+
+
+def test_standup_ends_after_restart(workspace):
+    token, channel_id = workspace
+    standup_start_v1(token, channel_id, 60)
+    standup_send_v1(token, channel_id, 'first')
+    standup_send_v1(token, channel_id, 'second')
+    make_overdue(*get_scheduled_jobs(), 1)
+
+    restart()
+    wait_for_jobs()
+    assert contents(get_messages_by_channel(channel_id)) == ['elizalee: first\nelizalee: second']
+    assert not get_channel(channel_id)['standup_data']['is_active']
+
+    # the next standup is not ended by the one before
+    standup_start_v1(token, channel_id, 60)
+    restart()
+    assert get_channel(channel_id)['standup_data']['is_active']
+    assert len(get_messages_by_channel(channel_id)) == 1
+
+
+def test_kept_with_job(workspace, monkeypatch):
+    token, channel_id = workspace
+    logged = []
+    append = dict_store._mutation_log.append
+    def record(name, args, kwargs):
+        # ids reserved for the messages are logged on their own
+        if name != 'reserve_ids':
+            logged.append(name)
+        append(name, args, kwargs)
+    monkeypatch.setattr(dict_store._mutation_log, 'append', record)
+
+    standup_start_v1(token, channel_id, 60)
+    assert logged == ['start_standup_job']
+    logged.clear()
+    message_sendlater_v1(token, channel_id, 'later', int(time.time()) + 60)
+    assert logged == ['add_sendlater_job']
+
+    restart()
+    assert get_channel(channel_id)['standup_data']['is_active']
+    assert len(get_scheduled_jobs()) == 2
+
+
+def test_restore_schedules_once(workspace):
+    token, channel_id = workspace
+    message_sendlater_v1(token, channel_id, 'later', int(time.time()) + 60)
+    restore_scheduled_jobs()
+    restore_scheduled_jobs()
+    assert scheduler.get_scheduler_stats()['queue_depth'] == 1
+
+
+def test_burst_sent_in_batches(workspace):
+    token, channel_id = workspace
+    other_token = auth_register_v1('eileen@gmail.com', 'password', 'Eileen', 'Chong')['token']
+    dm_id = dm_create_v1(token, [2])['dm_id']
+    time_sent = int(time.time()) + 60
+
+    message_ids = [message_sendlater_v1(token, channel_id, f'later {number}', time_sent)['message_id']
+                   for number in range(300)]
+    dm_message_ids = [message_sendlaterdm_v1(token, dm_id, 'hi @eileenchong', time_sent)['message_id'],
+                      message_sendlaterdm_v1(other_token, dm_id, 'logged out', time_sent)['message_id']]
+    auth_logout_v1(other_token)
+
+    # all due at once, however long making them overdue takes
+    now = time.time()
+    for message_id in message_ids + dm_message_ids:
+        make_overdue(message_id, 1, now)
+    entries = len(get_workspace_stats()['messages_exist'])
+    before = scheduler.get_scheduler_stats()
+
+    restart()
+    wait_for_jobs()
+    assert list(get_messages_by_channel(channel_id)) == message_ids
+    assert list(get_messages_by_dm(dm_id)) == dm_message_ids[:1]
+    assert len(get_user_notifications(2)) == 2
+    assert len(get_workspace_stats()['messages_exist']) == entries + 2
+
+    stats = scheduler.get_scheduler_stats()
+    assert stats['jobs_run'] == before['jobs_run'] + 302
+    assert stats['batches_run'] == before['batches_run'] + 2
+
+
+def test_cancel(workspace):
+    token, channel_id = workspace
+    other_channel_id = channels_create_v1(token, 'other', True)['channel_id']
+    dm_id = dm_create_v1(token, [])['dm_id']
+    time_sent = int(time.time()) + 60
+
+    cancelled_id, kept_id = [message_sendlater_v1(token, channel_id, 'later', time_sent)['message_id']
+                             for _ in range(2)]
+    message_sendlater_v1(token, other_channel_id, 'later', time_sent)
+    standup_start_v1(token, other_channel_id, 60)
+    message_sendlaterdm_v1(token, dm_id, 'later', time_sent)
+    assert scheduler.get_scheduler_stats()['queue_depth'] == 5
+
+    assert cancel_scheduled_job(cancelled_id)
+    assert not cancel_scheduled_job(cancelled_id)
+    assert list(get_scheduled_jobs()) != [] and cancelled_id not in get_scheduled_jobs()
+
+    assert cancel_conversation_jobs(True, other_channel_id) == 2
+    assert cancel_conversation_jobs(True, other_channel_id) == 0
+    assert len(get_scheduled_jobs()) == 2
+
+    dm_remove_v1(token, dm_id)
+    assert list(get_scheduled_jobs()) == [kept_id]
+    assert scheduler.get_scheduler_stats()['queue_depth'] == 1
+
+    # jobs not kept in the data_store are not the workspace's to cancel
+    restart()
+    unrelated = scheduler.schedule(60, lambda: None)
+    assert list(get_scheduled_jobs()) == [kept_id]
+    assert cancel_workspace_jobs() == 1
+    assert get_scheduled_jobs() == {}
+    assert scheduler.get_scheduler_stats()['queue_depth'] == 1
+    assert scheduler.cancel(unrelated)
+
+
+def test_cancel_when_due(workspace, monkeypatch):
+    _, channel_id = workspace
+    started = threading.Event()
+    finish = threading.Event()
+
+    def run():
+        started.set()
+        finish.wait(5)
+
+    monkeypatch.setitem(scheduler._kinds, 'blocking', (run, False))
+    schedule_message_job(1000, 0, 'blocking', True, channel_id)
+    assert started.wait(5)
+
+    # the scheduler has taken the job, so it is left in the data_store
+    assert not cancel_scheduled_job(1000)
+    assert cancel_conversation_jobs(True, channel_id) == 0
+    assert cancel_workspace_jobs() == 0
+    assert 1000 in get_scheduled_jobs()
+
+    finish.set()
+    wait_for_jobs()
+    assert 1000 not in data_operations._scheduled_jobs
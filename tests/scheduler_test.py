@@ -0,0 +1,147 @@
+import pytest
+import threading
+
+from src import scheduler
+
+'''
+Whitebox tests for the scheduler running messages sent later and standup ends
+
+SCHEDULE
+    - Runs jobs in the order they are due, on one thread however many wait
+    - Runs jobs already overdue in the order they were due
+    - Goes on running jobs after one raises an exception
+    - Runs the batched jobs of a function and key due in the same tick in
+      one call
+
+JOB_KIND
+    - Registers the function jobs of a kind run
+
+CANCEL
+    - A cancelled job does not run, and cannot be cancelled again
+    - Cancelled jobs do not stay in the heap
+
+STATS
+    - Gives the jobs waiting, run and cancelled, and how late they ran
+'''
+
+
+@pytest.fixture(autouse=True)
+def clean_scheduler():
+    scheduler.cancel_all()
+    yield
+    scheduler.cancel_all()
+
+
+def test_order():
+    ran = []
+    done = threading.Event()
+
+    scheduler.schedule(0.15, ran.append, 'third')
+    scheduler.schedule(0.05, ran.append, 'first')
+    scheduler.schedule(0.1, ran.append, 'second')
+    scheduler.schedule(0.2, done.set)
+
+    assert done.wait(5)
+    assert ran == ['first', 'second', 'third']
+
+
+def test_many_jobs_one_thread():
+    scheduler.schedule(0, lambda: None)
+    threads = threading.active_count()
+
+    job_ids = [scheduler.schedule(60 + number, lambda: None) for number in range(10000)]
+    assert threading.active_count() == threads
+    assert scheduler.get_scheduler_stats()['queue_depth'] == 10000
+
+    for job_id in job_ids[:9000]:
+        assert scheduler.cancel(job_id)
+    assert scheduler.get_scheduler_stats()['queue_depth'] == 1000
+    assert len(scheduler._heap) <= 2 * 1000 + 64
+
+
+def test_cancel():
+    ran = []
+    done = threading.Event()
+
+    job_id = scheduler.schedule(0.05, ran.append, 'cancelled')
+    scheduler.schedule(0.1, done.set)
+    assert scheduler.cancel(job_id)
+    assert not scheduler.cancel(job_id)
+
+    assert done.wait(5)
+    assert ran == []
+
+
+def test_exception(capsys):
+    done = threading.Event()
+
+    scheduler.schedule(0, lambda: 1 / 0)
+    scheduler.schedule(0.05, done.set)
+
+    assert done.wait(5)
+    assert 'ZeroDivisionError' in capsys.readouterr().err
+
+
+def test_stats():
+    done = threading.Event()
+    before = scheduler.get_scheduler_stats()
+
+    scheduler.schedule(0.05, done.set)
+    scheduler.schedule(60, done.set)
+    assert done.wait(5)
+    assert scheduler.cancel_all() == 1
+
+    stats = scheduler.get_scheduler_stats()
+    assert stats['queue_depth'] == 0
+    assert stats['jobs_run'] == before['jobs_run'] + 1
+    assert stats['jobs_cancelled'] == before['jobs_cancelled'] + 1
+    assert 0 <= stats['dispatch_lag'] <= stats['max_dispatch_lag']
+
+
+def test_overdue_order():
+    ran = []
+    done = threading.Event()
+
+    scheduler.schedule(-1, ran.append, 'second')
+    scheduler.schedule(-2, ran.append, 'first')
+    scheduler.schedule(0, done.set)
+
+    assert done.wait(5)
+    assert ran == ['first', 'second']
+
+
+def test_job_kind():
+    @scheduler.job_kind('test', batched=True)
+    def job():
+        pass
+
+    assert scheduler.get_job_kind('test') == (job, True)
+    with pytest.raises(KeyError):
+        scheduler.get_job_kind('unknown')
+
+
+def test_batched():
+    calls = []
+    done = threading.Event()
+
+    def batch(key, items):
+        calls.append((key, items))
+
+    for number in range(100):
+        scheduler.schedule_batched(0.05, batch, number % 2, number)
+    scheduler.schedule(0.05, calls.append, 'unbatched')
+    scheduler.schedule_batched(0.2, batch, 0, 'next tick')
+    scheduler.schedule(0.25, done.set)
+    before = scheduler.get_scheduler_stats()
+
+    assert done.wait(5)
+    assert calls == [
+        (0, list(range(0, 100, 2))),
+        (1, list(range(1, 100, 2))),
+        'unbatched',
+        (0, ['next tick'])
+    ]
+
+    stats = scheduler.get_scheduler_stats()
+    assert stats['jobs_run'] == before['jobs_run'] + 103
+    assert stats['batches_run'] == before['batches_run'] + 5
@@ -0,0 +1,213 @@
+import json
+import pytest
+import multiprocessing
+
+from src import config
+from src import dict_store
+from src import sqlite_store
+from src.data_store import data_store
+from src.records import record_to_dict
+
+'''
+Whitebox tests for the data_store kept in an SQLite database
+
+OPERATIONS
+    - Give the same data_store as the dict storage engine
+    - Leave the data_store on disk, a restart reads nothing back
+    - Undo every change of a mutation that fails part way
+    - Count the channels, dms and messages of a database made by an older
+      version when it is first opened, and the users in a channel or dm
+
+ALLOCATE_ID
+    - Never hands out an id twice across processes sharing the database
+'''
+
+
+@pytest.fixture
+def sqlite(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'sqlite_path', str(tmp_path / 'data_store.sqlite3'))
+    sqlite_store.data_restore()
+    sqlite_store.reset_data_store_to_default()
+    yield tmp_path
+
+
+@pytest.fixture
+def memory(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'snapshot_dir', str(tmp_path / 'snapshots'))
+    monkeypatch.setattr(config, 'legacy_snapshot_paths', [])
+    monkeypatch.setattr(config, 'mutation_log_path', str(tmp_path / 'data_store.log'))
+    monkeypatch.setattr(config, 'message_store', 'dict')
+    monkeypatch.setattr(dict_store, '_mutation_log', None)
+
+    dict_store.reset_data_store_to_default()
+    dict_store.data_restore()
+    yield tmp_path
+    dict_store._mutation_log.close()
+
+
+def create_workspace(operations) -> None:
+    # every kind of mutation, made through dict_store or sqlite_store
+    operations.start_workspace_stats(90)
+    operations.add_user(1, ('Eliza', 'Lee', 'eliza@gmail.com'), 'password', 'elizalee', True)
+    operations.start_user_stats(1, 91)
+    operations.add_user(2, ('Eileen', 'Chong', 'eileen@gmail.com'), 'password', 'eileenchong', False)
+    operations.start_user_stats(2, 92)
+    operations.add_user(3, ('Removed', 'User', 'removed@gmail.com'), 'password', 'removeduser', False)
+    operations.start_user_stats(3, 93)
+    operations.add_session_token('token1', 1)
+    operations.add_session_token('token2', 2)
+    operations.remove_session_token('token2')
+    operations.add_passwordreset_key(2, '12345')
+
+    operations.add_channel(1, 'channel_1', 1, True, 100)
+    operations.add_member_to_channel(1, 2, 101)
+    operations.add_member_to_channel(1, 3, 101)
+    operations.add_owner_to_channel(2, 1)
+    operations.remove_owner_from_channel(1, 1)
+    operations.add_dm(1, 'eileenchong, elizalee', 1, 102)
+    operations.add_user_to_dm(1, 2, 102)
+    operations.add_dm(2, 'elizalee', 1, 103)
+
+    operations.add_sendlater_id(1)
+    operations.add_message(True, 2, 1, 2, 'hello', 104)
+    operations.add_message(False, 1, 1, 3, 'hello dm', 105)
+    operations.add_message(True, 3, 1, 1, 'sent later', 106)
+    operations.add_message(True, 1, 1, 4, 'removed', 107)
+    operations.add_sendlater_id(5)
+    operations.add_notification(True, 1, 2, 'elizalee tagged you in channel_1: hi')
+    operations.add_notification(False, 1, 1, 'eileenchong added you to a dm')
+    operations.react_message(1, 2, 1)
+    operations.react_message(2, 2, 1)
+    operations.pin_message(3)
+    operations.set_message_content(2, 'hello edited')
+    operations.remove_message(True, 1, 4, 108)
+
+    operations.add_standup_message(1, 'elizalee: standup')
+    operations.set_active_standup(True, 1, 110)
+    operations.edit_user(1, 'user_handle', 'eliza')
+    operations.edit_user_permissions(2, 1)
+    operations.set_user_profileimage_url(2, 'http://localhost:8080/static/2.jpg')
+    operations.remove_member_from_channel(1, 3, 109)
+    operations.remove_user_details(3)
+    operations.remove_member_from_dm(2, 1, 111)
+    operations.remove_dm(2, 111)
+    operations.update_user_stats(1, False, False, False)
+    operations.update_workspace_stats(False, False, False)
+
+
+def as_json(store: dict) -> dict:
+    return json.loads(json.dumps(store, default=record_to_dict))
+
+
+def test_same_as_memory(memory, sqlite):
+    create_workspace(dict_store)
+    create_workspace(sqlite_store)
+
+    assert as_json(sqlite_store.export_data_store()) == as_json(data_store.get())
+
+
+def test_getters(sqlite):
+    create_workspace(sqlite_store)
+
+    assert 1 in sqlite_store.get_user_ids()
+    assert 3 not in sqlite_store.get_user_ids()
+    assert 3 in sqlite_store.get_complete_user_ids()
+    assert '1' not in sqlite_store.get_user_ids()
+    assert set(sqlite_store.get_user_handles()) == {'eliza', 'eileenchong'}
+    assert sqlite_store.get_user_id_by_email('eileen@gmail.com') == 2
+    assert sqlite_store.get_user_id_by_handle('removeduser') is None
+    assert len(sqlite_store.get_global_owners()) == 2
+    assert sqlite_store.get_all_valid_tokens() == {'token1'}
+    assert sqlite_store.get_passwordreset_key('12345') == (True, 2)
+
+    assert list(sqlite_store.get_channel(1)['members']) == [1, 2]
+    assert sqlite_store.get_messages_by_channel(1) == [2, 1]
+    assert list(reversed(sqlite_store.get_messages_by_channel(1))) == [1, 2]
+    assert sqlite_store.get_messages_by_channel(1)[-1] == 1
+    assert sqlite_store.get_message_conversation(3) == (False, 1)
+    assert sqlite_store.get_message_conversation(5) is None
+    assert sqlite_store.get_messages_containing([1, 2, 3], 'hello') == [2, 3]
+    assert sqlite_store.get_message_by_id(2)['reacts'][0]['u_ids'] == [1, 2]
+    assert sqlite_store.get_user(1)['in_dms'] == [1]
+
+
+def test_restart_reads_from_disk(sqlite):
+    create_workspace(sqlite_store)
+    expected = as_json(sqlite_store.export_data_store())
+
+    # a new process starts with no connections and reads the same database
+    sqlite_store._after_fork()
+    sqlite_store.data_restore()
+
+    assert as_json(sqlite_store.export_data_store()) == expected
+    assert sqlite_store.get_persistence_stats()['cold_messages'] == 4
+
+
+def test_failed_mutation_rolled_back(sqlite, monkeypatch):
+    create_workspace(sqlite_store)
+    expected = as_json(sqlite_store.export_data_store())
+
+    def fail(*args):
+        raise RuntimeError('disk full')
+
+    # the channel and the user's stats are changed before the workspace
+    # stats fail
+    monkeypatch.setattr(sqlite_store, 'update_workspace_stats', fail)
+    with pytest.raises(RuntimeError):
+        sqlite_store.add_channel(2, 'channel_2', 1, True, 120)
+
+    assert as_json(sqlite_store.export_data_store()) == expected
+
+
+def test_counts_filled_for_older_database(sqlite, monkeypatch):
+    create_workspace(sqlite_store)
+    expected = as_json(sqlite_store.export_data_store())
+    with sqlite_store._connection() as connection:
+        connection.execute('DROP TABLE counts')
+
+    sqlite_store._after_fork()
+    monkeypatch.setattr(sqlite_store, '_created_paths', set())
+    sqlite_store.data_restore()
+
+    assert as_json(sqlite_store.export_data_store()) == expected
+    assert len(sqlite_store.get_message_ids()) == 4
+
+
+def test_involved_users_counted_for_older_database(sqlite, monkeypatch):
+    create_workspace(sqlite_store)
+    expected = as_json(sqlite_store.export_data_store())
+    with sqlite_store._connection() as connection:
+        connection.execute('ALTER TABLE counts DROP COLUMN involved')
+
+    sqlite_store._after_fork()
+    monkeypatch.setattr(sqlite_store, '_created_paths', set())
+    sqlite_store.data_restore()
+
+    assert as_json(sqlite_store.export_data_store()) == expected
+    assert expected['involved_users'] == 2
+
+
+def allocate_user_ids(count: int, connection) -> None:
+    connection.send([sqlite_store.allocate_id('user') for _ in range(count)])
+
+
+def test_ids_unique_across_processes(sqlite, monkeypatch):
+    monkeypatch.setattr(config, 'id_block_size', 4)
+    allocated = [sqlite_store.allocate_id('user')]
+
+    context = multiprocessing.get_context('fork')
+    receivers = []
+    processes = []
+    for _ in range(3):
+        receiver, sender = context.Pipe(duplex=False)
+        process = context.Process(target=allocate_user_ids, args=(10, sender))
+        process.start()
+        receivers.append(receiver)
+        processes.append(process)
+
+    allocated += [sqlite_store.allocate_id('user') for _ in range(10)]
+    for receiver, process in zip(receivers, processes):
+        allocated += receiver.recv()
+        process.join()
+
+    assert len(set(allocated)) == len(allocated) == 41
@@ -0,0 +1,345 @@
+import types
+import pytest
+import importlib
+
+from src import config
+from src import dict_store
+from src.storage_engine import ENGINES, OPERATIONS, check_engine, load_engine
+
+'''
+Whitebox tests every storage engine in ENGINES must pass
+
+OPERATIONS
+    - Every engine has every operation, taking the arguments named for it
+    - Users, sessions and password reset keys are added, found and removed
+    - Channels and dms keep their owners and members in the order added
+    - Messages are kept oldest first, messages sent later in the order sent
+    - A batch of messages updates the stats once, and once for each author
+    - Reacts are toggled for each user
+    - Notifications are kept for each user in the order added
+    - Stats are kept as each change is made
+    - The involvement_rate counts the messages a user has now, not the ones
+      removed, and the channels and dms they are in now
+    - Ids are never handed out twice, nor below the ids reserved
+    - Scheduled jobs are kept across a restart until removed
+    - The data_store is the same after a checkpoint and restore
+
+LOAD_ENGINE
+    - Raises ValueError for a name not in ENGINES
+    - Raises TypeError for an engine missing an operation or taking other
+      arguments
+'''
+
+
+@pytest.fixture(params=list(ENGINES))
+def engine(request, tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'snapshot_dir', str(tmp_path / 'snapshots'))
+    monkeypatch.setattr(config, 'legacy_snapshot_paths', [])
+    monkeypatch.setattr(config, 'mutation_log_path', str(tmp_path / 'data_store.log'))
+    monkeypatch.setattr(config, 'message_store', 'dict')
+    monkeypatch.setattr(config, 'sqlite_path', str(tmp_path / 'data_store.sqlite3'))
+    monkeypatch.setattr(dict_store, '_mutation_log', None)
+
+    engine = importlib.import_module(ENGINES[request.param])
+    engine.data_restore()
+    engine.reset_data_store_to_default()
+    yield engine
+
+    if dict_store._mutation_log is not None:
+        dict_store._mutation_log.close()
+
+
+def add_users(engine) -> None:
+    engine.start_workspace_stats(90)
+    engine.add_user(1, ('Eliza', 'Lee', 'eliza@gmail.com'), 'password', 'elizalee', True)
+    engine.start_user_stats(1, 91)
+    engine.add_user(2, ('Eileen', 'Chong', 'eileen@gmail.com'), 'password', 'eileenchong', False)
+    engine.start_user_stats(2, 92)
+    engine.add_user(3, ('Bob', 'Smith', 'bob@gmail.com'), 'password', 'bobsmith', False)
+    engine.start_user_stats(3, 93)
+
+
+def test_check_engine(engine):
+    check_engine(engine)
+    assert any(load_engine(name) is engine for name in ENGINES)
+
+
+def test_users(engine):
+    add_users(engine)
+
+    assert list(engine.get_user_ids()) == [1, 2, 3]
+    assert 2 in engine.get_user_ids()
+    assert engine.get_user(1)['first_name'] == 'Eliza'
+    assert engine.get_user(2)['global_owner'] is False
+    assert set(engine.get_user_emails()) == {'eliza@gmail.com', 'eileen@gmail.com', 'bob@gmail.com'}
+    assert engine.get_user_id_by_email('eileen@gmail.com') == 2
+    assert engine.get_user_id_by_handle('bobsmith') == 3
+    assert list(engine.get_global_owners()) == [1]
+
+    engine.edit_user(2, 'user_handle', 'eileen')
+    engine.edit_user_permissions(2, 1)
+    engine.set_user_profileimage_url(2, 'http://localhost:8080/static/2.jpg')
+    assert engine.get_user_id_by_handle('eileen') == 2
+    assert 'eileenchong' not in engine.get_user_handles()
+    assert set(engine.get_global_owners()) == {1, 2}
+    assert engine.get_user(2)['image_url'] == 'http://localhost:8080/static/2.jpg'
+
+    engine.remove_user_details(3)
+    assert 3 not in engine.get_user_ids()
+    assert 3 in engine.get_complete_user_ids()
+    assert engine.get_user_id_by_handle('bobsmith') is None
+    assert 'bob@gmail.com' not in engine.get_user_emails()
+
+
+def test_sessions_and_reset_keys(engine):
+    add_users(engine)
+
+    engine.add_session_token('token1', 1)
+    engine.add_session_token('token2', 2)
+    engine.remove_session_token('token1')
+    assert set(engine.get_all_valid_tokens()) == {'token2'}
+
+    engine.add_passwordreset_key(2, '12345')
+    assert engine.get_passwordreset_key('12345') == (True, 2)
+    assert engine.get_passwordreset_key('54321') == (False, 0)
+
+
+def test_conversations(engine):
+    add_users(engine)
+
+    engine.add_channel(1, 'channel_1', 1, True, 100)
+    engine.add_member_to_channel(1, 2, 101)
+    engine.add_member_to_channel(1, 3, 101)
+    engine.add_owner_to_channel(2, 1)
+    engine.remove_owner_from_channel(1, 1)
+    engine.remove_member_from_channel(1, 3, 102)
+
+    channel = engine.get_channel(1)
+    assert list(channel['members']) == [1, 2]
+    assert list(channel['owner']) == [2]
+    assert channel['is_public'] is True
+    assert list(engine.get_channel_ids()) == [1]
+    assert list(engine.get_user_channels(2)) == [1]
+    assert list(engine.get_user_channels(3)) == []
+
+    engine.add_dm(1, 'eileenchong, elizalee', 1, 103)
+    engine.add_user_to_dm(1, 2, 103)
+    engine.add_dm(2, 'elizalee', 1, 104)
+    engine.remove_member_from_dm(1, 2, 105)
+    engine.remove_owner_from_dm(1, 2)
+    engine.remove_dm(2, 105)
+
+    assert list(engine.get_dm(1)['members']) == [1]
+    assert list(engine.get_dm_ids()) == [1]
+    assert list(engine.get_user_dms(2)) == []
+
+    engine.add_standup_message(1, 'elizalee: standup')
+    engine.set_active_standup(True, 1, 110)
+    standup = engine.get_channel(1)['standup_data']
+    assert standup['is_active'] is True
+    assert standup['time_finish'] == 110
+    assert list(standup['message_package']) == ['elizalee: standup']
+    engine.clear_message_pack(1)
+    assert list(engine.get_channel(1)['standup_data']['message_package']) == []
+
+
+def test_messages(engine):
+    add_users(engine)
+    engine.add_channel(1, 'channel_1', 1, True, 100)
+    engine.add_dm(1, 'elizalee', 1, 100)
+
+    # message 1 is reserved for a message sent later, after message 2
+    engine.add_sendlater_id(1)
+    engine.add_message(True, 1, 1, 2, 'hello', 101)
+    engine.add_message(False, 1, 1, 3, 'hello dm', 102)
+    assert engine.get_message_conversation(1) is None
+
+    engine.add_message(True, 1, 1, 1, 'sent later', 103)
+    engine.add_message(True, 1, 1, 4, 'removed', 104)
+    engine.remove_message(True, 1, 4, 105)
+    engine.set_message_content(2, 'hello edited')
+    engine.pin_message(3)
+
+    assert list(engine.get_messages_by_channel(1)) == [2, 1]
+    assert list(reversed(engine.get_messages_by_channel(1))) == [1, 2]
+    assert 1 in engine.get_messages_by_channel(1)
+    assert 4 not in engine.get_messages_by_channel(1)
+    assert len(engine.get_messages_by_channel(1)) == 2
+    assert list(engine.get_channel_messages(1)) == [2, 1]
+    assert list(engine.get_messages_by_dm(1)) == [3]
+    assert list(engine.get_dm_messages(1)) == [3]
+    assert set(engine.get_message_ids()) == {1, 2, 3}
+    assert engine.get_message_conversation(1) == (True, 1)
+    assert engine.get_message_conversation(3) == (False, 1)
+    assert engine.get_message_conversation(4) is None
+    assert engine.get_message_content(2) == 'hello edited'
+    assert engine.get_message_by_id(3)['is_pinned'] is True
+    assert engine.get_messages_containing([1, 2, 3], 'hello') == [2, 3]
+    assert engine.get_messages_containing([3, 2], 'edited') == [2]
+
+
+def test_message_batch(engine):
+    add_users(engine)
+    engine.add_channel(1, 'channel_1', 1, True, 100)
+    engine.add_member_to_channel(1, 2, 100)
+    engine.add_message(True, 1, 1, 1, 'before', 101)
+    engine.add_sendlater_id(3)
+    workspace_entries = len(engine.get_workspace_stats()['messages_exist'])
+
+    engine.add_messages(True, 1, [
+        [1, 2, 'first', 102],
+        [2, 3, 'second @elizalee', 102],
+        [1, 4, 'third', 103]
+    ], [[1, 'eileenchong tagged you in channel_1: second @elizalee']])
+    engine.add_messages(True, 1, [], [])
+
+    assert list(engine.get_messages_by_channel(1)) == [1, 2, 3, 4]
+    assert engine.get_message_by_id(3)['author'] == 2
+    assert engine.get_message_conversation(3) == (True, 1)
+    assert len(engine.get_user_notifications(1)) == 1
+
+    workspace_stats = engine.get_workspace_stats()
+    assert len(workspace_stats['messages_exist']) == workspace_entries + 1
+    assert workspace_stats['messages_exist'][-1] == {'num_messages_exist': 4, 'time_stamp': 103}
+    assert engine.get_user_stats(1)['messages_sent'][-1] == {'num_messages_sent': 3, 'time_stamp': 103}
+    assert engine.get_user_stats(2)['messages_sent'][-1] == {'num_messages_sent': 1, 'time_stamp': 102}
+
+
+def test_reactions(engine):
+    add_users(engine)
+    engine.add_channel(1, 'channel_1', 1, True, 100)
+    engine.add_message(True, 1, 1, 1, 'hello', 101)
+
+    engine.react_message(1, 1, 1)
+    engine.react_message(2, 1, 1)
+    assert engine.get_message_by_id(1)['reacts'][0]['u_ids'] == [1, 2]
+
+    engine.react_message(1, 1, 1)
+    assert engine.get_message_by_id(1)['reacts'][0]['u_ids'] == [2]
+
+
+def test_notifications(engine):
+    add_users(engine)
+
+    engine.add_notification(True, 1, 2, 'elizalee tagged you in channel_1: hi')
+    engine.add_notification(False, 4, 2, 'elizalee added you to a dm')
+    assert list(engine.get_user_notifications(2)) == [
+        {'channel_id': 1, 'dm_id': -1, 'content': 'elizalee tagged you in channel_1: hi'},
+        {'channel_id': -1, 'dm_id': 4, 'content': 'elizalee added you to a dm'}
+    ]
+    assert list(engine.get_user_notifications(1)) == []
+
+
+def test_stats(engine):
+    add_users(engine)
+    engine.add_channel(1, 'channel_1', 1, True, 100)
+    engine.add_message(True, 1, 1, 1, 'hello', 101)
+    engine.add_dm(1, 'eileenchong, elizalee', 1, 102)
+    engine.add_user_to_dm(1, 2, 102)
+    engine.update_workspace_stats(False, False, False)
+
+    user_stats = engine.get_user_stats(1)
+    assert user_stats['channels_joined'][-1]['num_channels_joined'] == 1
+    assert user_stats['messages_sent'][-1]['num_messages_sent'] == 1
+    assert user_stats['dms_joined'][-1]['num_dms_joined'] == 1
+    assert user_stats['involvement_rate'] == 1.0
+
+    workspace_stats = engine.get_workspace_stats()
+    assert workspace_stats['channels_exist'][-1]['num_channels_exist'] == 1
+    assert workspace_stats['dms_exist'][-1]['num_dms_exist'] == 1
+    assert workspace_stats['messages_exist'][-1]['num_messages_exist'] == 1
+    assert workspace_stats['utilization_rate'] == pytest.approx(2 / 3)
+
+
+def test_involvement_rate(engine):
+    add_users(engine)
+    engine.add_channel(1, 'channel_1', 1, True, 100)
+    engine.add_member_to_channel(1, 2, 100)
+    engine.add_sendlater_id(1)
+    engine.add_message(True, 2, 1, 2, 'hello', 101)
+    engine.add_message(True, 1, 1, 1, 'sent later', 102)
+    engine.add_message(True, 1, 1, 3, 'removed', 103)
+    engine.remove_message(True, 1, 3, 104)
+    assert engine.get_workspace_stats()['messages_exist'][-1]['num_messages_exist'] == 2
+
+    # 1 message of 1 channel, 0 dms and 2 messages
+    engine.remove_member_from_channel(1, 2, 105)
+    assert engine.get_user_stats(2)['involvement_rate'] == pytest.approx(1 / 3)
+
+    # 2 channels and 1 message of 2 channels, 0 dms and 2 messages
+    engine.add_channel(2, 'channel_2', 1, True, 106)
+    assert engine.get_user_stats(1)['involvement_rate'] == pytest.approx(3 / 4)
+
+    engine.add_dm(1, 'elizalee', 1, 107)
+    assert engine.get_user_stats(1)['involvement_rate'] == pytest.approx(4 / 5)
+
+    # the dm is still there when its members are removed
+    engine.remove_member_from_dm(1, 1, 108)
+    engine.remove_dm(1, 108)
+    assert engine.get_user_stats(1)['involvement_rate'] == pytest.approx(3 / 5)
+    assert engine.get_workspace_stats()['dms_exist'][-1]['num_dms_exist'] == 0
+
+
+def test_ids(engine):
+    message_ids = [engine.allocate_id('message') for _ in range(100)]
+    assert engine.allocate_id('user') == 1
+
+    # ids handed out before a restart are not handed out again after it
+    engine.reserve_ids('channel', 1000)
+    engine.data_restore()
+    message_ids += [engine.allocate_id('message') for _ in range(100)]
+    assert len(set(message_ids)) == 200
+    assert engine.allocate_id('channel') > 1000
+
+
+def test_scheduled_jobs(engine):
+    engine.add_scheduled_job(2, 1000.5, 'sendlaterdm', False, 1, ['token', 1, 'later', 2])
+    engine.add_scheduled_job(3, 999.0, 'standup', True, 1, (1, 1, 999, 3))
+    engine.data_restore()
+
+    jobs = engine.get_scheduled_jobs()
+    assert list(jobs) == [2, 3]
+    assert jobs[2] == {'time_due': 1000.5, 'kind': 'sendlaterdm', 'is_channel': False,
+                       'conversation_id': 1, 'arguments': ['token', 1, 'later', 2]}
+    assert jobs[3]['is_channel'] is True
+    assert jobs[3]['arguments'] == [1, 1, 999, 3]
+
+    engine.remove_scheduled_jobs([2, 4])
+    engine.data_restore()
+    assert list(engine.get_scheduled_jobs()) == [3]
+
+
+def test_restore_after_checkpoint(engine):
+    add_users(engine)
+    engine.add_channel(1, 'channel_1', 1, True, 100)
+    engine.add_message(True, 1, 1, 1, 'hello', 101)
+    engine.data_checkpoint()
+    engine.add_message(True, 2, 1, 2, 'after checkpoint', 102)
+    expected = engine.export_data_store()
+    user_ids = list(expected['user_ids'])
+
+    engine.data_restore()
+    assert list(engine.export_data_store()['user_ids']) == user_ids
+    assert list(engine.get_messages_by_channel(1)) == [1, 2]
+    assert engine.get_message_content(2) == 'after checkpoint'
+
+
+def test_load_engine_unknown():
+    with pytest.raises(ValueError):
+        load_engine('memcached')
+
+
+def test_check_engine_missing_operation():
+    engine = types.ModuleType('broken_store')
+    for operations in OPERATIONS.values():
+        for name in operations:
+            setattr(engine, name, getattr(dict_store, name))
+    check_engine(engine)
+
+    engine.react_message = lambda user_id, message_id: None
+    with pytest.raises(TypeError):
+        check_engine(engine)
+
+    del engine.react_message
+    with pytest.raises(TypeError):
+        check_engine(engine)